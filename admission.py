@@ -0,0 +1,161 @@
+"""
+Admission control for render-heavy requests.
+
+Trace/render/encode endpoints hold a lot of CPU and memory per request, so only
+a fixed number run at once. Requests over that limit wait in a bounded queue,
+first come first served; once the queue is full, or a request has waited too
+long, it is turned away with 429 and a Retry-After estimated from how long
+recent requests held their slot. Render processes themselves are capped by the
+shared CPU pool (services.executors), which every admitted request and job uses.
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+# Render-heavy requests running at once
+ADMISSION_MAX_ACTIVE = int(os.getenv("DOODLY_MAX_ACTIVE_REQUESTS", "2"))
+# Requests that may wait for a slot; more than that are rejected straight away
+ADMISSION_MAX_WAITING = int(os.getenv("DOODLY_MAX_WAITING_REQUESTS", "8"))
+# Seconds a request may wait for a slot before it is rejected
+ADMISSION_MAX_WAIT = float(os.getenv("DOODLY_MAX_WAIT_SECONDS", "60"))
+# Recent admissions kept for the wait and hold time figures
+_HISTORY = 200
+
+
+class Overloaded(Exception):
+    """Raised when work is turned away; retry_after is a hint in seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class AdmissionController:
+    """
+    Limits concurrently running requests, with a bounded FIFO wait queue.
+    Safe to share between event loops: waiters are woken through their own loop.
+    """
+
+    def __init__(self, max_active: int = None, max_waiting: int = None, max_wait: float = None):
+        self.max_active = max_active or ADMISSION_MAX_ACTIVE
+        self.max_waiting = ADMISSION_MAX_WAITING if max_waiting is None else max_waiting
+        self.max_wait = ADMISSION_MAX_WAIT if max_wait is None else max_wait
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self._waits: Deque[float] = deque(maxlen=_HISTORY)
+        self._holds: Deque[float] = deque(maxlen=_HISTORY)
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        """Rough seconds until a new request would get a slot."""
+        hold = sum(self._holds) / len(self._holds) if self._holds else self.max_wait
+        return hold * (len(self._waiters) // self.max_active + 1)
+
+    def _reject(self, reason: str):
+        with self._lock:
+            self.rejected += 1
+            retry_after = self.retry_after()
+        raise Overloaded(reason, retry_after)
+
+    async def acquire(self) -> float:
+        """Wait for a slot and return the seconds spent waiting; raises Overloaded."""
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        with self._lock:
+            if self.active < self.max_active and not self._waiters:
+                self.active += 1
+                self.admitted += 1
+                self._waits.append(0.0)
+                return 0.0
+            full = len(self._waiters) >= self.max_waiting
+            if not full:
+                waiter = (loop, loop.create_future())
+                self._waiters.append(waiter)
+        if full:
+            self._reject(f"Server busy: {self.active} running, {self.max_waiting} waiting")
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter[1]), self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                granted = waiter not in self._waiters
+                if not granted:
+                    self._waiters.remove(waiter)
+            if granted:
+                # The slot was handed over just as we gave up; pass it on
+                self.release(hold=0.0)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject(f"Server busy: no slot freed up within {self.max_wait:.0f}s")
+        waited = time.monotonic() - started
+        with self._lock:
+            self.admitted += 1
+            self._waits.append(waited)
+        return waited
+
+    def release(self, hold: Optional[float] = None):
+        """Give the slot back, handing it straight to the oldest waiter if there is one."""
+        with self._lock:
+            if hold is not None and hold > 0:
+                self._holds.append(hold)
+            if self._waiters:
+                loop, future = self._waiters.popleft()
+                loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+            else:
+                self.active -= 1
+
+    async def slot(self):
+        """FastAPI dependency that holds a slot for the lifetime of the request."""
+        await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(hold=time.monotonic() - started)
+
+    def gauge(self) -> dict:
+        """Active and waiting requests, as a labelled metrics gauge."""
+        with self._lock:
+            return {(("state", "active"),): self.active, (("state", "waiting"),): len(self._waiters)}
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = list(self._waits)
+            return {
+                "active": self.active,
+                "max_active": self.max_active,
+                "waiting": len(self._waiters),
+                "max_waiting": self.max_waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "wait_s": {
+                    "avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                    "p95": round(_percentile(waits, 0.95), 3),
+                    "max": round(max(waits), 3) if waits else 0.0,
+                },
+                "retry_after_s": math.ceil(self.retry_after()),
+            }
+
+
+def install(app):
+    """Answer Overloaded with 429 and a Retry-After header on a FastAPI app."""
+    from fastapi.responses import JSONResponse
+
+    async def overloaded(request, exc: Overloaded):
+        return JSONResponse(status_code=429, content={"error": str(exc), "retry_after": exc.retry_after},
+                            headers={"Retry-After": str(exc.retry_after)})
+
+    app.add_exception_handler(Overloaded, overloaded)
@@ -0,0 +1 @@
+# Offline benchmarks for the pipeline stages; run with `python -m benchmarks.run`
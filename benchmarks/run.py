@@ -0,0 +1,319 @@
+"""
+Offline benchmark suite for the pipeline stages.
+
+    python -m benchmarks.run                         # full run, writes benchmarks/results/latest.json
+    python -m benchmarks.run --quick --only trace,render
+    python -m benchmarks.run --baseline benchmarks/baseline.json
+    python -m benchmarks.run --save-baseline         # record this run as the baseline
+
+Every input is synthetic (see benchmarks.synthetic) and the OpenAI/ElevenLabs
+services are replaced by benchmarks.stubs, so a run costs nothing and needs no
+API keys. The on-disk caches are switched off so every stage does its real work.
+Results are JSON: one entry per metric with its value, unit and whether higher
+is better; comparing against a baseline flags metrics that got worse by more
+than the tolerance and exits non-zero.
+"""
+
+import os
+
+# Benchmarks measure the work itself, not cache hits; set before the pipeline is imported
+# (render workers are spawned and inherit the environment)
+for _cache in ("TTS_CACHE_MAX_MB", "IMAGE_CACHE_MAX_MB", "DOODLY_RENDER_CACHE_MAX_MB"):
+    os.environ[_cache] = "0"
+
+import argparse
+import asyncio
+import json
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks import synthetic
+from benchmarks.stubs import FakeAudioService, FakeImageService
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+STAGES = ("trace", "strokes", "render", "concat", "audio", "assemble", "e2e")
+# Seconds of animation per benchmark clip
+CLIP_SECONDS = 3.0
+
+
+def _timed(fn, repeat: int):
+    """Run fn repeat times; return the median wall time and the last result."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def _metric(value: float, unit: str, higher_is_better: bool, **params) -> dict:
+    return {"value": round(value, 4), "unit": unit, "higher_is_better": higher_is_better, "params": params}
+
+
+class Suite:
+    def __init__(self, work_dir: str, quick: bool = False, repeat: int = None):
+        self.work_dir = work_dir
+        self.quick = quick
+        self.repeat = repeat or (1 if quick else 3)
+        self.complexities = ("simple", "dense") if quick else tuple(synthetic.COMPLEXITIES)
+        self.script_lengths = synthetic.SCRIPT_LENGTHS[:2] if quick else synthetic.SCRIPT_LENGTHS
+        self.results = {}
+        self._pngs = {}
+        self._bundles = {}
+        self._clips = []
+        self._mp3s = []
+
+    def _dir(self, name: str) -> str:
+        path = os.path.join(self.work_dir, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def png(self, complexity: str, seed: int = 0) -> str:
+        key = (complexity, seed)
+        if key not in self._pngs:
+            path = os.path.join(self._dir("images"), f"{complexity}_{seed}.png")
+            self._pngs[key] = synthetic.whiteboard_png(path, complexity, seed)
+        return self._pngs[key]
+
+    def bundle(self, complexity: str) -> str:
+        from doodly_pipeline import png_to_strokes
+        if complexity not in self._bundles:
+            self._bundles[complexity] = png_to_strokes(self.png(complexity), output_dir=self._dir("strokes"))
+        return self._bundles[complexity]
+
+    def clips(self, count: int) -> list:
+        """count rendered clips of the medium image (rendered once, then copied)."""
+        from doodly_pipeline import animate_svg
+        if not self._clips:
+            first = animate_svg(self.bundle("medium"), CLIP_SECONDS, "clip_0.mp4", output_dir=self._dir("clips"),
+                                media_dir=self._dir("media"), png_path=self.png("medium"), engine="stroke")
+            self._clips.append(first)
+        while len(self._clips) < count:
+            path = os.path.join(self._dir("clips"), f"clip_{len(self._clips)}.mp4")
+            shutil.copyfile(self._clips[0], path)
+            self._clips.append(path)
+        return self._clips[:count]
+
+    def mp3s(self, count: int) -> list:
+        while len(self._mp3s) < count:
+            i = len(self._mp3s)
+            path = os.path.join(self._dir("audio"), f"segment_{i}.mp3")
+            self._mp3s.append(synthetic.tone_mp3(path, CLIP_SECONDS, 0.0 if i % 2 else 440.0))
+        return self._mp3s[:count]
+
+    # --- per-stage microbenchmarks ---
+
+    def bench_trace(self):
+        """ImageMagick + Potrace tracing to SVG: paths per second."""
+        from doodly_pipeline import png_to_svg
+        for complexity in self.complexities:
+            png = self.png(complexity)
+            work = self._dir(f"trace_{complexity}")
+            seconds, svg_path = _timed(lambda: png_to_svg(png, work_dir=work), self.repeat)
+            with open(svg_path) as f:
+                paths = f.read().count("<path")
+            self.results[f"trace.{complexity}.seconds"] = _metric(seconds, "s", False, complexity=complexity)
+            self.results[f"trace.{complexity}.paths_per_s"] = _metric(paths / seconds, "paths/s", True,
+                                                                       complexity=complexity, paths=paths)
+
+    def bench_strokes(self):
+        """In-process tracing to a stroke bundle: polylines and segments per second."""
+        from doodly_pipeline import png_to_strokes
+        from vectorizer import StrokeBundle
+        for complexity in self.complexities:
+            png = self.png(complexity)
+            work = self._dir(f"strokes_{complexity}")
+            seconds, bundle_path = _timed(lambda: png_to_strokes(png, output_dir=work), self.repeat)
+            bundle = StrokeBundle.load(bundle_path)
+            self.results[f"strokes.{complexity}.seconds"] = _metric(seconds, "s", False, complexity=complexity)
+            self.results[f"strokes.{complexity}.paths_per_s"] = _metric(
+                len(bundle) / seconds, "paths/s", True, complexity=complexity, paths=len(bundle))
+            self.results[f"strokes.{complexity}.segments_per_s"] = _metric(
+                bundle.segment_count / seconds, "segments/s", True,
+                complexity=complexity, segments=bundle.segment_count)
+
+    def bench_render(self):
+        """Native stroke renderer (frames piped into ffmpeg): frames per second."""
+        import render_pool
+        from doodly_pipeline import animate_svg
+        from ffmpeg_tools import probe
+        from stroke_renderer import QUALITY_PRESETS
+        fps = QUALITY_PRESETS[render_pool.RENDER_QUALITY][2]
+        for complexity in self.complexities:
+            bundle, png = self.bundle(complexity), self.png(complexity)
+            out_dir, media = self._dir(f"render_{complexity}"), self._dir(f"media_{complexity}")
+            seconds, clip = _timed(lambda: animate_svg(bundle, CLIP_SECONDS, "clip.mp4", output_dir=out_dir,
+                                                       media_dir=media, png_path=png, engine="stroke"),
+                                   self.repeat)
+            frames = round(probe(clip)["duration"] * fps)
+            self.results[f"render.{complexity}.seconds"] = _metric(seconds, "s", False, complexity=complexity)
+            self.results[f"render.{complexity}.frames_per_s"] = _metric(
+                frames / seconds, "frames/s", True, complexity=complexity, frames=frames,
+                quality=render_pool.RENDER_QUALITY)
+
+    def bench_concat(self):
+        """concatenate_videos over identical clips (stream copy): clips per second."""
+        from doodly_pipeline import concatenate_videos
+        for count in self.script_lengths:
+            clips = self.clips(count)
+            output = os.path.join(self._dir("concat"), f"concat_{count}.mp4")
+            seconds, _ = _timed(lambda: concatenate_videos(clips, output), self.repeat)
+            self.results[f"concat.{count}.seconds"] = _metric(seconds, "s", False, clips=count)
+            self.results[f"concat.{count}.clips_per_s"] = _metric(count / seconds, "clips/s", True, clips=count)
+
+    def bench_audio(self):
+        """AudioTimeline decode and padding: seconds of narration assembled per second."""
+        from services.audio_timeline import AudioTimeline
+        for count in self.script_lengths:
+            mp3s = self.mp3s(count)
+            slots = [CLIP_SECONDS + 0.5] * count
+            seconds, timeline = _timed(lambda: AudioTimeline.from_segments(mp3s, slot_durations=slots),
+                                       self.repeat)
+            self.results[f"audio.{count}.seconds"] = _metric(seconds, "s", False, segments=count)
+            self.results[f"audio.{count}.realtime_x"] = _metric(timeline.duration / seconds, "x realtime", True,
+                                                                 segments=count)
+
+    def bench_assemble(self):
+        """assemble_final_video: concat + audio mux in one ffmpeg run."""
+        from ffmpeg_tools import assemble_final_video
+        for count in self.script_lengths:
+            clips, mp3s = self.clips(count), self.mp3s(count)
+            output = os.path.join(self._dir("assemble"), f"final_{count}.mp4")
+            seconds, _ = _timed(lambda: assemble_final_video(clips, mp3s, output), self.repeat)
+            self.results[f"assemble.{count}.seconds"] = _metric(seconds, "s", False, sentences=count)
+
+    # --- end to end ---
+
+    def bench_e2e(self, provider_latency: float = 0.0):
+        """
+        The /generate-script-video flow (split, streamed TTS -> image -> trace + render,
+        assembly) with stubbed providers; upload is skipped.
+        """
+        from ffmpeg_tools import assemble_final_video
+        from script_pipeline import ScriptVideoPipeline
+        from services.script_service import split_sentences
+
+        pngs = [self.png(complexity, seed) for complexity in self.complexities for seed in range(2)]
+        for count in self.script_lengths:
+            text = synthetic.script(count)
+
+            def run():
+                out_dir = tempfile.mkdtemp(prefix="e2e_", dir=self.work_dir)
+                job_id = f"bench{count}"
+                sentences = split_sentences(text)
+                pipeline = ScriptVideoPipeline(
+                    FakeAudioService(out_dir, provider_latency),
+                    FakeImageService(out_dir, pngs, provider_latency),
+                    job_id, out_dir, engine="stroke",
+                )
+                items = asyncio.run(pipeline.run(sentences))
+                assemble_final_video([item.clip_path for item in items], [item.audio_path for item in items],
+                                     os.path.join(out_dir, f"final_{job_id}.mp4"),
+                                     audio_durations=[item.duration for item in items])
+                shutil.rmtree(out_dir, ignore_errors=True)
+                return pipeline.timings, len(sentences)
+
+            seconds, (timings, sentences) = _timed(run, 1 if count > 12 else self.repeat)
+            params = {"sentences": sentences, "provider_latency_s": provider_latency}
+            self.results[f"e2e.{count}.seconds"] = _metric(seconds, "s", False, **params)
+            self.results[f"e2e.{count}.seconds_per_sentence"] = _metric(seconds / sentences, "s", False, **params)
+            for stage, summary in timings.stage_summary().items():
+                self.results[f"e2e.{count}.{stage}_busy_s"] = _metric(summary["busy_s"], "s", False, **params)
+
+    def run(self, stages, provider_latency: float = 0.0):
+        for stage in stages:
+            print(f"[bench] {stage}...")
+            start = time.perf_counter()
+            if stage == "e2e":
+                self.bench_e2e(provider_latency)
+            else:
+                getattr(self, f"bench_{stage}")()
+            print(f"[bench] {stage} done in {time.perf_counter() - start:.1f}s")
+        return self.results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Print each metric against the baseline and return the names that regressed beyond tolerance."""
+    regressions = []
+    for name, metric in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None or not base["value"]:
+            print(f"  {name:<40} {metric['value']:>12.4f} {metric['unit']:<10} (new)")
+            continue
+        change = (metric["value"] - base["value"]) / base["value"]
+        worse = -change if metric["higher_is_better"] else change
+        flag = "REGRESSION" if worse > tolerance else ("improved" if worse < -tolerance else "")
+        if flag == "REGRESSION":
+            regressions.append(name)
+        print(f"  {name:<40} {metric['value']:>12.4f} {metric['unit']:<10} {change:+7.1%}  {flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmarks with synthetic inputs")
+    parser.add_argument("--only", help=f"comma-separated stages to run ({', '.join(STAGES)})")
+    parser.add_argument("--quick", action="store_true", help="fewer sizes and a single repetition")
+    parser.add_argument("--repeat", type=int, help="repetitions per microbenchmark (median is reported)")
+    parser.add_argument("--provider-latency", type=float, default=0.0,
+                        help="simulated seconds per stubbed TTS/image call in the end-to-end run")
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "latest.json"), help="results file")
+    parser.add_argument("--baseline", help="baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help=f"also write the results to {BASELINE_PATH}")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative slowdown (default: 0.10)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    args = parser.parse_args(argv)
+
+    stages = args.only.split(",") if args.only else list(STAGES)
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+
+    work_dir = tempfile.mkdtemp(prefix="doodly_bench_")
+    try:
+        results = Suite(work_dir, quick=args.quick, repeat=args.repeat).run(stages, args.provider_latency)
+    finally:
+        if args.keep:
+            print(f"[bench] scratch kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "quick": args.quick,
+            "stages": stages,
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[bench] results written to {args.output}")
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[bench] baseline written to {BASELINE_PATH}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"[bench] compared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(f"[bench] {len(regressions)} metric(s) regressed: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
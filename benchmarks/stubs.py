@@ -0,0 +1,49 @@
+"""
+Offline stand-ins for the provider-backed services, with the interface
+ScriptVideoPipeline uses. Outputs are synthetic; an optional fixed latency
+stands in for the provider round trip.
+"""
+
+import asyncio
+import os
+import shutil
+import time
+
+from benchmarks import synthetic
+from services import executors
+
+
+class FakeAudioService:
+    """Writes a tone MP3 as long as the sentence would take to narrate."""
+
+    def __init__(self, output_dir: str, latency: float = 0.0):
+        self.output_dir = output_dir
+        self.latency = latency
+
+    async def generate_sentence_audio(self, sentence: str, job_id: str, i: int) -> dict:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        duration = synthetic.speech_seconds(sentence)
+        audio_path = os.path.join(self.output_dir, f"audio_{job_id}_{i}.mp3")
+        await executors.run_io(synthetic.tone_mp3, audio_path, duration, 220.0 + 20 * (i % 10))
+        return {'audio_path': audio_path, 'duration': duration, 'sentence': sentence}
+
+
+class FakeImageService:
+    """Hands out copies of pre-generated whiteboard PNGs, cycling through them."""
+
+    def __init__(self, output_dir: str, pngs: list, latency: float = 0.0):
+        self.output_dir = output_dir
+        self.pngs = pngs
+        self.latency = latency
+
+    def generate_sketch_image_with_quality(self, sentence: str, job_id: str, frame_index: int,
+                                           quality: str = "medium", size: str = "1536x1024") -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        image_path = os.path.join(self.output_dir, f"image_{job_id}_{frame_index}.png")
+        shutil.copyfile(self.pngs[frame_index % len(self.pngs)], image_path)
+        return image_path
+
+    def cache_summary(self) -> dict:
+        return {"hits": 0, "misses": 0}
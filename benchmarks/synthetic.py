@@ -0,0 +1,94 @@
+"""
+Synthetic inputs for the benchmarks: whiteboard-style PNGs, tone or silent MP3
+segments and scripts, all deterministic for a given seed so runs are comparable.
+"""
+
+import math
+import random
+import subprocess
+
+from PIL import Image, ImageDraw
+
+# Shapes drawn per image at each complexity
+COMPLEXITIES = {"simple": 6, "medium": 30, "dense": 120}
+# Sentences per synthetic script
+SCRIPT_LENGTHS = (3, 12, 40)
+IMAGE_SIZE = (1536, 1024)
+# Narration pace used to size the audio segments (matches ElevenLabs' typical rate)
+WORDS_PER_SECOND = 2.5
+
+_WORDS = ("array", "index", "memory", "element", "pointer", "stack", "queue", "node", "graph",
+          "sorted", "binary", "search", "insert", "delete", "value", "shift", "list", "tree")
+
+
+def _squiggle(draw, rng, box, width):
+    """A hand-written looking line of 'text' inside box."""
+    x0, y0, x1, y1 = box
+    y = rng.uniform(y0, y1)
+    points = []
+    x = x0
+    while x < x1:
+        points.append((x, y + 6 * math.sin(x / rng.uniform(4, 9))))
+        x += rng.uniform(3, 6)
+    if len(points) >= 2:
+        draw.line(points, fill="black", width=width, joint="curve")
+
+
+def _arrow(draw, rng, box, width):
+    x0, y0, x1, y1 = box
+    start = (rng.uniform(x0, x1), rng.uniform(y0, y1))
+    end = (rng.uniform(x0, x1), rng.uniform(y0, y1))
+    draw.line([start, end], fill="black", width=width)
+    angle = math.atan2(end[1] - start[1], end[0] - start[0])
+    for side in (-0.5, 0.5):
+        tip = (end[0] - 25 * math.cos(angle + side), end[1] - 25 * math.sin(angle + side))
+        draw.line([end, tip], fill="black", width=width)
+
+
+def whiteboard_png(path: str, complexity: str = "medium", seed: int = 0, size=IMAGE_SIZE) -> str:
+    """Black-on-white sketch of boxes, circles, arrows and scribbled text lines."""
+    rng = random.Random(f"{complexity}:{seed}")
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    width, height = size
+    for _ in range(COMPLEXITIES[complexity]):
+        w, h = rng.uniform(60, width / 3), rng.uniform(40, height / 3)
+        x, y = rng.uniform(20, width - w - 20), rng.uniform(20, height - h - 20)
+        box = (x, y, x + w, y + h)
+        stroke = rng.randint(3, 7)
+        shape = rng.choice(("rect", "ellipse", "arrow", "text", "text"))
+        if shape == "rect":
+            draw.rectangle(box, outline="black", width=stroke)
+        elif shape == "ellipse":
+            draw.ellipse(box, outline="black", width=stroke)
+        elif shape == "arrow":
+            _arrow(draw, rng, box, stroke)
+        else:
+            for line in range(rng.randint(1, 3)):
+                _squiggle(draw, rng, (x, y + line * 30, x + w, y + line * 30 + 10), stroke)
+    image.save(path)
+    return path
+
+
+def tone_mp3(path: str, seconds: float, frequency: float = 0.0) -> str:
+    """Mono 44.1 kHz MP3 of a sine tone, or silence when frequency is 0."""
+    source = f"sine=frequency={frequency}:sample_rate=44100" if frequency else "anullsrc=r=44100:cl=mono"
+    subprocess.run([
+        'ffmpeg', '-y', '-loglevel', 'error', '-f', 'lavfi', '-i', source,
+        '-t', f"{seconds:.3f}", '-ac', '1', '-c:a', 'libmp3lame', '-b:a', '64k', path,
+    ], check=True)
+    return path
+
+
+def sentence(rng: random.Random, words: int = 12) -> str:
+    text = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def script(sentences: int, seed: int = 0) -> str:
+    rng = random.Random(f"script:{seed}")
+    return " ".join(sentence(rng, rng.randint(8, 16)) for _ in range(sentences))
+
+
+def speech_seconds(text: str) -> float:
+    return max(1.0, len(text.split()) / WORDS_PER_SECOND)
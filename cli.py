@@ -12,6 +12,8 @@ from services.script_service import ScriptService
 from services.audio_service import AudioService
 from services.image_service import ImageService
 from services.video_generator import VideoGenerator
+from services import profiler
+import contextlib
 import uuid
 
 load_dotenv()
@@ -117,6 +119,7 @@ Examples:
   python cli.py "How photosynthesis works"
   python cli.py "Machine learning basics" --style "technical" --duration 4.0
   python cli.py "The water cycle" --background-music --hand-animation
+  python cli.py "Volcanoes" --profile
   python cli.py --list-voices
         """
     )
@@ -158,6 +161,12 @@ Examples:
         help="Custom output filename (without extension)"
     )
     
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the run and save collapsed stacks to outputs/profile_<name>.folded"
+    )
+    
     parser.add_argument(
         "--list-voices",
         action="store_true",
@@ -185,14 +194,20 @@ Examples:
     if args.list_voices:
         asyncio.run(cli.list_voices())
     elif args.topic:
-        asyncio.run(cli.generate_video(
-            topic=args.topic,
-            style=args.style,
-            duration_per_frame=args.duration,
-            include_background_music=args.background_music,
-            include_hand_animation=args.hand_animation,
-            output_name=args.output
-        ))
+        output_name = args.output or str(uuid.uuid4())
+        profiling = contextlib.nullcontext()
+        if args.profile:
+            sampler = profiler.Sampler(os.path.join("outputs", f"profile_{output_name}.folded"))
+            profiling = sampler.running(label="cli")
+        with profiling:
+            asyncio.run(cli.generate_video(
+                topic=args.topic,
+                style=args.style,
+                duration_per_frame=args.duration,
+                include_background_music=args.background_music,
+                include_hand_animation=args.hand_animation,
+                output_name=output_name
+            ))
     else:
         parser.print_help()
 
@@ -1,71 +1,167 @@
 # Force Modal to use the latest version - cache bust
 import os
-import subprocess
-from manim import *
-from moviepy.editor import concatenate_videoclips, AudioFileClip, VideoFileClip
 import glob
 import shutil
 from svgpathtools import svg2paths
 import numpy as np
 import cv2
+from PIL import Image
 import svgwrite
 import xml.etree.ElementTree as ET
 import json
+import hashlib
+from collections import OrderedDict
+import ffmpeg_tools
+import render_pool
+from render_pool import RenderJob
+import stroke_renderer
+from stroke_renderer import load_svg_polylines, render_stroke_reveal
+from vectorizer import StrokeBundle, threshold_png, trace_bitmap
+from services import job_events, job_trace, metrics
+from services.disk_cache import DiskCache, get_cache
+from services.image_cache import image_cache, trace_key
 
 # --- CONFIG ---
 IMAGES_DIR = 'outputs'
 AUDIO_PATH = None  # Set to your audio file path, e.g., 'outputs/audio_<job_id>.mp3'
 OUTPUT_VIDEO = 'outputs/final_doodly_video.mp4'
 RUN_TIME_PER_IMAGE = 2  # seconds per image animation
+RENDER_ENGINE = os.getenv('DOODLY_RENDER_ENGINE', 'stroke')  # 'stroke' or 'manim'
+# Stroke-complexity budget applied after tracing
+MAX_SEGMENTS_PER_FRAME = int(os.getenv('DOODLY_MAX_SEGMENTS', '20000'))  # 0 disables the cap
+SIMPLIFY_EPSILON = 0.75  # Douglas-Peucker tolerance in source pixels
+SIMPLIFY_EPSILON_MAX = 16.0
+SPECKLE_FRACTION = 0.004  # subpaths shorter than this fraction of the image diagonal are dropped
+TURDSIZE_BASE = 2
+TURDSIZE_MAX = 48
+# Colour quantisation (png_to_color_svg)
+COLOR_SAMPLE_PIXELS = 20000  # pixels sampled to fit the palette
+COLOR_APPROX_EPSILON = 1.5  # polygon approximation tolerance in pixels
+PALETTE_CACHE_SIZE = 64
+TRACE_KEYS_SIZE = 256  # traced outputs remembered for building render cache keys
+# Rendered clips, keyed on the drawing, PNG, duration, quality, heading and renderer version
+RENDER_CACHE_DIR = os.getenv('DOODLY_RENDER_CACHE_DIR', '.cache/renders')
+RENDER_CACHE_MAX_MB = float(os.getenv('DOODLY_RENDER_CACHE_MAX_MB', '4096'))  # 0 disables the cache
 
 # --- 1. Convert PNGs to SVGs ---
-def png_to_svg(png_path, output_dir=None):
-    pbm_path = png_path.replace('.png', '.pbm')
-    svg_path = png_path.replace('.png', '.svg')
-    # Use ImageMagick to threshold and Potrace for clean vector lines
+def _trace_settings(max_segments):
+    return (max_segments, SIMPLIFY_EPSILON, SIMPLIFY_EPSILON_MAX, SPECKLE_FRACTION, TURDSIZE_BASE, TURDSIZE_MAX)
+
+_trace_keys = OrderedDict()  # traced output path -> (trace key, file stamps)
+
+def _stamps(*paths):
+    return tuple((os.path.abspath(p), os.stat(p).st_mtime_ns, os.stat(p).st_size) for p in paths)
+
+def _remember_trace(dest_path, png_path, key):
+    """Record which trace produced dest_path, so its render key needn't re-hash the drawing and PNG."""
+    path = os.path.abspath(dest_path)
+    _trace_keys[path] = (key, _stamps(dest_path, png_path))
+    _trace_keys.move_to_end(path)
+    if len(_trace_keys) > TRACE_KEYS_SIZE:
+        _trace_keys.popitem(last=False)
+
+def _traced_by(path, png_path):
+    """Trace key of the output at path if _cached_trace produced it from png_path and neither has changed since."""
+    entry = _trace_keys.get(os.path.abspath(path))
     try:
-        # Try 'magick' command first (newer ImageMagick versions)
-        subprocess.run(['magick', png_path, '-threshold', '50%', pbm_path], check=True)
-    except FileNotFoundError:
-        # Fall back to 'convert' command (older ImageMagick versions)
-        subprocess.run(['convert', png_path, '-threshold', '50%', pbm_path], check=True)
-    # Potrace options: -t 0 (sharp threshold), -a 1 (smooth curves), --flat (no curve optimization), --opaque (no transparency)
-    subprocess.run(['potrace', pbm_path, '-s', '-o', svg_path, '-t', '0', '-a', '1', '--flat', '--opaque'], check=True)
-    # Post-process SVG: remove fills, keep only stroke, set stroke-width=3
-    import xml.etree.ElementTree as ET
-    tree = ET.parse(svg_path)
-    root = tree.getroot()
-    for elem in root.iter():
-        if 'fill' in elem.attrib:
-            elem.attrib['fill'] = 'none'
-        elem.attrib['stroke'] = 'black'
-        elem.attrib['stroke-width'] = '3'
-    tree.write(svg_path)
-    if output_dir:
-        new_svg_path = os.path.join(output_dir, os.path.basename(svg_path))
-        os.rename(svg_path, new_svg_path)
-        return new_svg_path
-    return svg_path
+        if entry and entry[1] == _stamps(path, png_path):
+            return entry[0]
+    except OSError:
+        pass
+    return None
+
+@metrics.timed("trace")
+def _cached_trace(png_path, kind, max_segments, dest_path, trace):
+    """
+    Serve a traced output for png_path from the image cache, or run trace() (which
+    writes dest_path) and store the result next to the cached images.
+    The job's "trace" stage is reported by the pipeline when its render stage starts.
+    """
+    cache = image_cache()
+    key = trace_key(png_path, kind, *_trace_settings(max_segments))
+    if cache.get(key) is not None and cache.fetch(key, kind, dest_path):
+        print(f"[{kind}] {os.path.basename(png_path)}: traced output served from cache")
+        _remember_trace(dest_path, png_path, key)
+        job_events.sentence_done("trace", cached=True)
+        return dest_path
+    trace()
+    cache.put(key, {kind: dest_path})
+    _remember_trace(dest_path, png_path, key)
+    job_events.sentence_done("trace", cached=False)
+    return dest_path
+
+def png_to_svg(png_path, output_dir=None, work_dir=None, max_segments=MAX_SEGMENTS_PER_FRAME):
+    # work_dir keeps the intermediate PBM/SVG out of the PNG's directory
+    base = os.path.join(work_dir, os.path.basename(png_path)) if work_dir else png_path
+    svg_path = base.replace('.png', '.svg')
+    final_path = os.path.join(output_dir, os.path.basename(svg_path)) if output_dir else svg_path
+    return _cached_trace(png_path, 'trace.svg', max_segments, final_path,
+                         lambda: _trace_png_to_svg(png_path, base, final_path, max_segments))
+
+def _trace_png_to_svg(png_path, base, final_path, max_segments):
+    pbm_path = base.replace('.png', '.pbm')
+    svg_path = base.replace('.png', '.svg')
+    mask = threshold_png(png_path)
+    turdsize = adaptive_turdsize(mask)
+    # Write the thresholded mask as the PBM Potrace reads (ink is black, i.e. False in mode '1')
+    Image.fromarray(~mask).save(pbm_path)
+    # Potrace options: -t (speckle size, adapted to image complexity), -a 1 (smooth curves), --flat (no curve optimization), --opaque (no transparency)
+    job_trace.run(['potrace', pbm_path, '-s', '-o', svg_path, '-t', str(turdsize), '-a', '1', '--flat', '--opaque'], check=True)
+    # Post-process SVG: simplify/merge paths within the segment budget and write stroke-only paths (stroke-width=3)
+    height, width = mask.shape
+    bundle = StrokeBundle.from_polylines(load_svg_polylines(svg_path), width, height)
+    bundle, report = optimize_strokes(bundle, max_segments=max_segments)
+    print(f"[png_to_svg] {os.path.basename(png_path)}: turdsize={turdsize}, {_format_stroke_report(report)}")
+    bundle.to_svg(svg_path)
+    if final_path != svg_path:
+        os.rename(svg_path, final_path)
 
 # --- 1A. Convert PNGs to Color SVGs ---
+_palette_cache = OrderedDict()  # image hash -> palette centres
+
+def _fit_palette(img_rgb, k_colors):
+    """Fit a k-means palette on a random pixel subset, cached per image hash."""
+    key = f"{hashlib.sha1(img_rgb.tobytes()).hexdigest()}:{k_colors}"
+    if key in _palette_cache:
+        _palette_cache.move_to_end(key)
+        return _palette_cache[key]
+    pixels = img_rgb.reshape((-1, 3))
+    rng = np.random.default_rng(0)
+    sample = pixels[rng.choice(len(pixels), min(COLOR_SAMPLE_PIXELS, len(pixels)), replace=False)]
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
+    _, _, centers = cv2.kmeans(np.float32(sample), k_colors, None, criteria, 3, cv2.KMEANS_PP_CENTERS)
+    _palette_cache[key] = centers
+    if len(_palette_cache) > PALETTE_CACHE_SIZE:
+        _palette_cache.popitem(last=False)
+    return centers
+
+def _label_pixels(img_rgb, centers):
+    """
+    Nearest-centre label for every pixel via a 32x32x32 colour lookup table,
+    so the per-pixel work is a single vectorised index instead of a distance search.
+    """
+    grid = (np.arange(32, dtype=np.float32) * 8 + 4)
+    cube = np.stack(np.meshgrid(grid, grid, grid, indexing='ij'), axis=-1).reshape(-1, 3)
+    distances = ((cube[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+    lut = distances.argmin(axis=1).astype(np.uint8)
+    q = (img_rgb >> 3).astype(np.int32)
+    return lut[(q[..., 0] << 10) | (q[..., 1] << 5) | q[..., 2]]
+
 def png_to_color_svg(png_path, output_dir=None, k_colors=8, min_area=100):
     img = cv2.imread(png_path)
     img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    Z = img_rgb.reshape((-1,3))
-    Z = np.float32(Z)
-    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
-    K = k_colors
-    _, labels, centers = cv2.kmeans(Z, K, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
-    segmented_img = centers[labels.flatten()].reshape(img_rgb.shape).astype(np.uint8)
+    centers = _fit_palette(img_rgb, k_colors)
+    labels = _label_pixels(img_rgb, centers)
     svg_path = png_path.replace('.png', '_color.svg')
     dwg = svgwrite.Drawing(svg_path, profile='tiny', size=(img.shape[1], img.shape[0]))
     for i, center in enumerate(centers):
-        mask = (labels.reshape(img.shape[:2]) == i).astype(np.uint8) * 255
+        mask = (labels == i).astype(np.uint8) * 255
         contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         color = svgwrite.rgb(int(center[0]), int(center[1]), int(center[2]))
         for cnt in contours:
             if cv2.contourArea(cnt) > min_area:
-                path = "M " + " L ".join([f"{pt[0][0]},{pt[0][1]}" for pt in cnt]) + " Z"
+                approx = cv2.approxPolyDP(cnt, COLOR_APPROX_EPSILON, True).reshape(-1, 2).tolist()
+                path = "M" + "L".join(f"{x} {y}" for x, y in approx) + "Z"
                 dwg.add(dwg.path(d=path, fill=color, stroke='black', stroke_width=1))
     dwg.save()
     if output_dir:
@@ -74,6 +170,118 @@ def png_to_color_svg(png_path, output_dir=None, k_colors=8, min_area=100):
         return new_svg_path
     return svg_path
 
+# --- 1B. Trace PNGs in-process into stroke bundles ---
+def png_to_strokes(png_path, output_dir=None, write_svg=False):
+    """
+    Threshold and trace a PNG without spawning ImageMagick/Potrace or round-tripping
+    through XML. Saves a packed `.npz` stroke bundle next to the PNG (or in output_dir)
+    and returns its path; with write_svg=True a stroke-only SVG is written alongside.
+    """
+    base = os.path.join(output_dir, os.path.basename(png_path)) if output_dir else png_path
+    bundle_path = _cached_trace(png_path, 'strokes.npz', MAX_SEGMENTS_PER_FRAME, base.replace('.png', '.npz'),
+                                lambda: _trace_png_to_strokes(png_path, base.replace('.png', '.npz')))
+    if write_svg:
+        StrokeBundle.load(bundle_path).to_svg(base.replace('.png', '.svg'))
+    return bundle_path
+
+def _trace_png_to_strokes(png_path, bundle_path):
+    mask = threshold_png(png_path)
+    height, width = mask.shape
+    bundle = StrokeBundle.from_polylines(trace_bitmap(mask, turdsize=adaptive_turdsize(mask)), width, height)
+    bundle, report = optimize_strokes(bundle)
+    print(f"[png_to_strokes] {os.path.basename(png_path)}: {_format_stroke_report(report)}")
+    bundle.save(bundle_path)
+
+# --- 1C. Stroke-complexity budget ---
+def adaptive_turdsize(mask):
+    """
+    Speckle size (in pixels) to drop while tracing, scaled by image complexity.
+    Busy sketches have a high density of ink edges and get a larger turd size.
+    """
+    edges = np.count_nonzero(mask[:, 1:] != mask[:, :-1]) + np.count_nonzero(mask[1:, :] != mask[:-1, :])
+    edge_density = edges / max(mask.size, 1)
+    return int(np.clip(round(TURDSIZE_BASE * (1 + edge_density / 0.02)), TURDSIZE_BASE, TURDSIZE_MAX))
+
+def _polyline_length(line):
+    return float(np.linalg.norm(np.diff(line, axis=0), axis=1).sum())
+
+def _merge_adjacent(polylines, join_tol=1.0, collinear_tol=0.02):
+    """Join polylines whose end touches the next one's start; drop the joint when collinear."""
+    merged = []
+    for line in polylines:
+        if merged and np.linalg.norm(merged[-1][-1] - line[0]) <= join_tol:
+            prev = merged[-1]
+            joined = np.vstack([prev, line[1:]])
+            if len(prev) >= 2 and len(line) >= 2:
+                a = prev[-1] - prev[-2]
+                b = line[1] - line[0]
+                cross = abs(a[0] * b[1] - a[1] * b[0])
+                norm = np.linalg.norm(a) * np.linalg.norm(b)
+                if norm > 0 and cross / norm <= collinear_tol and np.dot(a, b) > 0:
+                    joined = np.vstack([prev[:-1], line[1:]])
+            merged[-1] = joined
+        else:
+            merged.append(line)
+    return merged
+
+def _simplify(polylines, epsilon):
+    if epsilon <= 0:
+        return polylines
+    simplified = []
+    for line in polylines:
+        # Outlines come back closed (last point == first); simplify them as closed curves and
+        # close them again, since the open-curve fit drops the repeated end point.
+        # An outline smaller than epsilon collapses to a single point and is dropped.
+        closed = len(line) > 3 and np.array_equal(line[0], line[-1])
+        points = line[:-1] if closed else line
+        approx = cv2.approxPolyDP(points.reshape(-1, 1, 2), epsilon, closed).reshape(-1, 2)
+        if closed and len(approx) >= 2:
+            approx = np.vstack([approx, approx[:1]])
+        if len(approx) >= 2:
+            simplified.append(approx)
+    return simplified
+
+def _segment_count(polylines):
+    return sum(len(line) - 1 for line in polylines)
+
+def optimize_strokes(bundle, max_segments=MAX_SEGMENTS_PER_FRAME, epsilon=SIMPLIFY_EPSILON, min_length=None):
+    """
+    Post-trace optimisation: speckle removal, Douglas-Peucker simplification,
+    merging of adjacent collinear subpaths, and a hard cap on total segments.
+    Returns the optimised StrokeBundle and a report of before/after counts.
+    """
+    polylines = [np.asarray(line, dtype=np.float32) for line in bundle.polylines()]
+    report = {'paths_before': len(polylines), 'segments_before': _segment_count(polylines)}
+
+    # Speckles: subpaths too short to be visible at render resolution
+    if min_length is None:
+        min_length = SPECKLE_FRACTION * float(np.hypot(bundle.width, bundle.height))
+    polylines = [line for line in polylines if _polyline_length(line) >= min_length]
+
+    polylines = _merge_adjacent(_simplify(polylines, epsilon))
+    # Coarsen until the drawing fits the budget, then keep the longest strokes
+    while max_segments and _segment_count(polylines) > max_segments and epsilon < SIMPLIFY_EPSILON_MAX:
+        epsilon *= 2
+        polylines = _simplify(polylines, epsilon)
+    if max_segments and _segment_count(polylines) > max_segments:
+        order = sorted(range(len(polylines)), key=lambda i: _polyline_length(polylines[i]), reverse=True)
+        keep, total = set(), 0
+        for i in order:
+            n = len(polylines[i]) - 1
+            if total + n > max_segments:
+                continue
+            keep.add(i)
+            total += n
+        # Preserve drawing order for the reveal
+        polylines = [line for i, line in enumerate(polylines) if i in keep]
+
+    report.update({'paths_after': len(polylines), 'segments_after': _segment_count(polylines), 'epsilon': epsilon})
+    return StrokeBundle.from_polylines(polylines, bundle.width, bundle.height), report
+
+def _format_stroke_report(report):
+    return (f"paths {report['paths_before']} -> {report['paths_after']}, "
+            f"segments {report['segments_before']} -> {report['segments_after']}")
+
 # --- SVG Parsing for Word-Level Animation ---
 def parse_svg_elements(svg_path):
     """
@@ -91,59 +299,88 @@ def parse_svg_elements(svg_path):
     # Optionally add groups or other shapes
     return elements
 
-# --- 2. Animate SVGs with Manim ---
-def animate_svg(svg_path, duration, out_name, output_dir=None, heading=None):
-    # Infer PNG path from SVG path
-    png_path = svg_path.replace('.svg', '.png')
-    heading_code = ''
-    if heading:
-        escaped_heading = heading.replace('"', '\\"')
-        heading_code = f'heading = Text("{escaped_heading}", font="Arial", color=BLACK).scale(0.8).to_edge(UP)\\n        self.play(Write(heading), run_time=2)'
-    
-    manim_script = f"""
-from manim import *
-from svgpathtools import svg2paths
-import numpy as np
-class DrawSVGWithHand(Scene):
-    def construct(self):
-        self.camera.background_color = WHITE
-        {heading_code}
-        svg_path = '{svg_path}'
-        png_path = '{png_path}'
-        svg = SVGMobject(svg_path, fill_opacity=0, stroke_width=3)
-        svg.set_color(BLACK)
-        svg.scale(3.0)
-        self.add(svg)
-        self.play(Create(svg), run_time={duration})
-        # Pop in the original image
-        img = ImageMobject(png_path)
-        img.width = svg.width
-        img.height = svg.height
-        img.move_to(svg.get_center())
-        self.play(FadeIn(img), FadeOut(svg), run_time=0.5)
-        self.wait(0.5)
-"""
-    script_path = f"draw_svg_temp.py"
-    with open(script_path, 'w') as f:
-        f.write(manim_script)
-    subprocess.run([
-        'manim', '-ql', '--disable_caching', script_path, 'DrawSVGWithHand',
-        '-o', out_name
-    ], check=True)
-    # Find the output video
+# --- 2. Animate SVGs ---
+@metrics.timed("render")
+def animate_svg(svg_path, duration, out_name, output_dir=None, heading=None, engine=None,
+                media_dir='media', png_path=None):
+    """
+    Render the stroke-reveal clip for an SVG.
+    engine: "stroke" (native renderer piping frames into ffmpeg) or "manim" (warm Manim workers).
+    The Manim path is used as a fallback when the native renderer fails.
+    media_dir: scratch tree the renderer writes into, so concurrent renders don't collide.
+    Finished clips are kept in the render cache; a hit returns the stored clip without rendering.
+    """
+    engine = engine or RENDER_ENGINE
+    job_events.stage("render")
+    # svg_path may also be a stroke bundle from png_to_strokes
+    is_bundle = svg_path.endswith('.npz')
+    png_path = png_path or os.path.splitext(svg_path)[0] + '.png'
+    cache = get_cache(RENDER_CACHE_DIR, RENDER_CACHE_MAX_MB)
+    cache_key = _render_cache_key(svg_path, png_path, duration, heading, engine) if cache.enabled else None
+    final_path = os.path.join(output_dir or os.path.join(media_dir, 'videos', 'cached'), out_name)
+    if cache_key and cache.get(cache_key) is not None:
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        if cache.fetch(cache_key, 'clip.mp4', final_path):
+            print(f"[animate_svg] {out_name}: served from render cache")
+            job_events.sentence_done("render", cached=True)
+            return final_path
     video_path = None
-    for root, dirs, files in os.walk('media/videos'):
-        if out_name in files:
-            video_path = os.path.join(root, out_name)
-            break
-    if not video_path:
-        raise Exception('SVG animation video not found')
+    rendered_by = engine
+    if engine == "stroke":
+        try:
+            strokes = StrokeBundle.load(svg_path) if is_bundle else load_svg_polylines(svg_path)
+            video_path = os.path.join(media_dir, 'videos', 'stroke', out_name)
+            render_stroke_reveal(strokes, png_path, duration, video_path,
+                                 heading=heading, quality=render_pool.RENDER_QUALITY,
+                                 on_frame=job_events.frame_reporter())
+        except Exception as e:
+            print(f"Warning: stroke renderer failed, falling back to Manim: {e}")
+            video_path = None
+    if video_path is None:
+        rendered_by = "manim"
+        if is_bundle:
+            svg_path = StrokeBundle.load(svg_path).to_svg(svg_path.replace('.npz', '.svg'))
+        # Render on a warm worker instead of shelling out to the manim CLI
+        job = RenderJob(svg_path=svg_path, duration=duration, out_name=out_name,
+                        png_path=png_path, heading=heading, media_dir=media_dir)
+        with job_events.span("manim", "render"):
+            video_path = render_pool.render(job)
+    # A clip from the Manim fallback is not what this engine's key promises
+    if cache_key and rendered_by == engine:
+        cache.put(cache_key, {'clip.mp4': video_path})
+    job_events.sentence_done("render", cached=False)
+    metrics.file_written("clip", video_path)
     if output_dir:
         new_video_path = os.path.join(output_dir, out_name)
         os.rename(video_path, new_video_path)
         return new_video_path
     return video_path
 
+def _render_cache_key(svg_path, png_path, duration, heading, engine):
+    """
+    Identity of the drawing and PNG plus every setting that changes the rendered clip.
+    A drawing traced from png_path by _cached_trace is identified by its trace key, which
+    already covers the PNG's content and the trace settings; anything else is hashed.
+    """
+    version = stroke_renderer.RENDERER_VERSION if engine == "stroke" else render_pool.SCENE_VERSION
+    settings = (round(float(duration), 3), render_pool.RENDER_QUALITY, heading, engine, version)
+    traced = _traced_by(svg_path, png_path)
+    if traced is not None:
+        return DiskCache.make_key("render", traced, *settings)
+    digest = hashlib.sha256()
+    if svg_path.endswith('.npz'):
+        # Hash the arrays, not the zip container (whose timestamps change on every save)
+        bundle = StrokeBundle.load(svg_path)
+        for array in (bundle.points, bundle.offsets, np.array([bundle.width, bundle.height])):
+            digest.update(np.ascontiguousarray(array).tobytes())
+    else:
+        with open(svg_path, 'rb') as f:
+            digest.update(f.read())
+    if os.path.exists(png_path):
+        with open(png_path, 'rb') as f:
+            digest.update(f.read())
+    return DiskCache.make_key("render", digest.hexdigest(), *settings)
+
 def generate_manim_script_word_sync(svg_path, word_svg_mapping, out_name, audio_path=None, heading=None):
     """
     Generate a Manim script that animates SVG sub-elements in sync with word timings.
@@ -186,41 +423,28 @@ class DrawSVGWordSync(Scene):
 
 # --- 3. Concatenate Videos and Add Audio ---
 def concatenate_videos(video_paths, output_path):
-    from moviepy.editor import VideoFileClip, concatenate_videoclips
-    clips = [VideoFileClip(v) for v in video_paths]
-    final = concatenate_videoclips(clips, method="compose")
-    final.write_videofile(output_path, codec='libx264', audio=False)
-    for c in clips:
-        c.close()
-    return output_path
+    # Stream copy through the ffmpeg concat demuxer when the clips match
+    return ffmpeg_tools.concat_videos(video_paths, output_path)
 
 def merge_videos_and_audio(video_paths, audio_path, output_path):
     """
     Merge video clips and add audio to create final video
     """
-    from moviepy.editor import VideoFileClip, concatenate_videoclips, AudioFileClip
-    
     if not video_paths:
         raise Exception("No video paths provided")
     
-    # Load video clips
-    clips = [VideoFileClip(v) for v in video_paths]
+    if not (audio_path and os.path.exists(audio_path)):
+        return concatenate_videos(video_paths, output_path)
     
-    # Concatenate videos
-    final_video = concatenate_videoclips(clips, method="compose")
-    
-    # Add audio if provided
-    if audio_path and os.path.exists(audio_path):
-        audio_clip = AudioFileClip(audio_path)
-        final_video = final_video.set_audio(audio_clip)
-    
-    # Write final video
-    final_video.write_videofile(output_path, codec='libx264', audio_codec='aac', verbose=False, logger=None)
-    
-    # Clean up
-    final_video.close()
-    for clip in clips:
-        clip.close()
+    # Concatenate videos, then mux the audio over a stream copy of the result
+    root, ext = os.path.splitext(output_path)
+    concat_path = f"{root}_video{ext}"
+    concatenate_videos(video_paths, concat_path)
+    try:
+        ffmpeg_tools.mux_audio(concat_path, audio_path, output_path)
+    finally:
+        if os.path.exists(concat_path):
+            os.remove(concat_path)
     
     return output_path
 
@@ -0,0 +1,213 @@
+"""
+ffmpeg helpers for assembling clips.
+
+Every scene clip comes out of the same renderer with the same codec, size and
+frame rate, so concatenation is normally a stream copy through the concat
+demuxer. Inputs that don't match are normalised in a single re-encode, opening
+at most MAX_OPEN_INPUTS files at a time.
+"""
+
+import json
+import os
+import tempfile
+
+from services import job_events, job_trace, metrics
+
+# Upper bound on inputs a single ffmpeg re-encode opens at once
+MAX_OPEN_INPUTS = int(os.getenv("DOODLY_CONCAT_MAX_OPEN", "16"))
+# Stream properties that must match for the concat demuxer to stream-copy
+_COPY_KEYS = ("codec_name", "profile", "width", "height", "pix_fmt", "r_frame_rate", "time_base")
+
+
+def probe(path: str) -> dict:
+    """Return the first video stream's properties and the container duration."""
+    result = job_trace.run([
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=' + ','.join(_COPY_KEYS) + ':format=duration',
+        '-of', 'json', path,
+    ], check=True, capture_output=True, text=True)
+    info = json.loads(result.stdout)
+    if not info.get('streams'):
+        raise Exception(f"No video stream in {path}")
+    stream = info['streams'][0]
+    stream['duration'] = float(info.get('format', {}).get('duration') or 0.0)
+    return stream
+
+
+def _compatible(probes: list) -> bool:
+    reference = {k: probes[0].get(k) for k in _COPY_KEYS}
+    return all({k: p.get(k) for k in _COPY_KEYS} == reference for p in probes)
+
+
+def _run(args: list):
+    job_trace.run(['ffmpeg', '-y', '-loglevel', 'error', *args], check=True)
+
+
+def _write_concat_list(paths: list, directory: str, durations: list = None) -> str:
+    """Concat demuxer script for paths; durations (for stills) set how long each is shown."""
+    fd, list_path = tempfile.mkstemp(suffix='.txt', dir=directory)
+    with os.fdopen(fd, 'w') as f:
+        for i, path in enumerate(paths):
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+            if durations is not None:
+                f.write(f"duration {durations[i]:.3f}\n")
+        if durations is not None and paths:
+            # The demuxer ignores the last entry's duration unless the file is listed again
+            f.write(f"file '{escaped}'\n")
+    return list_path
+
+
+def concat_copy(paths: list, output_path: str) -> str:
+    """Concatenate compatible clips with the concat demuxer, without re-encoding."""
+    list_path = _write_concat_list(paths, os.path.dirname(os.path.abspath(output_path)))
+    try:
+        _run(['-f', 'concat', '-safe', '0', '-i', list_path,
+              '-map', '0:v', '-c', 'copy', '-movflags', '+faststart', output_path])
+    finally:
+        os.remove(list_path)
+    return output_path
+
+
+def _concat_reencode(paths: list, output_path: str, width: int, height: int, fps: str):
+    """Normalise clips to one size/rate/pixel format and concatenate them in a single encode."""
+    inputs, filters, labels = [], [], []
+    for i, path in enumerate(paths):
+        inputs += ['-i', path]
+        filters.append(
+            f"[{i}:v]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:color=white,"
+            f"fps={fps},format=yuv420p,setsar=1[v{i}]"
+        )
+        labels.append(f"[v{i}]")
+    filters.append(f"{''.join(labels)}concat=n={len(paths)}:v=1:a=0[out]")
+    _run([*inputs, '-filter_complex', ';'.join(filters), '-map', '[out]',
+          '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+          '-movflags', '+faststart', output_path])
+
+
+@metrics.timed("concat")
+def concat_videos(paths: list, output_path: str) -> str:
+    """
+    Concatenate clips into output_path (video only). Compatible inputs are
+    stream-copied; otherwise they are re-encoded to the first clip's profile,
+    in batches of MAX_OPEN_INPUTS that are then stream-copied together.
+    """
+    if not paths:
+        raise Exception("No video paths provided")
+    job_events.stage("concat")
+    probes = [probe(p) for p in paths]
+    if _compatible(probes):
+        return concat_copy(paths, output_path)
+
+    print(f"[ffmpeg_tools] Inputs differ in codec/size/rate, re-encoding {len(paths)} clips")
+    width, height, fps = probes[0]['width'], probes[0]['height'], probes[0]['r_frame_rate']
+    if len(paths) <= MAX_OPEN_INPUTS:
+        _concat_reencode(paths, output_path, width, height, fps)
+        return output_path
+    out_dir = os.path.dirname(os.path.abspath(output_path))
+    parts = []
+    try:
+        for start in range(0, len(paths), MAX_OPEN_INPUTS):
+            part = tempfile.mkstemp(suffix='.mp4', dir=out_dir)
+            os.close(part[0])
+            parts.append(part[1])
+            _concat_reencode(paths[start:start + MAX_OPEN_INPUTS], part[1], width, height, fps)
+        return concat_copy(parts, output_path)
+    finally:
+        for part in parts:
+            if os.path.exists(part):
+                os.remove(part)
+
+
+@metrics.timed("mux")
+def mux_audio(video_path: str, audio_path: str, output_path: str) -> str:
+    """
+    Add an audio track to a video, copying the video stream and encoding only the audio.
+    The output keeps the video's duration.
+    """
+    job_events.stage("mux")
+    duration = probe(video_path)['duration']
+    _run(['-i', video_path, '-i', audio_path, '-map', '0:v', '-map', '1:a',
+          '-c:v', 'copy', '-c:a', 'aac', '-t', f"{duration:.3f}",
+          '-movflags', '+faststart', output_path])
+    metrics.file_written("video", output_path)
+    return output_path
+
+
+def assemble_final_video(video_paths: list, audio_paths: list, output_path: str,
+                         audio_durations: list = None, pad_to_scenes: bool = True) -> str:
+    """
+    Produce the final video from scene clips and per-sentence audio in one ffmpeg run:
+    the clips are stream-copied through the concat demuxer and only the audio is encoded.
+    The audio is assembled as a PCM timeline and piped in, so each MP3 is decoded once;
+    with pad_to_scenes each sentence is padded with silence to the length of its clip.
+    Clips that can't be stream-copied are first normalised by concat_videos.
+    """
+    from services.audio_timeline import AudioTimeline
+
+    if not video_paths:
+        raise Exception("No video paths provided")
+    job_events.stage("concat")
+    probes = [probe(p) for p in video_paths]
+    out_dir = os.path.dirname(os.path.abspath(output_path))
+    normalised = None
+    timeline = None
+    if audio_paths:
+        timeline = AudioTimeline.from_segments(
+            audio_paths, durations=audio_durations,
+            slot_durations=[p['duration'] for p in probes] if pad_to_scenes else None,
+        )
+    if not _compatible(probes):
+        fd, normalised = tempfile.mkstemp(suffix='.mp4', dir=out_dir)
+        os.close(fd)
+        concat_videos(video_paths, normalised)
+        video_paths = [normalised]
+    duration = sum(p['duration'] for p in probes)
+    job_events.stage("mux")
+    video_list = _write_concat_list(video_paths, out_dir)
+    try:
+        args = ['-f', 'concat', '-safe', '0', '-i', video_list]
+        if timeline is not None:
+            args += [*timeline.ffmpeg_input_args(), '-map', '0:v', '-map', '1:a', '-c:a', 'aac']
+        else:
+            args += ['-map', '0:v']
+        args += ['-c:v', 'copy', '-t', f"{duration:.3f}", '-movflags', '+faststart', output_path]
+        # Clips are stream-copied in this same run, so it is all timed as mux
+        with metrics.stage_timer("mux"):
+            job_trace.run(['ffmpeg', '-y', '-loglevel', 'error', *args], check=True,
+                           input=timeline.to_bytes() if timeline is not None else None)
+        metrics.file_written("video", output_path)
+    finally:
+        for path in (video_list, normalised):
+            if path and os.path.exists(path):
+                os.remove(path)
+    return output_path
+
+
+@metrics.timed("mux")
+def images_to_video(image_paths: list, durations: list, audio_paths: list, output_path: str,
+                    width: int, height: int, fps: int = 24) -> str:
+    """
+    Encode a slideshow in one ffmpeg run: each image is shown for its duration, scaled
+    to width x height, over the per-sentence audio. The images go through the concat
+    demuxer and the audio is piped in as a PCM timeline, as in assemble_final_video.
+    """
+    from services.audio_timeline import AudioTimeline
+
+    if not image_paths:
+        raise Exception("No image paths provided")
+    job_events.stage("mux")
+    timeline = AudioTimeline.from_segments(audio_paths, durations=durations)
+    image_list = _write_concat_list(image_paths, os.path.dirname(os.path.abspath(output_path)), durations)
+    try:
+        args = ['-f', 'concat', '-safe', '0', '-i', image_list, *timeline.ffmpeg_input_args(),
+                '-map', '0:v', '-map', '1:a',
+                '-vf', f"scale={width}:{height},setsar=1,fps={fps},format=yuv420p",
+                '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', '-c:a', 'aac',
+                '-t', f"{sum(durations):.3f}", '-movflags', '+faststart', output_path]
+        job_trace.run(['ffmpeg', '-y', '-loglevel', 'error', *args], check=True, input=timeline.to_bytes())
+        metrics.file_written("video", output_path)
+    finally:
+        os.remove(image_list)
+    return output_path
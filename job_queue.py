@@ -0,0 +1,452 @@
+"""
+Submit/poll job queue for long-running video jobs.
+
+A job is recorded in a local SQLite store the moment it is submitted and runs on
+one of a fixed set of worker threads, each with its own event loop, so the request
+loop only ever does a quick insert or lookup. A free worker takes the queued job
+that job_scheduler.JobScheduler picks (priority, then shortest expected run time,
+with an aging limit), using the cost estimate registered for the job's kind. Job state (queued, running stage N/M,
+done with its result, failed with its error) is kept in the store, so it survives
+a restart: jobs that were queued or running when the process stopped are queued
+again on startup. A job may name a webhook that is POSTed its final state; its URL
+must pass check_webhook_url (http/https to a public address or an allow-listed host).
+The queue is bounded: once JOB_MAX_QUEUED jobs are waiting, submit raises
+admission.Overloaded with a Retry-After estimated from the queued jobs' costs.
+Status changes, and whatever progress the services report through
+services.job_events while the job runs, are appended to the job's event log;
+the spans they record make up the job's trace (services.job_trace). A finished
+job's result carries the CPU, memory, disk and provider usage it was charged
+(services.job_usage). A job whose request sets "profile" runs under the sampling
+profiler (services.profiler) and its collapsed stacks are saved to profile_dir.
+"""
+
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+import uuid
+from contextlib import ExitStack
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+import requests
+
+from admission import Overloaded
+from job_scheduler import JobScheduler, Pending
+from services import job_events, job_trace, profiler
+from services.job_events import JOB_DB_PATH
+from services.job_usage import JobUsage
+
+# Jobs running at once
+JOB_WORKERS = int(os.getenv("DOODLY_JOB_WORKERS", "2"))
+WEBHOOK_TIMEOUT = float(os.getenv("DOODLY_WEBHOOK_TIMEOUT", "10"))
+# Comma-separated hosts webhooks may be sent to; when unset, any host with only public addresses
+WEBHOOK_ALLOWED_HOSTS = {host.strip().lower() for host in os.getenv("DOODLY_WEBHOOK_ALLOWED_HOSTS", "").split(",")
+                         if host.strip()}
+# Jobs that may wait for a worker; submissions beyond that are rejected
+JOB_MAX_QUEUED = int(os.getenv("DOODLY_MAX_QUEUED_JOBS", "20"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = ("id", "kind", "status", "stage", "stage_index", "stage_count", "request",
+            "result", "error", "webhook_url", "created_at", "started_at", "finished_at",
+            "priority", "estimated_s")
+
+
+class JobStore:
+    """Job state in a SQLite file, safe to use from several threads."""
+
+    def __init__(self, path: str = None):
+        self.path = path or JOB_DB_PATH
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    stage_index INTEGER,
+                    stage_count INTEGER,
+                    request TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    webhook_url TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    estimated_s REAL
+                )
+            """)
+            # Stores created before jobs were scheduled by cost
+            existing = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "priority" not in existing:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+            if "estimated_s" not in existing:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN estimated_s REAL")
+
+    def create(self, kind: str, request: dict, webhook_url: Optional[str] = None,
+               priority: int = 0, estimated_s: Optional[float] = None) -> str:
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, request, webhook_url, created_at, priority, estimated_s) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(request), webhook_url, time.time(), priority, estimated_s),
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(_COLUMNS, row))
+        job["request"] = json.loads(job["request"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def unfinished(self) -> list:
+        """Ids of jobs that were queued or running, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def recent_timings(self, limit: int = 100) -> list:
+        """(queue wait, run time) in seconds of the most recently finished jobs."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT started_at - created_at, finished_at - started_at FROM jobs "
+                "WHERE finished_at IS NOT NULL AND started_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return rows
+
+
+def check_webhook_url(url: str):
+    """
+    Raise ValueError unless the server may POST to url: http or https, and a host on
+    WEBHOOK_ALLOWED_HOSTS or, with no allow-list, one whose every address is public. Clients
+    choose the URL, so this keeps them from aiming the server at internal services and
+    cloud metadata endpoints (private, loopback and link-local addresses).
+    """
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("webhook_url must be an http or https URL")
+    host = parsed.hostname.lower()
+    if WEBHOOK_ALLOWED_HOSTS:
+        if host not in WEBHOOK_ALLOWED_HOSTS:
+            raise ValueError(f"webhook_url host {host} is not allowed")
+        return
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError) as e:
+        raise ValueError(f"webhook_url host {host} does not resolve: {e}")
+    for address in addresses:
+        # Scoped IPv6 addresses carry a %zone suffix
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"webhook_url host {host} resolves to non-public address {ip}")
+
+
+def public_view(job: dict) -> dict:
+    """The job as returned by the polling endpoint."""
+    view = {"job_id": job["id"], "status": job["status"]}
+    if job["status"] in (QUEUED, RUNNING) and job["estimated_s"] is not None:
+        view["estimated_s"] = round(job["estimated_s"], 1)
+    if job["status"] == RUNNING and job["stage"]:
+        view["stage"] = job["stage"]
+        view["progress"] = f"{job['stage_index']}/{job['stage_count']}"
+    if job["status"] == DONE:
+        view["result"] = job["result"]
+    if job["status"] == FAILED:
+        view["error"] = job["error"]
+    return view
+
+
+class JobProgress:
+    """
+    Handed to a job handler to record which of its stages is running. Handlers call it
+    from their event loop, so the store is updated on job_events' writer thread.
+    """
+
+    def __init__(self, store: JobStore, job_id: str, stages: Sequence[str]):
+        self.store = store
+        self.job_id = job_id
+        self.stages = list(stages)
+        self._current: Optional[tuple] = None  # (stage, started) for the job's trace
+
+    def stage(self, name: str):
+        index = self.stages.index(name) + 1 if name in self.stages else None
+        job_events.defer(self.store.update, self.job_id, stage=name, stage_index=index,
+                         stage_count=len(self.stages))
+        print(f"[Job {self.job_id}] stage {index}/{len(self.stages)}: {name}")
+        self.finish()
+        self._current = (name, time.time())
+
+    def finish(self):
+        """Close the running stage's span in the job's trace."""
+        if self._current is not None:
+            name, started = self._current
+            job_events.add_span(name, "job", started, time.time() - started, job_id=self.job_id, track=0)
+            self._current = None
+
+
+# handler(job_id, request, progress) -> result dict
+JobHandler = Callable[[str, dict, JobProgress], Awaitable[dict]]
+# estimate(request) -> expected run time in seconds
+CostEstimate = Callable[[dict], float]
+
+
+class JobRunner:
+    """Runs submitted jobs on a fixed set of worker threads, in scheduler order; one event loop per job."""
+
+    def __init__(self, store: JobStore, workers: int = None, max_queued: int = None,
+                 scheduler: JobScheduler = None, trace_dir: Optional[str] = None,
+                 scratch_dirs: Sequence[str] = (), profile_dir: Optional[str] = None):
+        self.store = store
+        # Each finished job's Chrome trace is written here as trace_<job_id>.json
+        self.trace_dir = trace_dir
+        # Where jobs write intermediate files named after their job id (for usage accounting)
+        self.scratch_dirs = list(scratch_dirs)
+        # Profiled jobs write their collapsed stacks here as profile_<job_id>.folded
+        self.profile_dir = profile_dir
+        self.workers = workers or JOB_WORKERS
+        self.max_queued = JOB_MAX_QUEUED if max_queued is None else max_queued
+        self.scheduler = scheduler or JobScheduler()
+        self._handlers: Dict[str, tuple] = {}
+        self._pending: Pending = {}
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        # Bumped by shutdown, so workers of an earlier start() exit
+        self._generation = 0
+
+    def register(self, kind: str, handler: JobHandler, stages: Sequence[str],
+                 estimate: Optional[CostEstimate] = None):
+        self._handlers[kind] = (handler, stages, estimate)
+
+    def _estimate(self, kind: str, request: dict) -> float:
+        estimate = self._handlers[kind][2]
+        if estimate is None:
+            return 0.0
+        try:
+            return estimate(request)
+        except Exception as e:
+            print(f"[JobRunner] Could not estimate {kind} job: {e}")
+            return 0.0
+
+    def _enqueue(self, job: dict):
+        with self._cond:
+            self._pending[job["id"]] = (job["priority"], job["estimated_s"] or 0.0, job["created_at"])
+            self._cond.notify()
+
+    def start(self):
+        """Start the workers and requeue jobs left unfinished by a previous process."""
+        with self._cond:
+            if self._threads:
+                return
+            self._threads = [threading.Thread(target=self._worker, args=(self._generation,),
+                                              name=f"job-{i}", daemon=True)
+                             for i in range(self.workers)]
+        for job_id in self.store.unfinished():
+            print(f"[JobRunner] Requeueing unfinished job {job_id}")
+            self.store.update(job_id, status=QUEUED, stage=None, stage_index=None, stage_count=None)
+            job = self.store.get(job_id)
+            if job["estimated_s"] is None and job["kind"] in self._handlers:
+                job["estimated_s"] = self._estimate(job["kind"], job["request"])
+                self.store.update(job_id, estimated_s=job["estimated_s"])
+            self._enqueue(job)
+        for thread in self._threads:
+            thread.start()
+
+    def shutdown(self):
+        """Stop taking queued jobs; running jobs are left to finish (or be requeued on restart)."""
+        with self._cond:
+            self._generation += 1
+            self._threads = []
+            self._pending.clear()
+            self._cond.notify_all()
+
+    def submit(self, kind: str, request: dict, webhook_url: Optional[str] = None, priority: int = 0) -> str:
+        """Queue a job; higher priority jobs are taken before lower ones."""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        self.start()
+        queued = self.store.counts().get(QUEUED, 0)
+        if queued >= self.max_queued:
+            raise Overloaded(f"Job queue full: {queued} jobs waiting", self.retry_after(queued))
+        estimated_s = self._estimate(kind, request)
+        job_id = self.store.create(kind, request, webhook_url, priority=priority, estimated_s=estimated_s)
+        job_events.emit("status", job_id=job_id, status=QUEUED, estimated_s=round(estimated_s, 1))
+        self._enqueue(self.store.get(job_id))
+        return job_id
+
+    def retry_after(self, queued: int) -> float:
+        """Rough seconds until a job submitted now would start."""
+        with self._cond:
+            pending = [cost for _, cost, _ in self._pending.values()]
+        if any(pending):
+            return sum(pending) / self.workers
+        runs = [run for _, run in self.store.recent_timings(20)]
+        run = sum(runs) / len(runs) if runs else 60.0
+        return run * (queued // self.workers + 1)
+
+    def stats(self) -> dict:
+        counts = self.store.counts()
+        waits = [wait for wait, _ in self.store.recent_timings()]
+        with self._cond:
+            queued_s = sum(cost for _, cost, _ in self._pending.values())
+        return {
+            "running": counts.get(RUNNING, 0),
+            "workers": self.workers,
+            "queued": counts.get(QUEUED, 0),
+            "max_queued": self.max_queued,
+            "queued_estimated_s": round(queued_s, 1),
+            "wait_s": {
+                "avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "max": round(max(waits), 3) if waits else 0.0,
+            },
+        }
+
+    async def wait(self, job_id: str, poll_interval: float = 1.0) -> dict:
+        """Wait (without blocking the event loop) until the job is done or failed."""
+        while True:
+            job = self.store.get(job_id)
+            if job is None or job["status"] in (DONE, FAILED):
+                return job
+            await asyncio.sleep(poll_interval)
+
+    def _worker(self, generation: int):
+        while True:
+            with self._cond:
+                while not self._pending and generation == self._generation:
+                    self._cond.wait()
+                if generation != self._generation:
+                    return
+                job_id = self.scheduler.pick(self._pending)
+                del self._pending[job_id]
+            try:
+                self._run(job_id)
+            except Exception as e:
+                print(f"[JobRunner] Worker error on job {job_id}: {e}")
+
+    def _run(self, job_id: str):
+        job = self.store.get(job_id)
+        if job is None or job["status"] in (DONE, FAILED):
+            return
+        handler, stages, _ = self._handlers[job["kind"]]
+        job_events.prune_if_due()
+        self.store.update(job_id, status=RUNNING, started_at=time.time())
+        job_events.emit("status", job_id=job_id, status=RUNNING)
+        progress = JobProgress(self.store, job_id, stages)
+        usage = JobUsage(job_id, self.scratch_dirs)
+        sampler = self._sampler(job_id, job["request"])
+        try:
+            with ExitStack() as stack:
+                stack.enter_context(job_events.bound(job_id))
+                stack.enter_context(job_events.span(job["kind"], "job", job_id=job_id))
+                stack.enter_context(usage.track())
+                if sampler is not None:
+                    stack.enter_context(sampler.running())
+                try:
+                    result = asyncio.run(handler(job_id, job["request"], progress))
+                finally:
+                    progress.finish()
+                    job_events.flush()
+        except Exception as e:
+            print(f"[JobRunner] Job {job_id} failed: {e}")
+            self._report_usage(usage)
+            self.store.update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+            job_events.emit("status", job_id=job_id, status=FAILED, error=str(e))
+        else:
+            summary = self._report_usage(usage)
+            if isinstance(result, dict):
+                result["usage"] = summary
+            if isinstance(result, dict) and sampler is not None and os.path.exists(sampler.path):
+                # Just the file name: profile_dir is private to the server
+                result["profile"] = os.path.basename(sampler.path)
+            self.store.update(job_id, status=DONE, result=result, finished_at=time.time())
+            job_events.emit("status", job_id=job_id, status=DONE, result=result)
+        self._write_trace(job_id)
+        if job["webhook_url"]:
+            self._notify(job["webhook_url"], public_view(self.store.get(job_id)))
+
+    def profile_path(self, job_id: str) -> Optional[str]:
+        """Where a profiled job's collapsed stacks are written, or None if jobs aren't profiled."""
+        if self.profile_dir is None:
+            return None
+        return os.path.join(self.profile_dir, f"profile_{job_id}.folded")
+
+    def _sampler(self, job_id: str, request: dict) -> Optional[profiler.Sampler]:
+        if not request.get("profile") or self.profile_dir is None:
+            return None
+        if not profiler.PROFILING_ALLOWED:
+            print(f"[JobRunner] Profiling disabled, running job {job_id} unprofiled")
+            return None
+        return profiler.Sampler(self.profile_path(job_id))
+
+    @staticmethod
+    def _report_usage(usage: JobUsage) -> dict:
+        summary = usage.summary()
+        job_events.emit("usage", job_id=usage.job_id, **summary)
+        return summary
+
+    def trace_path(self, job_id: str) -> Optional[str]:
+        """Where the job's Chrome trace is written when it ends, or None if traces aren't kept."""
+        if self.trace_dir is None:
+            return None
+        return os.path.join(self.trace_dir, f"trace_{job_id}.json")
+
+    def _write_trace(self, job_id: str):
+        if self.trace_dir is None or not job_events.SPANS_ENABLED:
+            return
+        try:
+            path = job_trace.write_chrome_trace(job_id, self.trace_path(job_id))
+            print(f"[JobRunner] Trace for job {job_id} written to {path}")
+        except (OSError, sqlite3.Error) as e:
+            print(f"[JobRunner] Could not write trace for job {job_id}: {e}")
+
+    @staticmethod
+    def _notify(url: str, payload: dict):
+        try:
+            # Checked again at send time: the host's addresses may have changed since submit
+            check_webhook_url(url)
+        except ValueError as e:
+            logger.warning("Webhook for job %s not sent: %s", payload["job_id"], e)
+            return
+        try:
+            # Redirects aren't followed, so an allowed host can't bounce the POST elsewhere
+            response = requests.post(url, json=payload, timeout=WEBHOOK_TIMEOUT, allow_redirects=False)
+            if response.status_code >= 400:
+                logger.warning("Webhook %s answered HTTP %s", url, response.status_code)
+        except requests.RequestException as e:
+            logger.warning("Webhook %s failed: %s", url, e)
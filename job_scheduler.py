@@ -0,0 +1,126 @@
+"""
+Cost-aware ordering for queued jobs.
+
+Free job workers take the queued job that is expected to finish soonest, so a
+three-sentence clip doesn't wait behind a sixty-sentence lecture. Callers can
+raise a job's priority to put it ahead of every lower-priority job, and a job
+that has waited longer than SCHEDULER_MAX_WAIT goes ahead of everything else,
+oldest first, so long jobs cannot starve.
+
+A script video's expected run time is estimated from its sentence count,
+image_quality and animation_duration (or the speech length of the script),
+using per-stage rates learned from finished jobs and kept in the job database.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from script_pipeline import PIPELINE_IMAGE_WORKERS, PIPELINE_RENDER_WORKERS, PIPELINE_TTS_WORKERS
+from services.job_events import JOB_DB_PATH
+from services.script_service import split_sentences
+
+# Seconds a job may wait before it is run ahead of shorter and higher-priority jobs
+SCHEDULER_MAX_WAIT = float(os.getenv("DOODLY_SCHEDULER_MAX_WAIT", "900"))
+# Weight of each finished job in the learned stage rates
+RATE_SMOOTHING = 0.3
+
+# Starting rates until finished jobs have been observed
+DEFAULT_RATES = {
+    "tts_s": 2.0,              # TTS busy time per sentence
+    "image_s:low": 15.0,       # image generation busy time per sentence, by quality
+    "image_s:medium": 25.0,
+    "image_s:high": 45.0,
+    "render_s": 1.0,           # trace + render busy time per second of clip
+    "speech_words_per_s": 2.5,
+    "overhead_s": 5.0,         # split, assembly and upload
+}
+
+# job_id -> (priority, estimated seconds, created_at)
+Pending = Dict[str, Tuple[int, float, float]]
+
+
+class JobScheduler:
+    """Picks the next queued job: starving jobs first, then by priority, then shortest expected."""
+
+    def __init__(self, max_wait: float = None):
+        self.max_wait = SCHEDULER_MAX_WAIT if max_wait is None else max_wait
+
+    def pick(self, pending: Pending, now: float = None) -> Optional[str]:
+        if not pending:
+            return None
+        now = time.time() if now is None else now
+
+        def order(entry):
+            job_id, (priority, cost, created_at) = entry
+            if now - created_at >= self.max_wait:
+                return (0, created_at)
+            return (1, -priority, cost, created_at)
+
+        return min(pending.items(), key=order)[0]
+
+
+class ScriptVideoCostModel:
+    """Expected run time of a script video job, from stage rates learned across jobs."""
+
+    def __init__(self, path: str = None):
+        self.path = path or JOB_DB_PATH
+        self.rates = dict(DEFAULT_RATES)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        with self._lock:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS stage_rates (name TEXT PRIMARY KEY, value REAL NOT NULL)")
+            self.rates.update(self._conn.execute("SELECT name, value FROM stage_rates").fetchall())
+
+    def _rate(self, name: str) -> float:
+        return self.rates.get(name, DEFAULT_RATES.get(name, DEFAULT_RATES["image_s:medium"]))
+
+    def _clip_seconds(self, script: str, sentences: int, animation_duration: Optional[float]) -> float:
+        if animation_duration is not None:
+            return animation_duration * sentences
+        return len(script.split()) / self._rate("speech_words_per_s")
+
+    def estimate(self, request: dict) -> float:
+        """Expected wall-clock seconds for a /generate-script-video request body."""
+        script = request.get("script", "")
+        sentences = max(1, len(split_sentences(script)))
+        clip_s = self._clip_seconds(script, sentences, request.get("animation_duration"))
+        tts = self._rate("tts_s")
+        image = self._rate(f"image_s:{request.get('image_quality', 'medium')}")
+        render = self._rate("render_s") * clip_s
+        # Stages overlap, so the slowest stage sets the pace once the first sentence is through
+        busiest = max(sentences * tts / PIPELINE_TTS_WORKERS,
+                      sentences * image / PIPELINE_IMAGE_WORKERS,
+                      render / min(PIPELINE_RENDER_WORKERS, sentences))
+        first_sentence = tts + image + render / sentences
+        return self._rate("overhead_s") + busiest + first_sentence
+
+    def observe(self, request: dict, items, stages: dict, pipeline_s: float, wall_s: float):
+        """
+        Fold a finished job into the learned rates: items are its SentenceItems,
+        stages the pipeline's StageTimings.stage_summary().
+        """
+        if not items:
+            return
+        sentences = len(items)
+        clip_s = sum(item.duration or 0.0 for item in items)
+        if request.get("animation_duration") is not None:
+            clip_s = request["animation_duration"] * sentences
+        words = sum(len(item.sentence.split()) for item in items)
+        speech_s = sum(item.duration or 0.0 for item in items)
+        samples = {"overhead_s": max(0.0, wall_s - pipeline_s)}
+        if "tts" in stages:
+            samples["tts_s"] = stages["tts"]["busy_s"] / sentences
+        if "image" in stages:
+            samples[f"image_s:{request.get('image_quality', 'medium')}"] = stages["image"]["busy_s"] / sentences
+        if "render" in stages and clip_s > 0:
+            samples["render_s"] = stages["render"]["busy_s"] / clip_s
+        if speech_s > 0:
+            samples["speech_words_per_s"] = words / speech_s
+        with self._lock:
+            for name, value in samples.items():
+                self.rates[name] = (1 - RATE_SMOOTHING) * self._rate(name) + RATE_SMOOTHING * value
+                self._conn.execute("INSERT OR REPLACE INTO stage_rates (name, value) VALUES (?, ?)",
+                                   (name, self.rates[name]))
@@ -1,21 +1,31 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-from fastapi import FastAPI, Request
-from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
+from fastapi import Depends, FastAPI, Header, Request
+from fastapi.responses import FileResponse, JSONResponse, HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 import os
+import shutil
+import tempfile
 import uuid
 from services.image_service import ImageService
 import subprocess
-from doodly_pipeline import png_to_svg, animate_svg, concatenate_videos
+from doodly_pipeline import png_to_strokes, animate_svg, concatenate_videos
+from script_pipeline import ScriptVideoPipeline
+from job_queue import JobProgress, JobRunner, JobStore, check_webhook_url, public_view
+from job_scheduler import ScriptVideoCostModel
+import admission
+from ffmpeg_tools import assemble_final_video
 import glob
 from services.script_service import ScriptService
 from services.audio_service import AudioService
 from services.video_generator import VideoGenerator
 import asyncio
+import json
+import time
 from services.s3_service import S3Service
+from services import executors, job_events, job_trace, metrics, profiler
 
 API_OUTPUTS_DIR = 'apiOutputs'
 MERGED_VIDEO_DIR = os.path.join(API_OUTPUTS_DIR, 'video')
@@ -24,6 +34,9 @@ os.makedirs(MERGED_VIDEO_DIR, exist_ok=True)
 
 app = FastAPI(title="Animated SVG Generator")
 app.mount("/apiOutputs", StaticFiles(directory=API_OUTPUTS_DIR), name="apiOutputs")
+# Render-heavy requests get a slot from here; over the limit they queue, then get 429
+admission_controller = admission.AdmissionController()
+admission.install(app)
 
 class GenImageRequest(BaseModel):
     prompt: str
@@ -44,6 +57,11 @@ class ScriptVideoRequest(BaseModel):
     voice_id: str = "pNInz6obpgDQGcFmaJgB"  # Default Adam voice
     video_type: str = "landscape"  # landscape, portrait
     animation_duration: float = None  # Optional: duration for each image animation
+    priority: int = 0  # Optional: queued jobs with a higher priority run first
+    profile: bool = False  # Optional: run under the sampling profiler if the server allows it (or send X-Doodly-Profile: 1)
+
+class ScriptVideoJobRequest(ScriptVideoRequest):
+    webhook_url: str = None  # Optional: POSTed the job's final state
 
 print('DEBUG: OPENAI_API_KEY:', os.getenv('OPENAI_API_KEY'))
 
@@ -51,233 +69,289 @@ print('DEBUG: OPENAI_API_KEY:', os.getenv('OPENAI_API_KEY'))
 async def generate_image(req: GenImageRequest):
     job_id = str(uuid.uuid4())
     image_service = ImageService()
-    image_path = image_service.generate_sketch_image(req.prompt, job_id, 0)
+    image_path = await executors.run_io(image_service.generate_sketch_image, req.prompt, job_id, 0)
     # Move image to apiOutputs
     new_image_path = os.path.join(API_OUTPUTS_DIR, os.path.basename(image_path))
     os.rename(image_path, new_image_path)
     return {"image_url": f"/apiOutputs/{os.path.basename(new_image_path)}"}
 
 @app.post("/animate-svg")
-async def animate_svg_api(req: AnimateSVGRequest):
+async def animate_svg_api(req: AnimateSVGRequest, _slot=Depends(admission_controller.slot)):
     image_path = req.image_url.lstrip("/")
     if not image_path.startswith(API_OUTPUTS_DIR):
         image_path = os.path.join(API_OUTPUTS_DIR, os.path.basename(image_path))
-    svg_path = png_to_svg(image_path)
+    # Trace in-process and render on the CPU pool so the event loop keeps serving other requests
+    bundle_path = await executors.run_cpu(png_to_strokes, image_path, write_svg=True)
+    svg_path = bundle_path.replace('.npz', '.svg')
     out_name = f"svg_anim_{uuid.uuid4()}.mp4"
-    video_path = animate_svg(svg_path, req.duration, out_name)
+    video_path = await executors.run_cpu(animate_svg, bundle_path, req.duration, out_name)
     new_svg_path = os.path.join(API_OUTPUTS_DIR, os.path.basename(svg_path))
     os.rename(svg_path, new_svg_path)
     new_video_path = os.path.join(API_OUTPUTS_DIR, out_name)
     os.rename(video_path, new_video_path)
-    # Cleanup: delete SVG and PBM
-    pbm_path = new_svg_path.replace('.svg', '.pbm')
+    # Cleanup: delete SVG and stroke bundle
     try:
-        if os.path.exists(new_svg_path):
-            os.remove(new_svg_path)
-        if os.path.exists(pbm_path):
-            os.remove(pbm_path)
+        for path in (new_svg_path, bundle_path):
+            if os.path.exists(path):
+                os.remove(path)
     except Exception as e:
-        print(f"Warning: Could not delete SVG/PBM: {e}")
+        print(f"Warning: Could not delete SVG/stroke bundle: {e}")
     return {"svg_url": f"/apiOutputs/{os.path.basename(new_svg_path)}", "video_url": f"/apiOutputs/{os.path.basename(new_video_path)}"}
 
 @app.post("/concatenate-videos")
 async def concatenate_videos_api(req: ConcatVideosRequest):
     video_paths = [v.lstrip("/") for v in req.video_urls]
     output_path = os.path.join(MERGED_VIDEO_DIR, f"final_video_{uuid.uuid4()}.mp4")
-    concatenate_videos(video_paths, output_path)
+    await executors.run_io(concatenate_videos, video_paths, output_path)
     return {"final_video_url": f"/apiOutputs/video/{os.path.basename(output_path)}"}
 
-@app.post("/batch-animate-and-merge")
-async def batch_animate_and_merge(req: BatchAnimateAndMergeRequest):
-    svg_urls = []
-    video_urls = []
-    for item in req.items:
-        image_path = item['image_url'].lstrip("/")
-        if not image_path.startswith(API_OUTPUTS_DIR):
-            image_path = os.path.join(API_OUTPUTS_DIR, os.path.basename(image_path))
-        duration = item['duration']
-        svg_path = png_to_svg(image_path)
-        new_svg_path = os.path.join(API_OUTPUTS_DIR, os.path.basename(svg_path))
-        os.rename(svg_path, new_svg_path)
-        svg_urls.append(f"/apiOutputs/{os.path.basename(new_svg_path)}")
+async def _animate_batch_item(item: dict) -> tuple:
+    """Trace and render one batch item on the CPU pool; returns its SVG and video URLs."""
+    image_path = item['image_url'].lstrip("/")
+    if not image_path.startswith(API_OUTPUTS_DIR):
+        image_path = os.path.join(API_OUTPUTS_DIR, os.path.basename(image_path))
+    # Items run concurrently and may share an image, so each traces into its own directory
+    work_dir = tempfile.mkdtemp(prefix=".batch_", dir=API_OUTPUTS_DIR)
+    try:
+        bundle_path = await executors.run_cpu(png_to_strokes, image_path, output_dir=work_dir, write_svg=True)
+        svg_name = os.path.basename(bundle_path).replace('.npz', '.svg')
         out_name = f"svg_anim_{uuid.uuid4()}.mp4"
-        video_path = animate_svg(new_svg_path, duration, out_name)
-        new_video_path = os.path.join(API_OUTPUTS_DIR, out_name)
-        os.rename(video_path, new_video_path)
-        video_urls.append(f"/apiOutputs/{os.path.basename(new_video_path)}")
-        # Cleanup: delete SVG and PBM
-        pbm_path = new_svg_path.replace('.svg', '.pbm')
-        try:
-            if os.path.exists(new_svg_path):
-                os.remove(new_svg_path)
-            if os.path.exists(pbm_path):
-                os.remove(pbm_path)
-        except Exception as e:
-            print(f"Warning: Could not delete SVG/PBM: {e}")
+        video_path = await executors.run_cpu(animate_svg, bundle_path, item['duration'], out_name,
+                                             png_path=image_path)
+        os.rename(video_path, os.path.join(API_OUTPUTS_DIR, out_name))
+    finally:
+        # Cleanup: delete SVG and stroke bundle
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return f"/apiOutputs/{svg_name}", f"/apiOutputs/{out_name}"
+
+@app.post("/batch-animate-and-merge")
+async def batch_animate_and_merge(req: BatchAnimateAndMergeRequest, _slot=Depends(admission_controller.slot)):
+    # Every item is traced and rendered at once, as far as the CPU pool allows
+    animated = await asyncio.gather(*(_animate_batch_item(item) for item in req.items))
+    svg_urls = [svg_url for svg_url, _ in animated]
+    video_urls = [video_url for _, video_url in animated]
     # Merge all videos
     video_paths = [v.lstrip("/") for v in video_urls]
     output_path = os.path.join(MERGED_VIDEO_DIR, f"final_video_{uuid.uuid4()}.mp4")
-    concatenate_videos(video_paths, output_path)
+    await executors.run_io(concatenate_videos, video_paths, output_path)
     return {
         "svg_urls": svg_urls,
         "video_urls": video_urls,
         "final_video_url": f"/apiOutputs/video/{os.path.basename(output_path)}"
     }
 
-@app.post("/generate-script-video")
-async def generate_script_video(req: ScriptVideoRequest):
+SCRIPT_VIDEO_STAGES = ("split", "sentences", "assemble", "upload")
+
+async def run_script_video_job(job_id: str, request: dict, progress: JobProgress) -> dict:
     """
     Generate a complete video from script with customizable parameters and per-sentence audio sync.
     Upload the final video to S3 and return only the S3 URL.
+    Runs on a job worker; errors propagate and mark the job failed.
     """
+    req = ScriptVideoRequest(**request)
+    started = time.perf_counter()
+    print(f"🎬 Starting script-based video generation for job: {job_id}")
+    
+    # Initialize services
+    script_service = ScriptService()
+    audio_service = AudioService()
+    image_service = ImageService()
+    video_generator = VideoGenerator()
+    s3_service = S3Service()
+    
+    # Set custom voice ID
+    audio_service.set_voice(req.voice_id)
+    
+    # Set image quality and size based on video type
+    if req.video_type == "landscape":
+        image_size = "1536x1024"
+        video_generator.output_width = 1536
+        video_generator.output_height = 1024
+    else:  # portrait
+        image_size = "1024x1024"
+        video_generator.output_width = 1024
+        video_generator.output_height = 1024
+    
+    # Step 1: Split script into sentences
+    progress.stage("split")
+    print("🖼️ Step 1: Splitting script into sentences...")
+    sentences = await executors.run_io(script_service.split_script_into_sentences, req.script)
+    print(f"📊 Found {len(sentences)} sentences to illustrate")
+    
+    progress.stage("sentences")
+    # Steps 2-4: Stream each sentence through TTS -> image -> trace + render.
+    # Stages overlap across sentences; assembly starts once the last clip is in.
+    print("🎬 Steps 2-4: Streaming sentences through audio, image and animation stages...")
+    pipeline = ScriptVideoPipeline(
+        audio_service, image_service, job_id, API_OUTPUTS_DIR,
+        image_quality=req.image_quality, image_size=image_size,
+        animation_duration=req.animation_duration,
+    )
+    items = await pipeline.run(sentences)
+    pipeline_s = pipeline.timings.wall
+    svg_video_paths = [item.clip_path for item in items]
+    print(f"✅ {len(svg_video_paths)} scene clips rendered")
+    
+    final_output_path = os.path.join(MERGED_VIDEO_DIR, f"final_script_video_{job_id}.mp4")
     try:
-        job_id = str(uuid.uuid4())
-        print(f"🎬 Starting script-based video generation for job: {job_id}")
-        
-        # Initialize services
-        script_service = ScriptService()
-        audio_service = AudioService()
-        image_service = ImageService()
-        video_generator = VideoGenerator()
-        s3_service = S3Service()
-        
-        # Set custom voice ID
-        audio_service.set_voice(req.voice_id)
-        
-        # Set image quality and size based on video type
-        if req.video_type == "landscape":
-            image_size = "1536x1024"
-            video_generator.output_width = 1536
-            video_generator.output_height = 1024
-        else:  # portrait
-            image_size = "1024x1024"
-            video_generator.output_width = 1024
-            video_generator.output_height = 1024
-        
-        # Step 1: Split script into sentences
-        print("🖼️ Step 1: Splitting script into sentences...")
-        sentences = script_service.split_script_into_sentences(req.script)
-        print(f"📊 Found {len(sentences)} sentences to illustrate")
-        
-        # Step 2: Generate audio for each sentence and get durations
-        print("🎵 Step 2: Generating audio per sentence...")
-        audio_segments = await audio_service.generate_audio_per_sentence(sentences, job_id)
-        print(f"✅ Audio segments generated: {len(audio_segments)}")
-        
-        # Step 3: Generate images for each sentence
-        print("🖼️ Step 3: Generating images...")
-        image_paths = []
-        for i, seg in enumerate(audio_segments):
-            print(f"   🎨 Generating image {i+1}/{len(audio_segments)}: {seg['sentence'][:50]}...")
-            image_path = image_service.generate_sketch_image_with_quality(
-                seg['sentence'], job_id, i, req.image_quality, image_size
-            )
-            image_paths.append(image_path)
-        print(f"✅ All images generated ({len(image_paths)} images)")
-        
-        # Step 4: Convert images to SVGs and animate them with per-sentence duration
-        print("🎬 Step 4: Converting to SVGs and animating with per-sentence duration...")
-        from doodly_pipeline import png_to_svg, animate_svg, concatenate_videos
-        svg_video_paths = []
-        for i, (image_path, seg) in enumerate(zip(image_paths, audio_segments)):
-            svg_path = png_to_svg(image_path)
-            out_name = f"svg_anim_{job_id}_{i}.mp4"
-            # Use animation_duration if provided, else use seg['duration']
-            duration = req.animation_duration if req.animation_duration is not None else seg['duration']
-            video_path = animate_svg(svg_path, duration, out_name)
-            new_video_path = os.path.join(API_OUTPUTS_DIR, out_name)
-            os.rename(video_path, new_video_path)
-            svg_video_paths.append(new_video_path)
-            # Cleanup SVG and PBM files
-            try:
-                if os.path.exists(svg_path):
-                    os.remove(svg_path)
-                pbm_path = svg_path.replace('.svg', '.pbm')
-                if os.path.exists(pbm_path):
-                    os.remove(pbm_path)
-            except Exception as e:
-                print(f"Warning: Could not delete SVG/PBM: {e}")
-        
-        # Step 5: Concatenate all SVG videos
-        print("🎬 Step 5: Concatenating videos...")
-        final_video_path = os.path.join(MERGED_VIDEO_DIR, f"script_video_{job_id}.mp4")
-        concatenate_videos(svg_video_paths, final_video_path)
-        
-        # Cleanup: Delete individual SVG video files
-        print("🧹 Cleaning up individual SVG video files...")
-        for video_path in svg_video_paths:
-            try:
-                if os.path.exists(video_path):
-                    os.remove(video_path)
-                    print(f"   Deleted: {video_path}")
-            except Exception as e:
-                print(f"Warning: Could not delete {video_path}: {e}")
-        
-        # Step 6: Concatenate all audio segments
-        print("🎵 Step 6: Concatenating audio segments...")
-        from moviepy.editor import AudioFileClip, concatenate_audioclips, VideoFileClip
-        audio_clips = [AudioFileClip(seg['audio_path']) for seg in audio_segments]
-        final_audio = concatenate_audioclips(audio_clips)
-        final_audio_path = os.path.join("outputs", f"final_audio_{job_id}.mp3")
-        final_audio.write_audiofile(final_audio_path)
-        for clip in audio_clips:
-            clip.close()
-        
-        # Cleanup: Delete individual audio segments
-        print("🧹 Cleaning up individual audio segments...")
-        for seg in audio_segments:
-            try:
-                if os.path.exists(seg['audio_path']):
-                    os.remove(seg['audio_path'])
-                    print(f"   Deleted: {seg['audio_path']}")
-            except Exception as e:
-                print(f"Warning: Could not delete {seg['audio_path']}: {e}")
-        
-        # Step 7: Add audio to final video
-        print("🎵 Step 7: Adding audio to final video...")
-        video_clip = VideoFileClip(final_video_path)
-        final_video = video_clip.set_audio(AudioFileClip(final_audio_path))
-        final_output_path = os.path.join(MERGED_VIDEO_DIR, f"final_script_video_{job_id}.mp4")
-        final_video.write_videofile(
-            final_output_path,
-            codec='libx264',
-            audio_codec='aac',
-            temp_audiofile='temp-audio.m4a',
-            remove_temp=True,
-            verbose=False,
-            logger=None,
-            fps=24
+        progress.stage("assemble")
+        # Step 5: Stitch the scene clips and mux in the audio in a single ffmpeg pass
+        # (video is stream-copied, only the audio track is encoded)
+        print("🎬 Step 5: Assembling final video with audio...")
+        await executors.run_io(
+            assemble_final_video,
+            svg_video_paths, [item.audio_path for item in items], final_output_path,
+            audio_durations=[item.duration for item in items]
         )
-        video_clip.close()
-        final_video.close()
         
-        # Cleanup: Delete intermediate files
-        print("🧹 Cleaning up intermediate files...")
-        try:
-            if os.path.exists(final_video_path):
-                os.remove(final_video_path)
-                print(f"   Deleted intermediate video: {final_video_path}")
-            if os.path.exists(final_audio_path):
-                os.remove(final_audio_path)
-                print(f"   Deleted intermediate audio: {final_audio_path}")
-        except Exception as e:
-            print(f"Warning: Could not delete intermediate files: {e}")
-        
-        # Step 8: Upload final video to S3
-        s3_url = s3_service.upload_video(final_output_path, job_id, "final")
+        # Step 6: Upload final video to S3
+        progress.stage("upload")
+        s3_url = await executors.run_io(s3_service.upload_video, final_output_path, job_id, "final")
+    finally:
+        # Cleanup: per-sentence clips, audio segments and images, and the local final video
+        print("🧹 Cleaning up scene clips, audio segments and images...")
+        ScriptVideoPipeline.cleanup(items)
         if os.path.exists(final_output_path):
             os.remove(final_output_path)
-        
-        print(f"🎉 Script video generation completed! S3 URL: {s3_url}")
-        return {
-            "final_video_url": s3_url
-        }
-    except Exception as e:
-        print(f"❌ Error during script video generation: {str(e)}")
+    
+    # Teach the scheduler how long this kind of job takes
+    cost_model.observe(request, items, pipeline.timings.stage_summary(), pipeline_s,
+                       time.perf_counter() - started)
+    
+    print(f"🎉 Script video generation completed! S3 URL: {s3_url}")
+    return {
+        "final_video_url": s3_url,
+        "image_cache": image_service.cache_summary()
+    }
+
+job_runner = JobRunner(JobStore(), trace_dir=job_trace.TRACE_DIR,
+                       scratch_dirs=(API_OUTPUTS_DIR, MERGED_VIDEO_DIR, "outputs"),
+                       profile_dir=profiler.PROFILE_DIR)
+cost_model = ScriptVideoCostModel()
+job_runner.register("script_video", run_script_video_job, SCRIPT_VIDEO_STAGES, estimate=cost_model.estimate)
+
+def _jobs_gauge():
+    counts = job_runner.store.counts()
+    return {(("state", state),): counts.get(state, 0) for state in ("running", "queued")}
+
+metrics.register_gauge("doodly_jobs_in_flight", "Script video jobs running or queued", _jobs_gauge)
+metrics.register_gauge("doodly_requests_in_flight", "Render-heavy requests holding or waiting for a slot",
+                       admission_controller.gauge)
+
+@app.on_event("startup")
+async def start_job_runner():
+    job_runner.start()
+
+@app.on_event("shutdown")
+async def stop_job_runner():
+    job_runner.shutdown()
+    executors.shutdown(wait=False)
+
+def _profile_requested(req: ScriptVideoRequest, header) -> bool:
+    return req.profile or (header or "").lower() in ("1", "true", "yes")
+
+@app.post("/jobs")
+async def submit_script_video_job(req: ScriptVideoJobRequest,
+                                  x_doodly_profile: str = Header(None)):
+    """
+    Queue a script video job and return its job_id immediately; poll GET /jobs/{job_id}.
+    Answers 429 with Retry-After when the job queue is full, and 400 when webhook_url
+    is not an http(s) URL on a public (or allow-listed) host.
+    """
+    if req.webhook_url:
+        try:
+            await executors.run_io(check_webhook_url, req.webhook_url)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+    request = req.model_dump(exclude={"webhook_url"})
+    request["profile"] = _profile_requested(req, x_doodly_profile)
+    job_id = job_runner.submit("script_video", request, webhook_url=req.webhook_url, priority=req.priority)
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_runner.store.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job {job_id}"})
+    return public_view(job)
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
+    """
+    Server-sent events for a job: status, stage transitions, per-sentence completion,
+    frames rendered vs expected and bytes uploaded. The stream ends when the job is done or failed;
+    reconnecting clients resume after their Last-Event-ID.
+    """
+    if job_runner.store.get(job_id) is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job {job_id}"})
+    last_seq = int(request.headers.get("last-event-id") or 0)
+
+    async def events():
+        nonlocal last_seq
+        idle = 0.0
+        while not await request.is_disconnected():
+            batch = await executors.run_io(job_events.read, job_id, last_seq)
+            for event in batch:
+                last_seq = event["seq"]
+                yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+                if event["type"] == "status" and event["data"].get("status") in ("done", "failed"):
+                    return
+            if batch:
+                idle = 0.0
+                continue
+            idle += 0.5
+            if idle >= 15:
+                # Comment line keeps proxies from closing an idle stream
+                idle = 0.0
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/jobs/{job_id}/trace")
+async def get_job_trace(job_id: str):
+    """
+    The job's timeline in Chrome trace format (open in ui.perfetto.dev or chrome://tracing):
+    job stages, each sentence and its stages, provider calls and subprocesses with their CPU time.
+    Built from the live spans while the job runs; once it ends, served from the trace file it left.
+    """
+    if job_runner.store.get(job_id) is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job {job_id}"})
+    path = job_runner.trace_path(job_id)
+    if path and os.path.exists(path):
+        return FileResponse(path, media_type="application/json")
+    return await executors.run_io(job_trace.chrome_trace, job_id)
+
+@app.get("/jobs/{job_id}/profile")
+async def get_job_profile(job_id: str):
+    """
+    A profiled job's collapsed stacks (flamegraph.pl, inferno or speedscope), once it has ended.
+    """
+    if job_runner.store.get(job_id) is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job {job_id}"})
+    path = job_runner.profile_path(job_id)
+    if not path or not os.path.exists(path):
+        return JSONResponse(status_code=404, content={"error": f"No profile for job {job_id}"})
+    return FileResponse(path, media_type="text/plain", filename=os.path.basename(path))
+
+@app.post("/generate-script-video")
+async def generate_script_video(req: ScriptVideoRequest, x_doodly_profile: str = Header(None)):
+    """
+    Synchronous wrapper around the job queue: submits the job and waits for it.
+    Prefer POST /jobs for long scripts so a client timeout doesn't lose the result.
+    """
+    request = req.model_dump()
+    request["profile"] = _profile_requested(req, x_doodly_profile)
+    job_id = job_runner.submit("script_video", request, priority=req.priority)
+    job = await job_runner.wait(job_id)
+    if job["status"] == "failed":
+        print(f"❌ Error during script video generation: {job['error']}")
         return {
             "status": "error",
-            "error": str(e)
+            "error": job["error"]
         }
+    return job["result"]
 
 @app.get("/", response_class=HTMLResponse)
 async def root():
@@ -289,6 +363,25 @@ async def script_api():
     with open("templates/scriptapi.html") as f:
         return f.read()
 
+@app.get("/health")
+async def health_check():
+    """Health check endpoint"""
+    return {"status": "healthy"}
+
+@app.get("/admission")
+async def admission_stats():
+    """Load figures for autoscaling: running and waiting requests and jobs, wait times, render processes."""
+    return {
+        "requests": admission_controller.stats(),
+        "jobs": await executors.run_io(job_runner.stats),
+        "render_processes": executors.cpu_stats(),
+    }
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Stage and provider latencies, provider errors, bytes written/uploaded and in-flight work, for Prometheus."""
+    return PlainTextResponse(await executors.run_io(metrics.render), media_type="text/plain; version=0.0.4")
+
 @app.get("/list-svg-videos")
 async def list_svg_videos():
     # Find all svg_anim_*.mp4 in apiOutputs/ (not in apiOutputs/video/)
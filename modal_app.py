@@ -1,8 +1,8 @@
 import modal
 import os
 import uuid
-from fastapi import FastAPI, Request
-from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
+from fastapi import Depends, FastAPI, Request
+from fastapi.responses import FileResponse, JSONResponse, HTMLResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import List, Optional
@@ -17,6 +17,8 @@ image = (
     .apt_install([
         "ffmpeg", 
         "potrace", 
+        "libpotrace-dev",
+        "libagg-dev",
         "imagemagick", 
         "libcairo2", 
         "libcairo2-dev", 
@@ -43,7 +45,6 @@ image = (
         "uvicorn==0.24.0",
         "python-multipart==0.0.6",
         "openai>=1.10.0",
-        "elevenlabs==0.2.26",
         "moviepy==1.0.3",
         "Pillow==10.1.0",
         "python-dotenv==1.0.0",
@@ -54,14 +55,25 @@ image = (
         "passlib[bcrypt]==1.7.4",
         "jinja2==3.1.2",
         "manim",
-        "svgpathtools",
-        "numpy",
-        "opencv-python",
+        "svgpathtools==1.6.1",
+        "miniaudio==1.71",
+        "numpy==1.26.4",
+        "opencv-python-headless==4.9.0.80",
         "svgwrite",
         "whisper-openai"
     ])
+    # pypotrace builds against libpotrace/libagg and needs numpy and Cython at build time
+    .pip_install(["Cython<3"])
+    .run_commands("pip install --no-build-isolation pypotrace==0.3")
     .add_local_file("main.py", "/app/main.py")
     .add_local_file("doodly_pipeline.py", "/app/doodly_pipeline.py")
+    .add_local_file("render_pool.py", "/app/render_pool.py")
+    .add_local_file("stroke_renderer.py", "/app/stroke_renderer.py")
+    .add_local_file("render_scheduler.py", "/app/render_scheduler.py")
+    .add_local_file("script_pipeline.py", "/app/script_pipeline.py")
+    .add_local_file("admission.py", "/app/admission.py")
+    .add_local_file("vectorizer.py", "/app/vectorizer.py")
+    .add_local_file("ffmpeg_tools.py", "/app/ffmpeg_tools.py")
     .add_local_file("cli.py", "/app/cli.py")
     .add_local_dir("services", "/app/services")
     .add_local_dir("templates", "/app/templates")
@@ -98,8 +110,15 @@ def create_fastapi_app():
     """Create and configure the FastAPI application"""
     import sys
     sys.path.append("/app")
+    import admission
+    from services import executors, metrics
     
     web_app = FastAPI(title="Sketch Animation API")
+    # Render-heavy requests get a slot from here; over the limit they queue, then get 429
+    admission_controller = admission.AdmissionController()
+    admission.install(web_app)
+    metrics.register_gauge("doodly_requests_in_flight", "Render-heavy requests holding or waiting for a slot",
+                           admission_controller.gauge)
     
     # Set up directories
     os.makedirs("/data/apiOutputs", exist_ok=True)
@@ -122,31 +141,33 @@ def create_fastapi_app():
             job_id = str(uuid.uuid4())
             image_service = ImageService()
             
-            image_path = image_service.generate_sketch_image(req.prompt, job_id, 0)
+            image_path = await executors.run_io(image_service.generate_sketch_image, req.prompt, job_id, 0)
             # Move image to apiOutputs in volume
             new_image_path = f"/data/apiOutputs/{os.path.basename(image_path)}"
             os.rename(image_path, new_image_path)
             
             # Commit volume changes
-            volume.commit()
+            await executors.run_io(volume.commit)
             
             return {"image_url": f"/apiOutputs/{os.path.basename(new_image_path)}"}
         except Exception as e:
             return {"error": str(e)}
 
     @web_app.post("/animate-svg")
-    async def animate_svg_endpoint(req: AnimateSVGRequest):
+    async def animate_svg_endpoint(req: AnimateSVGRequest, _slot=Depends(admission_controller.slot)):
         """Animate an SVG from an image"""
         try:
-            from doodly_pipeline import png_to_svg, animate_svg
+            from doodly_pipeline import png_to_strokes, animate_svg
             
             image_path = req.image_url.lstrip("/")
             if not image_path.startswith("/data/apiOutputs"):
                 image_path = f"/data/apiOutputs/{os.path.basename(image_path)}"
             
-            svg_path = png_to_svg(image_path)
+            # Trace in-process and render on the CPU pool so the event loop keeps serving other requests
+            bundle_path = await executors.run_cpu(png_to_strokes, image_path, write_svg=True)
+            svg_path = bundle_path.replace('.npz', '.svg')
             out_name = f"svg_anim_{uuid.uuid4()}.mp4"
-            video_path = animate_svg(svg_path, req.duration, out_name)
+            video_path = await executors.run_cpu(animate_svg, bundle_path, req.duration, out_name)
             
             # Move files to volume
             new_svg_path = f"/data/apiOutputs/{os.path.basename(svg_path)}"
@@ -155,12 +176,11 @@ def create_fastapi_app():
             os.rename(video_path, new_video_path)
             
             # Cleanup
-            pbm_path = new_svg_path.replace('.svg', '.pbm')
-            for cleanup_file in [new_svg_path, pbm_path]:
+            for cleanup_file in [new_svg_path, bundle_path]:
                 if os.path.exists(cleanup_file):
                     os.remove(cleanup_file)
             
-            volume.commit()
+            await executors.run_io(volume.commit)
             
             return {
                 "svg_url": f"/apiOutputs/{os.path.basename(new_svg_path)}", 
@@ -170,14 +190,14 @@ def create_fastapi_app():
             return {"error": str(e)}
 
     @web_app.post("/generate-script-video")
-    async def generate_script_video(req: ScriptVideoRequest):
+    async def generate_script_video(req: ScriptVideoRequest, _slot=Depends(admission_controller.slot)):
         """Generate a complete video from script"""
         try:
             from services.script_service import ScriptService
             from services.audio_service import AudioService
             from services.image_service import ImageService
-            from doodly_pipeline import png_to_svg, animate_svg, concatenate_videos
-            from moviepy.editor import AudioFileClip, concatenate_audioclips, VideoFileClip
+            from script_pipeline import ScriptVideoPipeline
+            from ffmpeg_tools import assemble_final_video
             
             job_id = str(uuid.uuid4())
             
@@ -196,86 +216,37 @@ def create_fastapi_app():
                 image_size = "1024x1024"
             
             # Step 1: Split script into sentences
-            sentences = script_service.split_script_into_sentences(req.script)
+            sentences = await executors.run_io(script_service.split_script_into_sentences, req.script)
             
-            # Step 2: Generate audio for each sentence
-            audio_segments = []
-            for i, sentence in enumerate(sentences):
-                audio = await audio_service.generate_audio_per_sentence([sentence], f"{job_id}_{i}")
-                audio_segments.extend(audio)
-            
-            # Step 3: Generate images for each sentence
-            image_paths = []
-            for i, seg in enumerate(audio_segments):
-                image_path = image_service.generate_sketch_image_with_quality(
-                    seg['sentence'], job_id, i, req.image_quality, image_size
-                )
-                image_paths.append(image_path)
-            
-            # Step 4: Convert images to SVGs and animate them
-            svg_video_paths = []
-            for i, (image_path, seg) in enumerate(zip(image_paths, audio_segments)):
-                svg_path = png_to_svg(image_path)
-                out_name = f"svg_anim_{job_id}_{i}.mp4"
-                duration = req.animation_duration if req.animation_duration is not None else seg['duration']
-                video_path = animate_svg(svg_path, duration, out_name)
-                
-                new_video_path = f"/data/apiOutputs/{out_name}"
-                os.rename(video_path, new_video_path)
-                svg_video_paths.append(new_video_path)
-                
-                # Cleanup
-                for cleanup_file in [svg_path, svg_path.replace('.svg', '.pbm')]:
-                    if os.path.exists(cleanup_file):
-                        os.remove(cleanup_file)
-            
-            # Step 5: Concatenate all SVG videos
-            final_video_path = f"/data/apiOutputs/video/script_video_{job_id}.mp4"
-            concatenate_videos(svg_video_paths, final_video_path)
-            
-            # Step 6: Concatenate all audio segments
-            audio_clips = [AudioFileClip(seg['audio_path']) for seg in audio_segments]
-            final_audio = concatenate_audioclips(audio_clips)
-            final_audio_path = f"/data/outputs/final_audio_{job_id}.mp3"
-            final_audio.write_audiofile(final_audio_path)
+            # Steps 2-4: Stream each sentence through TTS -> image -> trace + render
+            pipeline = ScriptVideoPipeline(
+                audio_service, image_service, job_id, "/data/apiOutputs",
+                image_quality=req.image_quality, image_size=image_size,
+                animation_duration=req.animation_duration,
+            )
+            items = await pipeline.run(sentences)
+            svg_video_paths = [item.clip_path for item in items]
             
-            # Step 7: Add audio to final video
-            video_clip = VideoFileClip(final_video_path)
-            final_video = video_clip.set_audio(AudioFileClip(final_audio_path))
+            # Step 5: Stitch clips and mux audio in one ffmpeg pass (video stream-copied)
             final_output_path = f"/data/apiOutputs/video/final_script_video_{job_id}.mp4"
-            final_video.write_videofile(
-                final_output_path,
-                codec='libx264',
-                audio_codec='aac',
-                temp_audiofile='temp-audio.m4a',
-                remove_temp=True,
-                verbose=False,
-                logger=None
+            await executors.run_io(
+                assemble_final_video,
+                svg_video_paths, [item.audio_path for item in items], final_output_path,
+                audio_durations=[item.duration for item in items]
             )
             
-            # Cleanup
-            video_clip.close()
-            final_video.close()
-            for clip in audio_clips:
-                clip.close()
-            final_audio.close()
-            
             # Remove intermediate files
-            for video_path in svg_video_paths:
-                if os.path.exists(video_path):
-                    os.remove(video_path)
-            
-            for seg in audio_segments:
-                if os.path.exists(seg['audio_path']):
-                    os.remove(seg['audio_path'])
+            for path in svg_video_paths + [item.audio_path for item in items]:
+                if os.path.exists(path):
+                    os.remove(path)
             
             # Commit volume changes
-            volume.commit()
+            await executors.run_io(volume.commit)
             
             return {
-                "final_video_url": f"/apiOutputs/video/final_script_video_{job_id}.mp4"
+                "final_video_url": f"/apiOutputs/video/final_script_video_{job_id}.mp4",
+                "image_cache": image_service.cache_summary()
             }
-            
         except Exception as e:
             return {"error": str(e)}
 
@@ -308,13 +279,28 @@ def create_fastapi_app():
             video_paths = [f"/data/{v.lstrip('/')}" for v in req.video_urls]
             output_path = f"/data/apiOutputs/video/final_video_{uuid.uuid4()}.mp4"
             
-            concatenate_videos(video_paths, output_path)
-            volume.commit()
+            await executors.run_io(concatenate_videos, video_paths, output_path)
+            await executors.run_io(volume.commit)
             
             return {"final_video_url": f"/apiOutputs/video/{os.path.basename(output_path)}"}
         except Exception as e:
             return {"error": str(e)}
 
+    @web_app.get("/health")
+    async def health_check():
+        """Health check endpoint"""
+        return {"status": "healthy", "message": "Sketch Animation API is running"}
+
+    @web_app.get("/admission")
+    async def admission_stats():
+        """Running and waiting requests, wait times and render processes, for autoscaling"""
+        return {"requests": admission_controller.stats(), "render_processes": executors.cpu_stats()}
+
+    @web_app.get("/metrics")
+    async def metrics_endpoint():
+        """Stage and provider latencies, provider errors, bytes written/uploaded and in-flight work, for Prometheus"""
+        return PlainTextResponse(await executors.run_io(metrics.render), media_type="text/plain; version=0.0.4")
+
     @web_app.get("/list-svg-videos")
     async def list_svg_videos():
         """List all SVG animation videos"""
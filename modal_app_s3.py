@@ -1,8 +1,8 @@
 import modal
 import os
 import uuid
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import FileResponse, JSONResponse, HTMLResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import List, Optional
@@ -17,6 +17,8 @@ image = (
     .apt_install([
         "ffmpeg", 
         "potrace", 
+        "libpotrace-dev",
+        "libagg-dev",
         "imagemagick", 
         "libcairo2", 
         "libcairo2-dev", 
@@ -39,7 +41,6 @@ image = (
         "uvicorn==0.24.0",
         "python-multipart==0.0.6",
         "openai>=1.10.0",
-        "elevenlabs==0.2.26",
         "moviepy==1.0.3",
         "Pillow==10.1.0",
         "python-dotenv==1.0.0",
@@ -47,22 +48,44 @@ image = (
         "pydantic==2.5.0",
         "aiofiles==23.2.1",
         "jinja2==3.1.2",
-        "numpy",
-        "opencv-python",
+        "numpy==1.26.4",
+        "opencv-python-headless==4.9.0.80",
         "svgwrite",
         "boto3",
         "whisper-openai",
         "manim",
-        "svgpathtools"
+        "svgpathtools==1.6.1",
+        "miniaudio==1.71"
     ])
+    # pypotrace builds against libpotrace/libagg and needs numpy and Cython at build time
+    .pip_install(["Cython<3"])
+    .run_commands("pip install --no-build-isolation pypotrace==0.3")
     .workdir("/app")
     .env({"PYTHONPATH": "/app"})
     .add_local_file("services/s3_service.py", "/app/services/s3_service.py")
     .add_local_file("services/script_service.py", "/app/services/script_service.py")
     .add_local_file("services/image_service_s3.py", "/app/services/image_service_s3.py") 
     .add_local_file("services/audio_service_s3.py", "/app/services/audio_service_s3.py")
+    .add_local_file("services/audio_timeline.py", "/app/services/audio_timeline.py")
+    .add_local_file("services/tts_client.py", "/app/services/tts_client.py")
+    .add_local_file("services/disk_cache.py", "/app/services/disk_cache.py")
+    .add_local_file("services/job_events.py", "/app/services/job_events.py")
+    .add_local_file("services/executors.py", "/app/services/executors.py")
+    .add_local_file("services/metrics.py", "/app/services/metrics.py")
+    .add_local_file("services/job_trace.py", "/app/services/job_trace.py")
+    .add_local_file("services/job_usage.py", "/app/services/job_usage.py")
+    .add_local_file("services/profiler.py", "/app/services/profiler.py")
+    .add_local_file("services/image_cache.py", "/app/services/image_cache.py")
+    .add_local_file("services/image_batch.py", "/app/services/image_batch.py")
     .add_local_file("services/__init__.py", "/app/services/__init__.py")
     .add_local_file("doodly_pipeline.py", "/app/doodly_pipeline.py")
+    .add_local_file("render_pool.py", "/app/render_pool.py")
+    .add_local_file("stroke_renderer.py", "/app/stroke_renderer.py")
+    .add_local_file("render_scheduler.py", "/app/render_scheduler.py")
+    .add_local_file("script_pipeline.py", "/app/script_pipeline.py")
+    .add_local_file("admission.py", "/app/admission.py")
+    .add_local_file("vectorizer.py", "/app/vectorizer.py")
+    .add_local_file("ffmpeg_tools.py", "/app/ffmpeg_tools.py")
     .add_local_file("templates/index.html", "/app/templates/index.html")
     .add_local_file("templates/scriptapi.html", "/app/templates/scriptapi.html")
 )
@@ -81,8 +104,15 @@ def create_fastapi_app():
     """Create and configure the FastAPI application with S3 storage"""
     import sys
     sys.path.append("/app")
+    import admission
+    from services import executors, metrics
     
     web_app = FastAPI(title="Sketch Animation API - S3 Storage")
+    # Render-heavy requests get a slot from here; over the limit they queue, then get 429
+    admission_controller = admission.AdmissionController()
+    admission.install(web_app)
+    metrics.register_gauge("doodly_requests_in_flight", "Render-heavy requests holding or waiting for a slot",
+                           admission_controller.gauge)
     
     # Set up temporary directories for processing
     os.makedirs("/tmp/outputs", exist_ok=True)
@@ -103,20 +133,19 @@ def create_fastapi_app():
             image_service = ImageService()
             
             # Generate image (will be stored in S3)
-            image_url = image_service.generate_sketch_image(req.prompt, job_id, 0)
+            image_url = await executors.run_io(image_service.generate_sketch_image, req.prompt, job_id, 0)
             
             return {"image_url": image_url}
         except Exception as e:
             return {"error": str(e)}
 
     @web_app.post("/generate-s3-video")
-    async def generate_s3_video(req: ScriptVideoRequest):
+    async def generate_s3_video(req: ScriptVideoRequest, _slot=Depends(admission_controller.slot)):
         """Generate a complete video from script with S3 storage"""
         try:
             from services.script_service import ScriptService
             from services.audio_service_s3 import AudioService
             from services.image_service_s3 import ImageService
-            from moviepy.editor import ImageClip, AudioFileClip, concatenate_videoclips, concatenate_audioclips, VideoFileClip
             import requests
             import tempfile
             import os
@@ -138,121 +167,31 @@ def create_fastapi_app():
                 image_size = "1024x1024"
             
             # Step 1: Split script into sentences
-            sentences = script_service.split_script_into_sentences(req.script)
+            sentences = await executors.run_io(script_service.split_script_into_sentences, req.script)
             
-            # Step 2: Generate audio for each sentence
-            audio_segments = []
-            for i, sentence in enumerate(sentences):
-                audio = await audio_service.generate_audio_per_sentence([sentence], f"{job_id}_{i}")
-                audio_segments.extend(audio)
-            
-            # Step 3: Generate images for each sentence
-            image_urls = []
-            for i, seg in enumerate(audio_segments):
-                image_url = image_service.generate_sketch_image_with_quality(
-                    seg['sentence'], job_id, i, req.image_quality, image_size
-                )
-                image_urls.append(image_url)
-            
-            # Step 4: Download images and convert to SVG animations
-            from doodly_pipeline import png_to_svg, animate_svg, concatenate_videos
-            svg_video_paths = []
-            temp_files = []
-
-            for i, (image_url, seg) in enumerate(zip(image_urls, audio_segments)):
-                # Download image from S3 URL to temp file
-                if image_url.startswith('http'):
-                    response = requests.get(image_url)
-                    if response.status_code == 200:
-                        temp_image_path = f"/tmp/outputs/temp_image_{job_id}_{i}.png"
-                        with open(temp_image_path, 'wb') as f:
-                            f.write(response.content)
-                        temp_files.append(temp_image_path)
-                    else:
-                        raise Exception(f"Failed to download image from {image_url}")
-                else:
-                    temp_image_path = image_url
-
-                # Convert PNG to SVG
-                svg_path = png_to_svg(temp_image_path)
-                temp_files.append(svg_path)
-
-                # Animate SVG with per-sentence duration
-                out_name = f"svg_anim_{job_id}_{i}.mp4"
-                video_path = animate_svg(svg_path, seg['duration'], out_name)
-                svg_video_paths.append(video_path)
-
-                # Cleanup SVG and PBM files
-                try:
-                    pbm_path = svg_path.replace('.svg', '.pbm')
-                    if os.path.exists(svg_path):
-                        os.remove(svg_path)
-                    if os.path.exists(pbm_path):
-                        os.remove(pbm_path)
-                except Exception as e:
-                    print(f"Warning: Could not delete SVG/PBM: {e}")
-
-            # Step 5: Concatenate SVG video clips
-            temp_video_path = f"/tmp/outputs/final_script_video_{job_id}.mp4"
-            concatenate_videos(svg_video_paths, temp_video_path)
-            
-            # Step 6: Download and concatenate audio segments
-            audio_clips = []
-            for seg in audio_segments:
-                if seg['audio_path'].startswith('http'):
-                    # Download audio from S3 URL
-                    response = requests.get(seg['audio_path'])
-                    if response.status_code == 200:
-                        temp_audio_path = f"/tmp/outputs/temp_audio_{job_id}_{len(audio_clips)}.mp3"
-                        with open(temp_audio_path, 'wb') as f:
-                            f.write(response.content)
-                        temp_files.append(temp_audio_path)
-                        audio_clip = AudioFileClip(temp_audio_path)
-                    else:
-                        raise Exception(f"Failed to download audio from {seg['audio_path']}")
-                else:
-                    audio_clip = AudioFileClip(seg['audio_path'])
-                audio_clips.append(audio_clip)
-            
-            final_audio = concatenate_audioclips(audio_clips)
-            
-            # Step 7: Add audio to video
-            final_video = VideoFileClip(temp_video_path)
-            final_video = final_video.set_audio(final_audio)
+            # Steps 2-5: Stream each sentence through TTS -> image -> trace + render;
+            # S3 outputs are downloaded to /tmp/outputs as each sentence moves on
+            from script_pipeline import ScriptVideoPipeline
+            from ffmpeg_tools import assemble_final_video
+            pipeline = ScriptVideoPipeline(
+                audio_service, image_service, job_id, "/tmp/outputs",
+                image_quality=req.image_quality, image_size=image_size,
+            )
+            items = await pipeline.run(sentences)
+            svg_video_paths = [item.clip_path for item in items]
 
-            # Step 8: Export final video with audio
+            # Step 6: Stitch clips and mux audio in one ffmpeg pass (video stream-copied)
             final_video_path = f"/tmp/outputs/final_video_with_audio_{job_id}.mp4"
-            final_video.write_videofile(
-                final_video_path,
-                codec='libx264',
-                audio_codec='aac',
-                temp_audiofile='temp-audio.m4a',
-                remove_temp=True,
-                verbose=False,
-                logger=None,
-                fps=24
-            )
+            await executors.run_io(assemble_final_video, svg_video_paths, [item.audio_path for item in items],
+                                   final_video_path, audio_durations=[item.duration for item in items])
 
-            # Step 9: Upload final video to S3
+            # Step 7: Upload final video to S3
             from services.s3_service import S3Service
             s3_service = S3Service()
-            final_video_url = s3_service.upload_video(final_video_path, job_id, "final")
-
-            # Cleanup
-            final_video.close()
-            final_audio.close()
-            for clip in audio_clips:
-                clip.close()
+            final_video_url = await executors.run_io(s3_service.upload_video, final_video_path, job_id, "final")
 
             # Remove temporary files
-            for temp_file in temp_files:
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-            for video_path in svg_video_paths:
-                if os.path.exists(video_path):
-                    os.remove(video_path)
-            if os.path.exists(temp_video_path):
-                os.remove(temp_video_path)
+            ScriptVideoPipeline.cleanup(items)
             if os.path.exists(final_video_path):
                 os.remove(final_video_path)
             
@@ -262,24 +201,24 @@ def create_fastapi_app():
                 "script": req.script,
                 "video_type": req.video_type,
                 "sentences_count": len(sentences),
-                "images_count": len(image_urls),
-                "final_video_url": final_video_url
+                "images_count": len(items),
+                "final_video_url": final_video_url,
+                "image_cache": image_service.cache_summary()
             }
             
         except Exception as e:
             return {"error": str(e)}
 
     @web_app.post("/generate-script-video")
-    async def generate_script_video(req: ScriptVideoRequest):
+    async def generate_script_video(req: ScriptVideoRequest, _slot=Depends(admission_controller.slot)):
         """Generate a full SVG-animated video (one per sentence), upload all outputs to S3, and return only the S3 video URL."""
         try:
             from services.script_service import ScriptService
             from services.audio_service_s3 import AudioService
             from services.image_service_s3 import ImageService
             from services.s3_service import S3Service
-            from doodly_pipeline import png_to_svg, animate_svg, concatenate_videos
-            from moviepy.editor import AudioFileClip, concatenate_audioclips, VideoFileClip
-            import requests
+            from script_pipeline import ScriptVideoPipeline
+            from ffmpeg_tools import assemble_final_video
             import os
             import uuid
 
@@ -296,112 +235,35 @@ def create_fastapi_app():
                 image_size = "1024x1024"
 
             # Step 1: Split script into sentences
-            sentences = script_service.split_script_into_sentences(req.script)
-
-            # Step 2: Generate audio for each sentence
-            audio_segments = []
-            for i, sentence in enumerate(sentences):
-                audio = await audio_service.generate_audio_per_sentence([sentence], f"{job_id}_{i}")
-                audio_segments.extend(audio)
+            sentences = await executors.run_io(script_service.split_script_into_sentences, req.script)
 
-            # Step 3: Generate images for each sentence
-            image_urls = []
-            for i, seg in enumerate(audio_segments):
-                image_url = image_service.generate_sketch_image_with_quality(
-                    seg['sentence'], job_id, i, req.image_quality, image_size
-                )
-                image_urls.append(image_url)
-
-            # Step 4: Download images, convert to SVG, animate SVG
-            svg_paths = []
-            svg_video_paths = []
-            temp_files = []
-            durations = []
-            for i, (image_url, seg) in enumerate(zip(image_urls, audio_segments)):
-                # Download image from S3 URL to temp file
-                if image_url.startswith('http'):
-                    response = requests.get(image_url)
-                    if response.status_code == 200:
-                        temp_image_path = f"/tmp/outputs/temp_image_{job_id}_{i}.png"
-                        with open(temp_image_path, 'wb') as f:
-                            f.write(response.content)
-                        temp_files.append(temp_image_path)
-                    else:
-                        raise Exception(f"Failed to download image from {image_url}")
-                else:
-                    temp_image_path = image_url
-
-                # Convert PNG to SVG
-                svg_path = png_to_svg(temp_image_path)
-                svg_paths.append(svg_path)
-                temp_files.append(svg_path)
-
-                # Animate SVG with per-sentence duration
-                out_name = f"svg_anim_{job_id}_{i}.mp4"
-                duration = seg['duration']
-                video_path = animate_svg(svg_path, duration, out_name)
-                svg_video_paths.append(video_path)
-                durations.append(duration)
-
-            # Step 5: Concatenate SVG video clips
-            temp_video_path = f"/tmp/outputs/final_script_video_{job_id}.mp4"
-            concatenate_videos(svg_video_paths, temp_video_path)
-
-            # Step 6: Download and concatenate audio segments
-            audio_clips = []
-            for seg in audio_segments:
-                if seg['audio_path'].startswith('http'):
-                    # Download audio from S3 URL
-                    response = requests.get(seg['audio_path'])
-                    if response.status_code == 200:
-                        temp_audio_path = f"/tmp/outputs/temp_audio_{job_id}_{len(audio_clips)}.mp3"
-                        with open(temp_audio_path, 'wb') as f:
-                            f.write(response.content)
-                        temp_files.append(temp_audio_path)
-                        audio_clip = AudioFileClip(temp_audio_path)
-                    else:
-                        raise Exception(f"Failed to download audio from {seg['audio_path']}")
-                else:
-                    audio_clip = AudioFileClip(seg['audio_path'])
-                audio_clips.append(audio_clip)
-
-            final_audio = concatenate_audioclips(audio_clips)
-
-            # Step 7: Add audio to video
-            final_video = VideoFileClip(temp_video_path)
-            final_video = final_video.set_audio(final_audio)
-
-            # Step 8: Export final video with audio
-            final_video_path = f"/tmp/outputs/final_video_with_audio_{job_id}.mp4"
-            final_video.write_videofile(
-                final_video_path,
-                codec='libx264',
-                audio_codec='aac',
-                temp_audiofile='temp-audio.m4a',
-                remove_temp=True,
-                verbose=False,
-                logger=None,
-                fps=24
+            # Steps 2-5: Stream each sentence through TTS -> image -> trace + render;
+            # S3 outputs are downloaded to /tmp/outputs as each sentence moves on
+            pipeline = ScriptVideoPipeline(
+                audio_service, image_service, job_id, "/tmp/outputs",
+                image_quality=req.image_quality, image_size=image_size,
             )
+            items = await pipeline.run(sentences)
+            svg_video_paths = [item.clip_path for item in items]
 
-            # Step 9: Upload all outputs to S3
-            s3_video_url = s3_service.upload_video(final_video_path, job_id, "final_svg_video")
+            # Step 6: Stitch clips and mux audio in one ffmpeg pass (video stream-copied)
+            final_video_path = f"/tmp/outputs/final_video_with_audio_{job_id}.mp4"
+            await executors.run_io(assemble_final_video, svg_video_paths, [item.audio_path for item in items],
+                                   final_video_path, audio_durations=[item.duration for item in items])
 
-            # Cleanup
-            final_video.close()
-            final_audio.close()
-            for clip in audio_clips:
-                clip.close()
+            # Step 7: Upload all outputs to S3
+            s3_video_url = await executors.run_io(s3_service.upload_video, final_video_path, job_id, "final_svg_video")
 
             # Cleanup temp files
-            for path in temp_files + svg_video_paths + [temp_video_path, final_video_path]:
-                if os.path.exists(path):
-                    os.remove(path)
+            ScriptVideoPipeline.cleanup(items)
+            if os.path.exists(final_video_path):
+                os.remove(final_video_path)
 
             print(f"Returning S3 video URL: {s3_video_url}")  # Debug print before return
 
             return {
-                "final_video_url": s3_video_url
+                "final_video_url": s3_video_url,
+                "image_cache": image_service.cache_summary()
             }
         except Exception as e:
             return {"error": str(e)}
@@ -431,6 +293,16 @@ def create_fastapi_app():
         """Health check endpoint"""
         return {"status": "healthy", "message": "Sketch Animation API with S3 storage is running"}
 
+    @web_app.get("/admission")
+    async def admission_stats():
+        """Running and waiting requests, wait times and render processes, for autoscaling"""
+        return {"requests": admission_controller.stats(), "render_processes": executors.cpu_stats()}
+
+    @web_app.get("/metrics")
+    async def metrics_endpoint():
+        """Stage and provider latencies, provider errors, bytes written/uploaded and in-flight work, for Prometheus"""
+        return PlainTextResponse(await executors.run_io(metrics.render), media_type="text/plain; version=0.0.4")
+
     @web_app.post("/test-response")
     async def test_response():
         """Test endpoint to verify response handling"""
@@ -450,7 +322,7 @@ def create_fastapi_app():
         try:
             from services.s3_service import S3Service
             s3_service = S3Service()
-            files = s3_service.get_job_files(job_id)
+            files = await executors.run_io(s3_service.get_job_files, job_id)
             return {
                 "job_id": job_id,
                 "files": files
@@ -2,7 +2,7 @@ import modal
 import os
 import uuid
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
+from fastapi.responses import FileResponse, JSONResponse, HTMLResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import List, Optional
@@ -17,6 +17,8 @@ image = (
     .apt_install([
         "ffmpeg", 
         "potrace", 
+        "libpotrace-dev",
+        "libagg-dev",
         "imagemagick", 
         "libcairo2", 
         "libcairo2-dev", 
@@ -38,23 +40,38 @@ image = (
         "uvicorn==0.24.0",
         "python-multipart==0.0.6",
         "openai>=1.10.0",
-        "elevenlabs==0.2.26",
-        "moviepy==1.0.3",
         "Pillow==10.1.0",
         "python-dotenv==1.0.0",
         "requests==2.31.0",
         "pydantic==2.5.0",
         "aiofiles==23.2.1",
         "jinja2==3.1.2",
-        "numpy",
-        "opencv-python",
+        "numpy==1.26.4",
+        "miniaudio==1.71",
+        "svgpathtools==1.6.1",
+        "opencv-python-headless==4.9.0.80",
         "svgwrite"
     ])
+    # pypotrace builds against libpotrace/libagg and needs numpy and Cython at build time
+    .pip_install(["Cython<3"])
+    .run_commands("pip install --no-build-isolation pypotrace==0.3")
     .workdir("/app")
     .env({"PYTHONPATH": "/app"})
+    .add_local_file("ffmpeg_tools.py", "/app/ffmpeg_tools.py")
     .add_local_file("services/script_service.py", "/app/services/script_service.py")
     .add_local_file("services/image_service.py", "/app/services/image_service.py") 
     .add_local_file("services/audio_service.py", "/app/services/audio_service.py")
+    .add_local_file("services/audio_timeline.py", "/app/services/audio_timeline.py")
+    .add_local_file("services/tts_client.py", "/app/services/tts_client.py")
+    .add_local_file("services/disk_cache.py", "/app/services/disk_cache.py")
+    .add_local_file("services/job_events.py", "/app/services/job_events.py")
+    .add_local_file("services/executors.py", "/app/services/executors.py")
+    .add_local_file("services/metrics.py", "/app/services/metrics.py")
+    .add_local_file("services/job_trace.py", "/app/services/job_trace.py")
+    .add_local_file("services/job_usage.py", "/app/services/job_usage.py")
+    .add_local_file("services/profiler.py", "/app/services/profiler.py")
+    .add_local_file("services/image_cache.py", "/app/services/image_cache.py")
+    .add_local_file("services/image_batch.py", "/app/services/image_batch.py")
     .add_local_file("services/__init__.py", "/app/services/__init__.py")
     .add_local_file("templates/index.html", "/app/templates/index.html")
     .add_local_file("templates/scriptapi.html", "/app/templates/scriptapi.html")
@@ -77,6 +94,7 @@ def create_fastapi_app():
     """Create and configure the FastAPI application"""
     import sys
     sys.path.append("/app")
+    from services import executors, metrics
     
     web_app = FastAPI(title="Sketch Animation API - Simple")
     
@@ -101,13 +119,13 @@ def create_fastapi_app():
             job_id = str(uuid.uuid4())
             image_service = ImageService()
             
-            image_path = image_service.generate_sketch_image(req.prompt, job_id, 0)
+            image_path = await executors.run_io(image_service.generate_sketch_image, req.prompt, job_id, 0)
             # Move image to apiOutputs in volume
             new_image_path = f"/data/apiOutputs/{os.path.basename(image_path)}"
             os.rename(image_path, new_image_path)
             
             # Commit volume changes
-            volume.commit()
+            await executors.run_io(volume.commit)
             
             return {"image_url": f"/apiOutputs/{os.path.basename(new_image_path)}"}
         except Exception as e:
@@ -120,7 +138,7 @@ def create_fastapi_app():
             from services.script_service import ScriptService
             from services.audio_service import AudioService
             from services.image_service import ImageService
-            from moviepy.editor import ImageClip, AudioFileClip, concatenate_videoclips
+            from ffmpeg_tools import images_to_video
             
             job_id = str(uuid.uuid4())
             
@@ -139,71 +157,32 @@ def create_fastapi_app():
                 image_size = "1024x1024"
             
             # Step 1: Split script into sentences
-            sentences = script_service.split_script_into_sentences(req.script)
+            sentences = await executors.run_io(script_service.split_script_into_sentences, req.script)
             
             # Step 2: Generate audio for each sentence
-            audio_segments = []
-            for i, sentence in enumerate(sentences):
-                audio = await audio_service.generate_audio_per_sentence([sentence], f"{job_id}_{i}")
-                audio_segments.extend(audio)
+            audio_segments = await audio_service.generate_audio_per_sentence(sentences, job_id)
             
             # Step 3: Generate images for each sentence
-            image_paths = []
-            for i, seg in enumerate(audio_segments):
-                image_path = image_service.generate_sketch_image_with_quality(
-                    seg['sentence'], job_id, i, req.image_quality, image_size
-                )
-                image_paths.append(image_path)
-            
-            # Step 4: Create simple slideshow video
-            video_clips = []
-            for i, (image_path, seg) in enumerate(zip(image_paths, audio_segments)):
-                # Create image clip with duration matching audio
-                clip = ImageClip(image_path, duration=seg['duration'])
-                if req.video_type == "landscape":
-                    clip = clip.resize((1536, 1024))
-                else:
-                    clip = clip.resize((1024, 1024))
-                video_clips.append(clip)
-            
-            # Step 5: Concatenate video clips
-            final_video = concatenate_videoclips(video_clips, method="compose")
-            
-            # Step 6: Concatenate audio segments
-            audio_clips = [AudioFileClip(seg['audio_path']) for seg in audio_segments]
-            from moviepy.editor import concatenate_audioclips
-            final_audio = concatenate_audioclips(audio_clips)
-            
-            # Step 7: Add audio to video
-            final_video = final_video.set_audio(final_audio)
+            image_paths = await image_service.generate_sketch_images(
+                [seg['sentence'] for seg in audio_segments], job_id, req.image_quality, image_size
+            )
             
-            # Step 8: Export final video
+            # Step 4: Encode the slideshow (each image held for its sentence's audio) in one ffmpeg run
+            width, height = (1536, 1024) if req.video_type == "landscape" else (1024, 1024)
             final_output_path = f"/data/apiOutputs/video/simple_video_{job_id}.mp4"
-            final_video.write_videofile(
-                final_output_path,
-                codec='libx264',
-                audio_codec='aac',
-                temp_audiofile='temp-audio.m4a',
-                remove_temp=True,
-                verbose=False,
-                logger=None
+            await executors.run_io(
+                images_to_video,
+                image_paths, [seg['duration'] for seg in audio_segments],
+                [seg['audio_path'] for seg in audio_segments], final_output_path, width, height
             )
             
-            # Cleanup
-            final_video.close()
-            final_audio.close()
-            for clip in video_clips:
-                clip.close()
-            for clip in audio_clips:
-                clip.close()
-            
             # Remove intermediate files
             for seg in audio_segments:
                 if os.path.exists(seg['audio_path']):
                     os.remove(seg['audio_path'])
             
             # Commit volume changes
-            volume.commit()
+            await executors.run_io(volume.commit)
             
             return {
                 "job_id": job_id,
@@ -243,6 +222,11 @@ def create_fastapi_app():
         """Health check endpoint"""
         return {"status": "healthy", "message": "Sketch Animation API is running"}
 
+    @web_app.get("/metrics")
+    async def metrics_endpoint():
+        """Stage and provider latencies, provider errors, bytes written/uploaded and in-flight work, for Prometheus"""
+        return PlainTextResponse(await executors.run_io(metrics.render), media_type="text/plain; version=0.0.4")
+
     return web_app
 
 # Deploy the FastAPI app using Modal's ASGI support
@@ -0,0 +1,151 @@
+"""
+Warm Manim render workers.
+
+Every scene used to be rendered by shelling out to the ``manim`` CLI, which pays
+for a cold interpreter plus the manim/cairo/pango imports on every sentence.
+This module keeps a small pool of long-lived worker processes that import
+manim once and then render scene jobs in-process.
+"""
+
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Optional
+
+# Number of warm workers; defaults to one per core
+RENDER_WORKERS = int(os.getenv("DOODLY_RENDER_WORKERS", "0")) or (os.cpu_count() or 1)
+# Manim quality preset, equivalent to the `-ql` CLI flag
+RENDER_QUALITY = os.getenv("DOODLY_RENDER_QUALITY", "low_quality")
+# Bump whenever the scene changes, so cached clips are not reused
+SCENE_VERSION = 1
+
+_pool = None
+_pool_lock = threading.Lock()
+# When set, jobs render in the calling process instead of the pool
+# (used by processes that are already render workers themselves)
+_inline = False
+
+
+@dataclass
+class RenderJob:
+    """A single `DrawSVGWithHand` scene to render."""
+    svg_path: str
+    duration: float
+    out_name: str
+    png_path: Optional[str] = None
+    heading: Optional[str] = None
+    media_dir: str = "media"
+
+    def __post_init__(self):
+        if self.png_path is None:
+            self.png_path = self.svg_path.replace('.svg', '.png')
+
+
+def _warm_worker():
+    """Pool initializer: pay the manim import cost once per worker."""
+    import manim  # noqa: F401
+
+
+def render_scene(job: RenderJob) -> str:
+    """
+    Render a scene job in the current process and return the clip path.
+    """
+    from manim import (
+        BLACK, UP, WHITE, Create, FadeIn, FadeOut, ImageMobject, Scene,
+        SVGMobject, Text, Write, tempconfig,
+    )
+
+    class DrawSVGWithHand(Scene):
+        def construct(self):
+            self.camera.background_color = WHITE
+            if job.heading:
+                heading = Text(job.heading, font="Arial", color=BLACK).scale(0.8).to_edge(UP)
+                self.play(Write(heading), run_time=2)
+            svg = SVGMobject(job.svg_path, fill_opacity=0, stroke_width=3)
+            svg.set_color(BLACK)
+            svg.scale(3.0)
+            self.add(svg)
+            self.play(Create(svg), run_time=job.duration)
+            # Pop in the original image
+            img = ImageMobject(job.png_path)
+            img.width = svg.width
+            img.height = svg.height
+            img.move_to(svg.get_center())
+            self.play(FadeIn(img), FadeOut(svg), run_time=0.5)
+            self.wait(0.5)
+
+    config = {
+        "quality": RENDER_QUALITY,
+        "media_dir": job.media_dir,
+        "output_file": job.out_name,
+        "disable_caching": True,
+        "progress_bar": "none",
+        "verbosity": "WARNING",
+    }
+    with tempconfig(config):
+        scene = DrawSVGWithHand()
+        scene.render()
+        movie_path = str(scene.renderer.file_writer.movie_file_path)
+
+    if os.path.exists(movie_path):
+        return movie_path
+    # Fall back to searching the media tree like the CLI path does
+    for root, dirs, files in os.walk(os.path.join(job.media_dir, 'videos')):
+        if job.out_name in files:
+            return os.path.join(root, job.out_name)
+    raise Exception('SVG animation video not found')
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    """Return the shared pool of warm render workers, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawn rather than fork: the API process holds threads and sockets
+            ctx = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(
+                max_workers=RENDER_WORKERS, mp_context=ctx, initializer=_warm_worker
+            )
+        return _pool
+
+
+def shutdown_render_pool(wait: bool = True):
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=wait, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown_render_pool, False)
+
+
+def use_inline_rendering(enabled: bool = True):
+    """Render jobs in the current process (for code already running inside a worker)."""
+    global _inline
+    _inline = enabled
+
+
+def submit(job: RenderJob):
+    """Queue a scene job on the warm pool and return its future."""
+    return get_render_pool().submit(render_scene, job)
+
+
+def render(job: RenderJob) -> str:
+    """
+    Render a scene job on a warm worker and block until the clip is ready.
+    A crashed worker takes the pool down with it, so the pool is restarted
+    and the job retried once.
+    """
+    if _inline:
+        return render_scene(job)
+    try:
+        return submit(job).result()
+    except BrokenProcessPool:
+        print("[render_pool] Render worker died, restarting pool")
+        shutdown_render_pool(wait=False)
+        return submit(job).result()
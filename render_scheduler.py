@@ -0,0 +1,79 @@
+"""
+Per-sentence trace + render tasks for the shared CPU pool.
+
+render_sentence_clip runs the `png_to_svg` and `animate_svg` stages for one
+sentence in a worker of services.executors' process pool (built by
+create_executor). Each task traces and renders inside its own scratch
+directory, so concurrent renders never share a script file or media tree.
+"""
+
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class SentenceTask:
+    """Trace and render work for one sentence."""
+    index: int
+    image_path: str
+    duration: float
+    out_name: str
+    heading: Optional[str] = None
+    job_id: Optional[str] = None  # job that progress events are reported against
+
+
+def _init_worker():
+    # This process is already a render worker, so don't start a nested pool
+    import render_pool
+    from services import metrics
+    render_pool.use_inline_rendering(True)
+    metrics.mark_worker()
+
+
+def render_sentence_clip(task: SentenceTask, output_dir: str, engine: Optional[str] = None) -> str:
+    """Trace and render one sentence inside its own scratch directory; returns the clip path."""
+    from doodly_pipeline import RENDER_ENGINE, animate_svg, png_to_strokes, png_to_svg
+    from services import job_events
+
+    # Scratch lives under output_dir so the final move is a same-filesystem rename
+    # and is named after the clip, so it counts towards the job's scratch disk usage
+    scratch = tempfile.mkdtemp(prefix=f".scratch_{os.path.splitext(task.out_name)[0]}_", dir=output_dir)
+    try:
+        with job_events.bound(task.job_id, sentence=task.index), job_events.span("clip", "render") as span:
+            # A worker runs one task at a time, so the process's CPU time over the task is the clip's
+            cpu_start = time.process_time()
+            try:
+                if (engine or RENDER_ENGINE) == "stroke":
+                    # The native renderer reads stroke bundles, so skip magick/potrace and the SVG
+                    svg_path = png_to_strokes(task.image_path, output_dir=scratch)
+                else:
+                    svg_path = png_to_svg(task.image_path, work_dir=scratch)
+                return animate_svg(
+                    svg_path, task.duration, task.out_name,
+                    output_dir=output_dir, heading=task.heading, engine=engine,
+                    media_dir=scratch, png_path=task.image_path,
+                )
+            finally:
+                span["cpu_s"] = round(time.process_time() - cpu_start, 4)
+                span["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def create_executor(max_workers: int) -> ProcessPoolExecutor:
+    """
+    Process pool whose workers render inline.
+    Only services.executors calls this (sized by DOODLY_CPU_WORKERS), so all jobs and
+    requests share one set of warm workers.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx,
+                               initializer=_init_worker)
+
@@ -0,0 +1,279 @@
+"""
+Per-sentence streaming pipeline for script videos.
+
+Each sentence flows through TTS -> image -> trace+render on its own. The stages
+are async consumers joined by bounded queues, each with its own concurrency
+limit, so sentence 3 can be rendering while sentence 7's image is still being
+generated. Final assembly starts as soon as the last clip arrives. Renders go to
+the shared CPU process pool in services.executors, downloads to its I/O pool.
+
+Every stage records when a sentence was queued, started and finished, and the
+timing report walks back from the last clip to show the critical path.
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import requests
+
+from render_scheduler import SentenceTask, render_sentence_clip
+from services import executors, job_events
+from services.image_batch import IMAGE_MAX_CONCURRENCY, call_with_retries
+
+# Concurrent sentences per stage
+PIPELINE_TTS_WORKERS = int(os.getenv("PIPELINE_TTS_WORKERS", os.getenv("TTS_MAX_CONCURRENCY", "4")))
+PIPELINE_IMAGE_WORKERS = int(os.getenv("PIPELINE_IMAGE_WORKERS", "0")) or IMAGE_MAX_CONCURRENCY
+PIPELINE_RENDER_WORKERS = int(os.getenv("PIPELINE_RENDER_WORKERS", "0")) or executors.CPU_WORKERS
+# Items a stage may hold finished before the next stage picks them up
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
+STAGES = ("tts", "image", "render")
+# Job progress stage reported when each pipeline stage takes its first sentence
+# (a render starts by tracing the sentence's image)
+STAGE_EVENTS = {"tts": "audio", "image": "images", "render": "trace"}
+
+
+@dataclass
+class SentenceItem:
+    """One sentence as it moves through the pipeline."""
+    index: int
+    sentence: str
+    audio_path: Optional[str] = None
+    duration: Optional[float] = None
+    image_path: Optional[str] = None
+    clip_path: Optional[str] = None
+    temp_files: List[str] = field(default_factory=list)
+    # stage -> (queued, started, finished), seconds since the pipeline started
+    timings: Dict[str, tuple] = field(default_factory=dict)
+
+
+class StageTimings:
+    """Per-stage timing report for one pipeline run."""
+
+    def __init__(self, items: List[SentenceItem], wall: float):
+        self.items = items
+        self.wall = wall
+
+    def stage_summary(self) -> dict:
+        summary = {}
+        for stage in STAGES:
+            spans = [item.timings[stage] for item in self.items if stage in item.timings]
+            if not spans:
+                continue
+            summary[stage] = {
+                "busy_s": round(sum(end - start for _, start, end in spans), 3),
+                "wait_s": round(sum(start - queued for queued, start, _ in spans), 3),
+                "first_start_s": round(min(start for _, start, _ in spans), 3),
+                "last_end_s": round(max(end for _, _, end in spans), 3),
+            }
+        return summary
+
+    def critical_path(self) -> list:
+        """Stages of the sentence whose clip finished last, with queue wait and run time."""
+        finished = [item for item in self.items if "render" in item.timings]
+        if not finished:
+            return []
+        last = max(finished, key=lambda item: item.timings["render"][2])
+        return [
+            {"sentence": last.index, "stage": stage,
+             "wait_s": round(start - queued, 3), "run_s": round(end - start, 3)}
+            for stage in STAGES
+            for queued, start, end in [last.timings[stage]]
+        ]
+
+    def as_dict(self) -> dict:
+        return {"wall_s": round(self.wall, 3), "stages": self.stage_summary(),
+                "critical_path": self.critical_path()}
+
+    def format(self) -> str:
+        lines = [f"[Pipeline] {len(self.items)} sentences in {self.wall:.2f}s"]
+        for stage, s in self.stage_summary().items():
+            lines.append(f"  {stage:<7} busy {s['busy_s']:>8.2f}s  queued {s['wait_s']:>8.2f}s  "
+                         f"active {s['first_start_s']:.2f}s-{s['last_end_s']:.2f}s")
+        path = self.critical_path()
+        if path:
+            lines.append(f"  critical path (sentence {path[0]['sentence'] + 1}): " + " -> ".join(
+                f"{p['stage']} {p['wait_s']:.2f}s wait + {p['run_s']:.2f}s" for p in path))
+        return "\n".join(lines)
+
+
+def _download(url: str, dest: str) -> str:
+    response = requests.get(url)
+    if response.status_code != 200:
+        raise Exception(f"Failed to download {url}")
+    with open(dest, 'wb') as f:
+        f.write(response.content)
+    return dest
+
+
+class ScriptVideoPipeline:
+    """
+    Streams a script's sentences through audio, image and render stages.
+    Works with both the local and the S3 services: URLs returned by a service are
+    downloaded into output_dir before the sentence moves on.
+    """
+
+    def __init__(self, audio_service, image_service, job_id: str, output_dir: str,
+                 image_quality: str = "medium", image_size: str = "1536x1024",
+                 animation_duration: Optional[float] = None, engine: Optional[str] = None,
+                 tts_workers: int = None, image_workers: int = None, render_workers: int = None,
+                 queue_size: int = None):
+        self.audio_service = audio_service
+        self.image_service = image_service
+        self.job_id = job_id
+        self.output_dir = output_dir
+        self.image_quality = image_quality
+        self.image_size = image_size
+        self.animation_duration = animation_duration
+        self.engine = engine
+        self.workers = {
+            "tts": tts_workers or PIPELINE_TTS_WORKERS,
+            "image": image_workers or PIPELINE_IMAGE_WORKERS,
+            "render": render_workers or PIPELINE_RENDER_WORKERS,
+        }
+        self.queue_size = queue_size or PIPELINE_QUEUE_SIZE
+        self.timings: Optional[StageTimings] = None
+        self._renders: List[tuple] = []  # (item, future) for every submitted render
+        self._t0 = 0.0
+        self._wall0 = 0.0
+
+    def _now(self) -> float:
+        return time.perf_counter() - self._t0
+
+    async def _tts(self, item: SentenceItem):
+        seg = await self.audio_service.generate_sentence_audio(item.sentence, self.job_id, item.index)
+        item.duration = seg['duration']
+        item.audio_path = seg['audio_path']
+        if item.audio_path.startswith('http'):
+            local = os.path.join(self.output_dir, f"temp_audio_{self.job_id}_{item.index}.mp3")
+            item.audio_path = await executors.run_io(_download, item.audio_path, local)
+            item.temp_files.append(local)
+
+    async def _image(self, item: SentenceItem):
+        image_path = await call_with_retries(
+            lambda i: self.image_service.generate_sketch_image_with_quality(
+                item.sentence, self.job_id, i, self.image_quality, self.image_size),
+            item.index,
+        )
+        if image_path.startswith('http'):
+            local = os.path.join(self.output_dir, f"temp_image_{self.job_id}_{item.index}.png")
+            image_path = await executors.run_io(_download, image_path, local)
+            item.temp_files.append(local)
+        item.image_path = image_path
+
+    async def _render(self, item: SentenceItem):
+        duration = self.animation_duration if self.animation_duration is not None else item.duration
+        task = SentenceTask(item.index, item.image_path, duration, f"svg_anim_{self.job_id}_{item.index}.mp4",
+                            job_id=job_events.current_job())
+        future = executors.submit_cpu(render_sentence_clip, task, self.output_dir, self.engine)
+        self._renders.append((item, future))
+        try:
+            item.clip_path = await asyncio.wrap_future(future)
+        except Exception as e:
+            raise Exception(f"Sentence {item.index + 1} failed to render: {e}") from e
+
+    async def _stage(self, name: str, handler, inbox: asyncio.Queue, outbox: Optional[asyncio.Queue],
+                     downstream_workers: int):
+        """Run `workers[name]` consumers on inbox, then tell every downstream consumer to stop."""
+        entered = False
+
+        async def worker():
+            nonlocal entered
+            while True:
+                entry = await inbox.get()
+                if entry is None:
+                    return
+                item, queued = entry
+                if not entered:
+                    entered = True
+                    job_events.stage(STAGE_EVENTS[name])
+                started = self._now()
+                with job_events.bound(job_events.current_job(), sentence=item.index), \
+                        job_events.span(name, "pipeline", queued_s=round(started - queued, 3)):
+                    await handler(item)
+                finished = self._now()
+                item.timings[name] = (queued, started, finished)
+                print(f"[Pipeline] sentence {item.index + 1} {name} done in {finished - started:.2f}s")
+                if outbox is not None:
+                    await outbox.put((item, finished))
+
+        await asyncio.gather(*(worker() for _ in range(self.workers[name])))
+        if outbox is not None:
+            for _ in range(downstream_workers):
+                await outbox.put(None)
+
+    async def run(self, sentences: List[str]) -> List[SentenceItem]:
+        """
+        Push every sentence through the pipeline and return the items in sentence order,
+        each with its local audio_path, duration, image_path and clip_path.
+        The first failure cancels the remaining work and is re-raised.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        items = [SentenceItem(i, s) for i, s in enumerate(sentences)]
+        if not items:
+            self.timings = StageTimings([], 0.0)
+            return []
+        self.workers["render"] = min(self.workers["render"], len(items))
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in STAGES]
+        handlers = {"tts": self._tts, "image": self._image, "render": self._render}
+        self._t0 = time.perf_counter()
+        self._wall0 = time.time()
+
+        async def feed():
+            for item in items:
+                await queues[0].put((item, self._now()))
+            for _ in range(self.workers["tts"]):
+                await queues[0].put(None)
+
+        tasks = [asyncio.ensure_future(feed())]
+        for i, stage in enumerate(STAGES):
+            outbox = queues[i + 1] if i + 1 < len(STAGES) else None
+            downstream = self.workers[STAGES[i + 1]] if outbox is not None else 0
+            tasks.append(asyncio.ensure_future(
+                self._stage(stage, handlers[stage], queues[i], outbox, downstream)))
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Renders already running can't be cancelled; let them finish so their clips get cleaned up
+            futures = [future for _, future in self._renders]
+            await executors.run_io(concurrent.futures.wait, futures)
+            for item, future in self._renders:
+                if not future.cancelled() and future.exception() is None:
+                    item.clip_path = future.result()
+            self.cleanup(items, clips=True)
+            raise
+        self.timings = StageTimings(items, self._now())
+        print(self.timings.format())
+        for item in items:
+            self._trace_sentence(item)
+        return items
+
+    def _trace_sentence(self, item: SentenceItem):
+        """Add the sentence's whole journey, queue waits included, to the job's trace."""
+        if not job_events.tracing() or not item.timings:
+            return
+        first = min(queued for queued, _, _ in item.timings.values())
+        last = max(finished for _, _, finished in item.timings.values())
+        busy = {f"{stage}_s": round(finished - started, 3) for stage, (_, started, finished) in item.timings.items()}
+        job_events.add_span(f"sentence {item.index + 1}", "sentence", self._wall0 + first, last - first,
+                            {"text": item.sentence[:80], **busy}, track=item.index + 1)
+
+    @staticmethod
+    def cleanup(items: List[SentenceItem], clips: bool = True):
+        """
+        Remove every per-sentence file of these items: audio segments, images, downloaded
+        inputs and, optionally, the rendered clips. Cached audio and images are hard links,
+        so the cache keeps its copy.
+        """
+        for item in items:
+            paths = [item.audio_path, item.image_path] + item.temp_files + ([item.clip_path] if clips else [])
+            for path in dict.fromkeys(p for p in paths if p):
+                if os.path.exists(path):
+                    os.remove(path)
@@ -1,38 +1,33 @@
 import os
 import asyncio
-from elevenlabs import generate, save, set_api_key, voices
 import aiofiles
 import whisper
+from .tts_client import TTSClient
+from . import executors, job_events
 
 class AudioService:
     def __init__(self):
         api_key = os.getenv("ELEVENLABS_API_KEY")
         if not api_key:
             raise ValueError("ELEVENLABS_API_KEY environment variable is required")
-        set_api_key(api_key)
         
         # Use the voice ID from .env if provided, otherwise fallback to Adam
         self.default_voice = os.getenv("DEFAULT_VOICE") or "pNInz6obpgDQGcFmaJgB"
         self.default_model = os.getenv("DEFAULT_AUDIO_MODEL", "eleven_monolingual_v1")
+        self.tts_client = TTSClient(api_key)
     
     async def generate_audio(self, script: str, job_id: str) -> str:
         """
         Generate audio from script using ElevenLabs API
         """
+        job_events.stage("audio")
         try:
             print(f"Generating audio for job {job_id}")
             print(f"[AudioService] Using voice ID: {self.default_voice}")
             
-            # Generate audio using ElevenLabs
-            audio = generate(
-                text=script,
-                voice=self.default_voice,
-                model=self.default_model
-            )
-            
-            # Save audio file
+            # Generate audio using ElevenLabs (served from the TTS cache when possible)
             audio_path = f"outputs/audio_{job_id}.mp3"
-            save(audio, audio_path)
+            await self.tts_client.synthesize_to_file(script, self.default_voice, self.default_model, audio_path)
             
             print(f"Audio generated and saved to {audio_path}")
             return audio_path
@@ -45,38 +40,40 @@ class AudioService:
     async def generate_audio_per_sentence(self, sentences: list, job_id: str) -> list:
         """
         Generate audio for each sentence and return a list of dicts with 'audio_path' and 'duration' for each.
+        Sentences are synthesised concurrently (bounded by TTS_MAX_CONCURRENCY) and returned in order.
+        """
+        return list(await asyncio.gather(
+            *(self.generate_sentence_audio(sentence, job_id, i) for i, sentence in enumerate(sentences))
+        ))
+    
+    async def generate_sentence_audio(self, sentence: str, job_id: str, i: int) -> dict:
+        """
+        Generate audio for a single sentence; returns the same dict as generate_audio_per_sentence entries.
         """
-        from moviepy.editor import AudioFileClip
-        audio_segments = []
-        for i, sentence in enumerate(sentences):
-            audio = generate(
-                text=sentence,
-                voice=self.default_voice,
-                model=self.default_model
-            )
-            audio_path = f"outputs/audio_{job_id}_{i}.mp3"
-            save(audio, audio_path)
-            # Get duration
-            duration = AudioFileClip(audio_path).duration
-            audio_segments.append({
-                'audio_path': audio_path,
-                'duration': duration,
-                'sentence': sentence
-            })
-        return audio_segments
+        job_events.stage("audio")
+        audio_path = f"outputs/audio_{job_id}_{i}.mp3"
+        duration = await self.tts_client.synthesize_to_file(
+            sentence, self.default_voice, self.default_model, audio_path
+        )
+        job_events.sentence_done("audio", i, duration=duration)
+        return {
+            'audio_path': audio_path,
+            'duration': duration,
+            'sentence': sentence
+        }
     
     async def get_available_voices(self):
         """
         Get list of available voices from ElevenLabs
         """
         try:
-            available_voices = voices()
+            available_voices = await executors.run_io(self.tts_client.voices_blocking)
             voice_list = []
             for voice in available_voices:
                 voice_list.append({
-                    "id": voice.voice_id,
-                    "name": voice.name,
-                    "category": getattr(voice, 'category', 'Unknown')
+                    "id": voice["voice_id"],
+                    "name": voice["name"],
+                    "category": voice.get("category") or 'Unknown'
                 })
             return voice_list
         except Exception as e:
@@ -1,8 +1,9 @@
 import os
 import asyncio
-from elevenlabs import generate, save, set_api_key, voices
 import aiofiles
 import whisper
+from .tts_client import TTSClient
+from . import executors, job_events
 from .s3_service import S3Service
 
 class AudioService:
@@ -10,11 +11,11 @@ class AudioService:
         api_key = os.getenv("ELEVENLABS_API_KEY")
         if not api_key:
             raise ValueError("ELEVENLABS_API_KEY environment variable is required")
-        set_api_key(api_key)
         
         # Use the voice ID from .env if provided, otherwise fallback to Adam
         self.default_voice = os.getenv("DEFAULT_VOICE") or "pNInz6obpgDQGcFmaJgB"
         self.default_model = os.getenv("DEFAULT_AUDIO_MODEL", "eleven_monolingual_v1")
+        self.tts_client = TTSClient(api_key)
         
         # Initialize S3 service
         try:
@@ -30,21 +31,16 @@ class AudioService:
         Generate audio from script using ElevenLabs API.
         Returns S3 URL if S3 is available, otherwise local file path.
         """
+        job_events.stage("audio")
         try:
             print(f"Generating audio for job {job_id}")
             print(f"[AudioService] Using voice ID: {self.default_voice}")
             
-            # Generate audio using ElevenLabs
-            audio = generate(
-                text=script,
-                voice=self.default_voice,
-                model=self.default_model
-            )
-            
-            # Save audio file locally first
+            # Generate audio using ElevenLabs (served from the TTS cache when possible),
+            # saving the file locally first
             audio_path = f"outputs/audio_{job_id}.mp3"
             os.makedirs("outputs", exist_ok=True)
-            save(audio, audio_path)
+            await self.tts_client.synthesize_to_file(script, self.default_voice, self.default_model, audio_path)
             
             print(f"Audio generated and saved to {audio_path}")
             
@@ -71,57 +67,56 @@ class AudioService:
         """
         Generate audio for each sentence and return a list of dicts with 'audio_path' and 'duration' for each.
         Returns S3 URLs if S3 is available, otherwise local file paths.
+        Sentences are synthesised and uploaded concurrently (bounded by TTS_MAX_CONCURRENCY) and returned in order.
+        """
+        os.makedirs("outputs", exist_ok=True)
+
+        return list(await asyncio.gather(
+            *(self.generate_sentence_audio(sentence, job_id, i) for i, sentence in enumerate(sentences))
+        ))
+    
+    async def generate_sentence_audio(self, sentence: str, job_id: str, i: int) -> dict:
         """
-        from moviepy.editor import AudioFileClip
-        audio_segments = []
+        Generate audio for a single sentence; returns the same dict as generate_audio_per_sentence entries.
+        """
+        job_events.stage("audio")
+        # Save audio file locally first (served from the TTS cache when possible)
+        audio_path = f"outputs/audio_{job_id}_{i}.mp3"
+        duration = await self.tts_client.synthesize_to_file(
+            sentence, self.default_voice, self.default_model, audio_path
+        )
         
-        for i, sentence in enumerate(sentences):
-            audio = generate(
-                text=sentence,
-                voice=self.default_voice,
-                model=self.default_model
-            )
-            
-            # Save audio file locally first
-            audio_path = f"outputs/audio_{job_id}_{i}.mp3"
-            os.makedirs("outputs", exist_ok=True)
-            save(audio, audio_path)
-            
-            # Get duration
-            duration = AudioFileClip(audio_path).duration
-            
-            # Upload to S3 if available
-            final_audio_path = audio_path
-            if self.use_s3:
-                try:
-                    s3_url = self.s3_service.upload_audio(audio_path, job_id, i)
-                    print(f"[AudioService] Audio segment {i} uploaded to S3: {s3_url}")
-                    # Clean up local file
-                    os.remove(audio_path)
-                    final_audio_path = s3_url
-                except Exception as e:
-                    print(f"[AudioService] Failed to upload audio segment {i} to S3, keeping local file: {e}")
-            
-            audio_segments.append({
-                'audio_path': final_audio_path,
-                'duration': duration,
-                'sentence': sentence
-            })
+        # Upload to S3 if available
+        final_audio_path = audio_path
+        if self.use_s3:
+            try:
+                s3_url = await executors.run_io(self.s3_service.upload_audio, audio_path, job_id, i)
+                print(f"[AudioService] Audio segment {i} uploaded to S3: {s3_url}")
+                # Clean up local file
+                os.remove(audio_path)
+                final_audio_path = s3_url
+            except Exception as e:
+                print(f"[AudioService] Failed to upload audio segment {i} to S3, keeping local file: {e}")
         
-        return audio_segments
+        job_events.sentence_done("audio", i, duration=duration)
+        return {
+            'audio_path': final_audio_path,
+            'duration': duration,
+            'sentence': sentence
+        }
     
     async def get_available_voices(self):
         """
         Get list of available voices from ElevenLabs
         """
         try:
-            available_voices = voices()
+            available_voices = await executors.run_io(self.tts_client.voices_blocking)
             voice_list = []
             for voice in available_voices:
                 voice_list.append({
-                    "id": voice.voice_id,
-                    "name": voice.name,
-                    "category": getattr(voice, 'category', 'Unknown')
+                    "id": voice["voice_id"],
+                    "name": voice["name"],
+                    "category": voice.get("category") or 'Unknown'
                 })
             return voice_list
         except Exception as e:
@@ -0,0 +1,188 @@
+import os
+import struct
+import tempfile
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+from . import job_trace
+
+try:
+    import miniaudio
+except ImportError:  # in-process MP3 decoder (in requirements); without it one ffmpeg run decodes every segment
+    miniaudio = None
+
+# Bitrates (kbps) indexed by [version is MPEG-1][bitrate index], layer III
+_BITRATES = {
+    True: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    False: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def _parse_frame_header(header: bytes):
+    """Return (frame_length, samples, sample_rate) for an MPEG layer III frame header, or None."""
+    b1, b2 = header[1], header[2]
+    if header[0] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = (b1 >> 3) & 0x03  # 3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5
+    layer = (b1 >> 1) & 0x03  # 1 = layer III
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x03
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = _BITRATES[mpeg1][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 0x01
+    samples = 1152 if mpeg1 else 576
+    frame_length = (samples // 8) * bitrate // sample_rate + padding
+    return frame_length, samples, sample_rate
+
+
+# Encoders whose Xing/Info frame carries a LAME extension with the encoder delay and padding
+_LAME_ENCODERS = (b'LAME', b'Lavf', b'Lavc')
+
+
+def _xing_samples(frame: bytes, samples_per_frame: int) -> Optional[int]:
+    """
+    Playable samples from a Xing/Info header in the first frame: the frame count times
+    samples per frame, less the encoder delay and padding of a LAME extension (which
+    decoders trim for gapless playback). None when there is no usable header.
+    """
+    for tag in (b'Xing', b'Info'):
+        at = frame.find(tag)
+        if at != -1:
+            break
+    else:
+        return None
+    if len(frame) < at + 8:
+        return None
+    flags = struct.unpack('>I', frame[at + 4:at + 8])[0]
+    if not flags & 0x1 or len(frame) < at + 12:
+        return None
+    frames = struct.unpack('>I', frame[at + 8:at + 12])[0]
+    total = frames * samples_per_frame
+    # Optional fields: frame count, byte count, 100-byte seek table, quality
+    lame = at + 8 + 4 * bool(flags & 0x1) + 4 * bool(flags & 0x2) + 100 * bool(flags & 0x4) + 4 * bool(flags & 0x8)
+    if frame[lame:lame + 4] in _LAME_ENCODERS and len(frame) >= lame + 24:
+        b0, b1, b2 = frame[lame + 21:lame + 24]
+        delay, padding = (b0 << 4) | (b1 >> 4), ((b1 & 0x0F) << 8) | b2
+        total = max(0, total - delay - padding)
+    return total
+
+
+def mp3_duration(path: str) -> float:
+    """
+    Duration of an MP3 read from its frame headers, without decoding any audio.
+    Uses the Xing/Info frame count (less the LAME encoder delay and padding) when
+    present, otherwise walks the frame headers. ID3v2 tags (with or without a
+    footer) and a trailing ID3v1 tag are skipped.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    pos = 0
+    end = len(data)
+    # Skip an ID3v2 tag: 10-byte header, syncsafe size, and a 10-byte footer when flagged
+    if data[:3] == b'ID3' and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        pos = 10 + size + (10 if data[5] & 0x10 else 0)
+    if end - pos >= 128 and data[end - 128:end - 125] == b'TAG':
+        end -= 128
+    total_samples = 0
+    sample_rate = None
+    while pos + 4 <= end:
+        parsed = _parse_frame_header(data[pos:pos + 4])
+        if parsed is None:
+            pos += 1  # resync
+            continue
+        frame_length, samples, rate = parsed
+        if frame_length <= 0:
+            break
+        if sample_rate is None:
+            sample_rate = rate
+            # VBR (and LAME-encoded CBR) files carry the frame count in a Xing/Info first frame
+            xing = _xing_samples(data[pos:pos + frame_length], samples)
+            if xing is not None:
+                return xing / rate
+        total_samples += samples
+        pos += frame_length
+    if not sample_rate:
+        raise ValueError(f"No MPEG audio frames found in {path}")
+    return total_samples / sample_rate
+
+
+class AudioTimeline:
+    """
+    The narration for a whole job as one PCM buffer. Each sentence is decoded once
+    straight into its slot, optionally padded so it lines up with its scene clip,
+    and the buffer is handed to the final encoder without writing an intermediate MP3.
+    """
+
+    def __init__(self, sample_rate: int = 44100, channels: int = 1):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.buffer = np.zeros((0, channels), dtype=np.int16)
+        self.offsets = []
+
+    @classmethod
+    def from_segments(cls, audio_paths: List[str], durations: Optional[List[float]] = None,
+                      slot_durations: Optional[List[float]] = None,
+                      sample_rate: int = 44100, channels: int = 1) -> "AudioTimeline":
+        """
+        Build the timeline for a list of MP3 segments.
+        durations: known segment durations (probed from headers when omitted).
+        slot_durations: per-scene lengths; a segment shorter than its slot is followed by silence.
+        """
+        timeline = cls(sample_rate, channels)
+        if durations is None:
+            durations = [mp3_duration(p) for p in audio_paths]
+        slots = []
+        for i, duration in enumerate(durations):
+            slot = duration
+            if slot_durations is not None:
+                slot = max(slot, slot_durations[i])
+            slots.append(int(round(slot * sample_rate)))
+        timeline.offsets = [int(x) for x in np.concatenate([[0], np.cumsum(slots)])]
+        timeline.buffer = np.zeros((timeline.offsets[-1], channels), dtype=np.int16)
+        for i, pcm in enumerate(timeline._decode_all(audio_paths)):
+            start, end = timeline.offsets[i], timeline.offsets[i + 1]
+            pcm = pcm[:end - start]
+            timeline.buffer[start:start + len(pcm)] = pcm
+        return timeline
+
+    def _decode_all(self, paths: List[str]) -> Iterator[np.ndarray]:
+        """Decode audio files, in order, to int16 PCM at the timeline's rate and channel count."""
+        if miniaudio is not None:
+            for path in paths:
+                decoded = miniaudio.decode_file(
+                    path, output_format=miniaudio.SampleFormat.SIGNED16,
+                    nchannels=self.channels, sample_rate=self.sample_rate,
+                )
+                yield np.frombuffer(decoded.samples, dtype=np.int16).reshape(-1, self.channels)
+            return
+        if not paths:
+            return
+        # A single ffmpeg run with one input and one raw PCM output per segment
+        with tempfile.TemporaryDirectory(prefix="timeline_") as scratch:
+            command = ['ffmpeg', '-v', 'error', '-y']
+            for path in paths:
+                command += ['-i', path]
+            outputs = [os.path.join(scratch, f"{i}.pcm") for i in range(len(paths))]
+            for i, output in enumerate(outputs):
+                command += ['-map', f'{i}:a:0', '-f', 's16le',
+                            '-ac', str(self.channels), '-ar', str(self.sample_rate), output]
+            job_trace.run(command, check=True, capture_output=True)
+            for output in outputs:
+                yield np.fromfile(output, dtype=np.int16).reshape(-1, self.channels)
+
+    @property
+    def duration(self) -> float:
+        return len(self.buffer) / self.sample_rate
+
+    def ffmpeg_input_args(self) -> list:
+        """ffmpeg arguments that read this timeline's raw PCM from stdin."""
+        return ['-f', 's16le', '-ar', str(self.sample_rate), '-ac', str(self.channels), '-i', 'pipe:0']
+
+    def to_bytes(self) -> bytes:
+        return self.buffer.tobytes()
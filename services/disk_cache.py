@@ -0,0 +1,182 @@
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from . import metrics
+
+_META = "meta.json"
+
+
+class DiskCache:
+    """
+    Content-addressed, size-bounded LRU cache on local disk.
+
+    Each entry is a directory named after its key holding one or more files plus a
+    meta.json. Entries are written to a temporary directory and renamed into place,
+    so readers never see a partial entry; writers and eviction take an exclusive
+    file lock, so several worker processes can share one cache directory.
+    Recency is the entry directory's mtime, refreshed on every hit.
+    Hits and misses are also counted in doodly_cache_requests_total{cache}, where
+    cache is the directory's name (tts, images, renders).
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.name = os.path.basename(os.path.normpath(root))
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+        if self.enabled:
+            os.makedirs(root, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _entry(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.root, ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _count(self, hit: bool):
+        with self._counter_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        metrics.inc("doodly_cache_requests_total", cache=self.name, result="hit" if hit else "miss")
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Return the entry's metadata (and refresh its recency), or None on a miss.
+        The hit is counted by fetch, once the file is actually in place.
+        """
+        if not self.enabled:
+            return None
+        entry = self._entry(key)
+        try:
+            with open(os.path.join(entry, _META)) as f:
+                meta = json.load(f)
+            os.utime(entry)
+        except (OSError, ValueError):
+            self._count(False)
+            return None
+        return meta
+
+    def fetch(self, key: str, name: str, dest: str) -> bool:
+        """
+        Hard-link (or, across filesystems, copy) a cached file to dest and count a hit;
+        False, counted as a miss, if it is gone (e.g. evicted since get).
+        Callers may delete or replace dest but must not rewrite it in place.
+        """
+        src = os.path.join(self._entry(key), name)
+        try:
+            if os.path.exists(dest):
+                os.remove(dest)
+            try:
+                os.link(src, dest)
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                    raise
+                shutil.copy2(src, dest)
+        except OSError:
+            self._count(False)
+            return False
+        self._count(True)
+        return True
+
+    def put(self, key: str, files: Dict[str, str], meta: Optional[dict] = None):
+        """Store files ({name: source path}) and metadata under key, then evict down to max_bytes."""
+        if not self.enabled:
+            return
+        staging = tempfile.mkdtemp(prefix=".tmp_", dir=self.root)
+        try:
+            for name, src in files.items():
+                shutil.copyfile(src, os.path.join(staging, name))
+            with open(os.path.join(staging, _META), "w") as f:
+                json.dump(meta or {}, f)
+            with self._locked():
+                if not os.path.exists(self._entry(key)):
+                    os.rename(staging, self._entry(key))
+                    staging = None
+                self._evict()
+        finally:
+            if staging:
+                shutil.rmtree(staging, ignore_errors=True)
+
+    def _entries(self):
+        for name in os.listdir(self.root):
+            if name.startswith("."):
+                continue
+            path = self._entry(name)
+            try:
+                size = sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+                yield os.stat(path).st_mtime, size, path
+            except OSError:
+                continue
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+        # Staging directories left behind by a crashed writer
+        for name in os.listdir(self.root):
+            path = self._entry(name)
+            if name.startswith(".tmp_") and time.time() - os.stat(path).st_mtime > 3600:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def stats(self) -> dict:
+        entries = list(self._entries()) if self.enabled else []
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+
+_caches: Dict[str, DiskCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(root: str, max_mb: float) -> DiskCache:
+    """Process-wide cache for a directory, so hit/miss counters outlive a single request."""
+    root = os.path.abspath(root)
+    with _caches_lock:
+        if root not in _caches:
+            _caches[root] = DiskCache(root, int(max_mb * 1024 * 1024))
+        return _caches[root]
+
+
+def _cache_bytes() -> dict:
+    with _caches_lock:
+        caches = [cache for cache in _caches.values() if cache.enabled]
+    return {(("cache", cache.name),): cache.stats()["bytes"] for cache in caches}
+
+
+metrics.register_gauge("doodly_cache_bytes", "Bytes held by each disk cache in this process", _cache_bytes)
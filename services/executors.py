@@ -0,0 +1,160 @@
+import asyncio
+import atexit
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from . import job_events, job_usage, metrics, profiler
+
+# Threads for blocking I/O: provider SDK calls, S3 transfers, ffmpeg/potrace subprocesses, file moves
+IO_WORKERS = int(os.getenv("DOODLY_IO_WORKERS", "32"))
+# Processes for CPU-bound Python work (tracing and rendering); defaults to one per core
+CPU_WORKERS = int(os.getenv("DOODLY_CPU_WORKERS", "0")) or (os.cpu_count() or 1)
+
+_io_pool = None
+_cpu_pool = None
+_lock = threading.Lock()
+# CPU tasks submitted and not yet finished (running or waiting for a worker)
+_cpu_in_flight = 0
+
+
+def io_pool() -> ThreadPoolExecutor:
+    """The process-wide I/O thread pool, started on first use."""
+    global _io_pool
+    with _lock:
+        if _io_pool is None:
+            _io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+        return _io_pool
+
+
+def cpu_pool():
+    """The process-wide CPU process pool (spawned, rendering inline), started on first use."""
+    global _cpu_pool
+    with _lock:
+        if _cpu_pool is None:
+            from render_scheduler import create_executor
+            _cpu_pool = create_executor(CPU_WORKERS)
+        return _cpu_pool
+
+
+async def run_io(fn, *args, **kwargs):
+    """
+    Await fn(*args, **kwargs) on the I/O pool. Like asyncio.to_thread, the call sees
+    the caller's context variables (so job events stay attributed to the job).
+    """
+    loop = asyncio.get_running_loop()
+    usage = job_usage.current()
+    if usage is not None:
+        # Thread CPU spent on a job's behalf is charged to the job
+        fn = functools.partial(usage.charge, fn)
+    sampler = profiler.current()
+    if sampler is not None:
+        fn = functools.partial(sampler.attach, fn)
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return await loop.run_in_executor(io_pool(), call)
+
+
+def _run_and_flush(fn, *args, **kwargs):
+    # Runs in the worker: make the task's samples visible to this process's /metrics,
+    # and its events and spans to the job, before the result is handed back.
+    # A worker runs one task at a time, so its rusage over the call is the task's cost
+    cpu_start = job_usage.process_cpu()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        job_events.flush()
+        metrics.flush()
+    return result, job_usage.task_cost(cpu_start)
+
+
+class _TaskFuture(Future):
+    """The caller's side of a CPU pool task: cancellable only while the task is still queued."""
+
+    def __init__(self, task: Future):
+        super().__init__()
+        self._task = task
+
+    def cancel(self) -> bool:
+        return self._task.cancel() and super().cancel()
+
+
+def _unwrap_task(future: Future, usage, task: Future):
+    # Hands the task's result to the caller's future, charging its cost to the submitting job
+    if task.cancelled():
+        future.cancel()
+        return
+    if not future.set_running_or_notify_cancel():
+        return
+    if task.exception() is not None:
+        future.set_exception(task.exception())
+        return
+    result, cost = task.result()
+    if usage is not None:
+        usage.add_task(cost)
+    future.set_result(result)
+
+
+def _cpu_task_done(future: Future):
+    global _cpu_in_flight
+    with _lock:
+        _cpu_in_flight -= 1
+
+
+def submit_cpu(fn, *args, **kwargs) -> Future:
+    """
+    Queue fn(*args, **kwargs) on the CPU pool; fn and its arguments must be picklable.
+    A worker crash breaks the whole pool, so a broken pool is replaced on the next submit.
+    """
+    global _cpu_pool, _cpu_in_flight
+    usage = job_usage.current()
+    sampler = profiler.current()
+    if sampler is not None:
+        # Sampled inside the worker; the samples are merged into the caller's profile
+        fn = functools.partial(profiler.profiled_task, sampler.worker_part(), fn)
+    pool = cpu_pool()
+    try:
+        task = pool.submit(_run_and_flush, fn, *args, **kwargs)
+    except BrokenProcessPool:
+        print("[executors] CPU worker died, restarting pool")
+        with _lock:
+            if _cpu_pool is pool:
+                _cpu_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        task = cpu_pool().submit(_run_and_flush, fn, *args, **kwargs)
+    with _lock:
+        _cpu_in_flight += 1
+    task.add_done_callback(_cpu_task_done)
+    future = _TaskFuture(task)
+    task.add_done_callback(functools.partial(_unwrap_task, future, usage))
+    return future
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Await fn(*args, **kwargs) on the CPU pool."""
+    return await asyncio.wrap_future(submit_cpu(fn, *args, **kwargs))
+
+
+def cpu_stats() -> dict:
+    """Worker processes and the tasks running on or queued for them."""
+    with _lock:
+        return {"workers": CPU_WORKERS, "in_flight": _cpu_in_flight}
+
+
+metrics.register_gauge("doodly_render_tasks_in_flight", "CPU pool tasks (trace and render) running or queued",
+                       lambda: cpu_stats()["in_flight"])
+metrics.register_gauge("doodly_render_workers", "CPU pool worker processes", lambda: CPU_WORKERS)
+
+
+def shutdown(wait: bool = True):
+    global _io_pool, _cpu_pool
+    with _lock:
+        pools, _io_pool, _cpu_pool = [_io_pool, _cpu_pool], None, None
+    for pool in pools:
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+atexit.register(shutdown, False)
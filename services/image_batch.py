@@ -0,0 +1,85 @@
+import asyncio
+import os
+import random
+from typing import Callable, Dict, List
+
+import openai
+
+from . import executors
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+IMAGE_MAX_CONCURRENCY = int(os.getenv("IMAGE_MAX_CONCURRENCY", "4"))
+IMAGE_MAX_RETRIES = int(os.getenv("IMAGE_MAX_RETRIES", "2"))
+IMAGE_RETRY_BACKOFF = float(os.getenv("IMAGE_RETRY_BACKOFF", "2.0"))
+
+
+class ImageBatchError(Exception):
+    """
+    Raised when some frames of a batch could not be generated.
+    `failures` maps frame index to error message; `results` holds the paths/URLs
+    of the frames that did succeed (None for failed ones).
+    """
+
+    def __init__(self, failures: Dict[int, str], results: List):
+        frames = ", ".join(str(i) for i in sorted(failures))
+        super().__init__(f"Image generation failed for frame(s) {frames}: "
+                         + "; ".join(f"[{i}] {failures[i]}" for i in sorted(failures)))
+        self.failures = failures
+        self.results = results
+
+
+def is_retryable(error: BaseException) -> bool:
+    """True for rate limits, timeouts, connection errors and 5xx anywhere in the exception chain."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (openai.RateLimitError, openai.APIConnectionError,
+                              openai.APITimeoutError, openai.InternalServerError)):
+            return True
+        if getattr(error, 'status_code', None) in RETRYABLE_STATUS:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+async def call_with_retries(generate_one: Callable[[int], str], frame_index: int,
+                            semaphore: asyncio.Semaphore = None, max_retries: int = None,
+                            backoff: float = None) -> str:
+    """Run generate_one(frame_index) on the I/O pool, retrying transient failures with jittered backoff."""
+    max_retries = IMAGE_MAX_RETRIES if max_retries is None else max_retries
+    backoff = IMAGE_RETRY_BACKOFF if backoff is None else backoff
+    attempt = 0
+    while True:
+        try:
+            if semaphore is None:
+                return await executors.run_io(generate_one, frame_index)
+            async with semaphore:
+                return await executors.run_io(generate_one, frame_index)
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+            attempt += 1
+            print(f"[ImageService] Frame {frame_index} failed ({e}); retry {attempt}/{max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def generate_batch(generate_one: Callable[[int], str], count: int,
+                         max_concurrency: int = None, max_retries: int = None,
+                         backoff: float = None) -> List[str]:
+    """
+    Run generate_one(frame_index) for every frame on the I/O pool, at most
+    max_concurrency at a time, retrying transient failures with jittered backoff.
+    Returns results in frame order or raises ImageBatchError naming the failed frames.
+    """
+    max_concurrency = max_concurrency or IMAGE_MAX_CONCURRENCY
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(frame_index):
+        return await call_with_retries(generate_one, frame_index, semaphore, max_retries, backoff)
+
+    outcomes = await asyncio.gather(*(run(i) for i in range(count)), return_exceptions=True)
+    failures = {i: str(o) for i, o in enumerate(outcomes) if isinstance(o, BaseException)}
+    if failures:
+        raise ImageBatchError(failures, [None if isinstance(o, BaseException) else o for o in outcomes])
+    return list(outcomes)
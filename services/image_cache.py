@@ -0,0 +1,24 @@
+import hashlib
+import os
+
+from .disk_cache import DiskCache, get_cache
+
+# Generated images, and the traced output of each, are kept on disk across jobs
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", ".cache/images")
+IMAGE_CACHE_MAX_MB = float(os.getenv("IMAGE_CACHE_MAX_MB", "2048"))
+
+
+def image_cache() -> DiskCache:
+    return get_cache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_MB)
+
+
+def image_key(prompt: str, model: str, size: str, quality: str) -> str:
+    """The prompt is deterministic per sentence, so these four fields identify the image."""
+    return DiskCache.make_key("image", prompt, model, size, quality)
+
+
+def trace_key(png_path: str, kind: str, *settings) -> str:
+    """Key for the traced output of a PNG: its content hash, the output kind and the trace settings."""
+    with open(png_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return DiskCache.make_key("trace", kind, digest, *settings)
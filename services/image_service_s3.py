@@ -5,11 +5,17 @@ from PIL import Image
 import io
 import random
 from .s3_service import S3Service
+from .image_batch import generate_batch
+from .image_cache import image_cache, image_key
+from . import job_events, metrics
 
 class ImageService:
     def __init__(self):
         self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         self.image_model = os.getenv("DEFAULT_IMAGE_MODEL", "gpt-image-1")
+        self.image_cache = image_cache()
+        # frame index -> "hit" / "miss" for this service's job
+        self.cache_status = {}
         # Initialize S3 service
         try:
             self.s3_service = S3Service()
@@ -19,6 +25,7 @@ class ImageService:
             print(f"[ImageService] S3 not available, using local storage: {e}")
             self.use_s3 = False
     
+    @metrics.timed("image")
     def generate_sketch_image(self, sentence: str, job_id: str, frame_index: int) -> str:
         """
         Generate a whiteboard sketch-style image focused on humans, emotional faces, and script-based context.
@@ -41,13 +48,14 @@ class ImageService:
             print(f"[ImageService] Image prompt: {prompt}")
 
             # Generate image using DALL-E
-            response = self.client.images.generate(
-                model=self.image_model,
-                prompt=prompt,
-                size="1536x1024",
-                quality="medium",
-                n=1,
-            )
+            with metrics.provider_call("openai", "images.generate", images=1):
+                response = self.client.images.generate(
+                    model=self.image_model,
+                    prompt=prompt,
+                    size="1536x1024",
+                    quality="medium",
+                    n=1,
+                )
             print(f"[ImageService] DALL-E API raw response for frame {frame_index}: {response}")
 
             if not hasattr(response, 'data') or not response.data:
@@ -93,6 +101,7 @@ class ImageService:
             print(f"[ImageService] Error generating image for frame {frame_index}: {str(e)}")
             raise Exception(f"Failed to generate image: {str(e)}")
 
+    @metrics.timed("image")
     def generate_sketch_image_with_quality(self, sentence: str, job_id: str, frame_index: int, quality: str = "medium", size: str = "1536x1024") -> str:
         """
         Generate a whiteboard sketch-style image with customizable quality and size.
@@ -101,6 +110,7 @@ class ImageService:
         try:
             print(f"[ImageService] Job ID: {job_id} | Generating image for frame {frame_index}: {sentence[:50]}...")
             print(f"[ImageService] Quality: {quality}, Size: {size}")
+            job_events.stage("images")
 
             # Detect if the sentence involves people
             people_keywords = [
@@ -115,40 +125,50 @@ class ImageService:
             prompt = self._create_enhanced_sketch_prompt(sentence, involves_people)
             print(f"[ImageService] Image prompt: {prompt}")
 
-            # Generate image using DALL-E with custom quality and size
-            response = self.client.images.generate(
-                model=self.image_model,
-                prompt=prompt,
-                size=size,
-                quality=quality,
-                n=1,
-            )
-            print(f"[ImageService] DALL-E API raw response for frame {frame_index}: {response}")
-
-            if not hasattr(response, 'data') or not response.data:
-                print(f"[ImageService] ERROR: No image data returned. Full response: {response}")
-                if hasattr(response, 'error'):
-                    print(f"[ImageService] OpenAI API error: {response.error}")
-                raise Exception(f"OpenAI API did not return valid image data. See logs for details.")
-
-            image_data_obj = response.data[0]
-            image_url = getattr(image_data_obj, 'url', None)
-            b64_json = getattr(image_data_obj, 'b64_json', None)
-
             # Create temporary local path
             temp_image_path = f"outputs/image_{job_id}_{frame_index}.png"
             os.makedirs("outputs", exist_ok=True)
 
-            if image_url:
-                self._download_and_save_image(image_url, temp_image_path)
-                print(f"[ImageService] Image saved to {temp_image_path}")
-            elif b64_json:
-                image_data = base64.b64decode(b64_json)
-                image = Image.open(io.BytesIO(image_data))
-                image.save(temp_image_path, "PNG")
-                print(f"[ImageService] Image saved to {temp_image_path} from base64 data")
+            cache_key = image_key(prompt, self.image_model, size, quality)
+            if self.image_cache.get(cache_key) is not None and self.image_cache.fetch(cache_key, "image.png", temp_image_path):
+                self.cache_status[frame_index] = "hit"
+                print(f"[ImageService] Image for frame {frame_index} served from cache: {temp_image_path}")
             else:
-                raise Exception("OpenAI API did not return a valid image URL or base64 image data.")
+                self.cache_status[frame_index] = "miss"
+                # Generate image using DALL-E with custom quality and size
+                with metrics.provider_call("openai", "images.generate", images=1):
+                    response = self.client.images.generate(
+                        model=self.image_model,
+                        prompt=prompt,
+                        size=size,
+                        quality=quality,
+                        n=1,
+                    )
+                print(f"[ImageService] DALL-E API raw response for frame {frame_index}: {response}")
+
+                if not hasattr(response, 'data') or not response.data:
+                    print(f"[ImageService] ERROR: No image data returned. Full response: {response}")
+                    if hasattr(response, 'error'):
+                        print(f"[ImageService] OpenAI API error: {response.error}")
+                    raise Exception(f"OpenAI API did not return valid image data. See logs for details.")
+
+                image_data_obj = response.data[0]
+                image_url = getattr(image_data_obj, 'url', None)
+                b64_json = getattr(image_data_obj, 'b64_json', None)
+
+                if image_url:
+                    self._download_and_save_image(image_url, temp_image_path)
+                    print(f"[ImageService] Image saved to {temp_image_path}")
+                elif b64_json:
+                    image_data = base64.b64decode(b64_json)
+                    image = Image.open(io.BytesIO(image_data))
+                    image.save(temp_image_path, "PNG")
+                    print(f"[ImageService] Image saved to {temp_image_path} from base64 data")
+                else:
+                    raise Exception("OpenAI API did not return a valid image URL or base64 image data.")
+                metrics.file_written("image", temp_image_path)
+                self.image_cache.put(cache_key, {"image.png": temp_image_path})
+            job_events.sentence_done("images", frame_index, cached=self.cache_status[frame_index] == "hit")
             
             # Upload to S3 if available
             if self.use_s3:
@@ -168,6 +188,23 @@ class ImageService:
             print(f"[ImageService] Error generating image for frame {frame_index}: {str(e)}")
             raise Exception(f"Failed to generate image: {str(e)}")
 
+    async def generate_sketch_images(self, sentences: list, job_id: str, quality: str = "medium", size: str = "1536x1024", max_concurrency: int = None) -> list:
+        """
+        Generate one sketch image per sentence concurrently (bounded by IMAGE_MAX_CONCURRENCY),
+        retrying transient API failures per frame. Returns S3 URLs (or local paths when S3 is unavailable) in sentence order;
+        raises ImageBatchError listing the frame indices that failed.
+        """
+        return await generate_batch(
+            lambda i: self.generate_sketch_image_with_quality(sentences[i], job_id, i, quality, size),
+            len(sentences),
+            max_concurrency=max_concurrency,
+        )
+
+    def cache_summary(self) -> dict:
+        """Image cache hits and misses for the frames this service generated"""
+        statuses = list(self.cache_status.values())
+        return {"hits": statuses.count("hit"), "misses": statuses.count("miss")}
+
     def _create_enhanced_sketch_prompt(self, sentence: str, involves_people: bool) -> str:
         """
         Create an optimized prompt for whiteboard sketch style images with a focus on humans, emotions, and context.
@@ -202,7 +239,8 @@ Requirements:
         Download image from URL and save to local path
         """
         import requests
-        response = requests.get(image_url)
+        with metrics.provider_call("openai", "image_download"):
+            response = requests.get(image_url)
         if response.status_code == 200:
             image_data = response.content
             image = Image.open(io.BytesIO(image_data))
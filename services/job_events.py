@@ -0,0 +1,281 @@
+import atexit
+import contextvars
+import functools
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+# SQLite file shared with the job store; events are appended to it from the API
+# process and from render worker processes alike
+JOB_DB_PATH = os.getenv("DOODLY_JOB_DB", "jobs.sqlite3")
+# Frame progress is reported about this many times per clip
+FRAME_EVENTS_PER_CLIP = 20
+# Timed spans (stages, sentences, provider calls, subprocesses) recorded for each job's trace
+SPANS_ENABLED = os.getenv("DOODLY_JOB_TRACE", "1") != "0"
+# Events and spans older than this are deleted (0 keeps them forever)
+EVENT_RETENTION_DAYS = float(os.getenv("DOODLY_JOB_EVENT_RETENTION_DAYS", "7"))
+PRUNE_INTERVAL = 3600
+
+_job = contextvars.ContextVar("doodly_job", default=None)
+_sentence = contextvars.ContextVar("doodly_sentence", default=None)
+
+_conn = None
+_conn_pid = None
+_lock = threading.Lock()
+# Writes go through one writer thread per process, so callers on an event loop
+# (pipeline stages, job progress) never wait on SQLite
+_writes = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+_pruned_at = 0.0
+
+
+def _connection():
+    global _conn, _conn_pid
+    if _conn is None or _conn_pid != os.getpid():
+        directory = os.path.dirname(os.path.abspath(JOB_DB_PATH))
+        os.makedirs(directory, exist_ok=True)
+        _conn = sqlite3.connect(JOB_DB_PATH, check_same_thread=False, isolation_level=None, timeout=30)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                name TEXT,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        _conn.execute("CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, seq)")
+        _conn.execute("CREATE INDEX IF NOT EXISTS job_events_created ON job_events (created_at)")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_spans (
+                job_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                cat TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                track INTEGER NOT NULL,
+                start REAL NOT NULL,
+                dur REAL NOT NULL,
+                args TEXT NOT NULL
+            )
+        """)
+        _conn.execute("CREATE INDEX IF NOT EXISTS job_spans_job ON job_spans (job_id)")
+        _conn.execute("CREATE INDEX IF NOT EXISTS job_spans_start ON job_spans (start)")
+        _conn_pid = os.getpid()
+    return _conn
+
+
+def defer(fn, *args, **kwargs):
+    """Run fn(*args, **kwargs) on this process's writer thread, after every write queued before it."""
+    global _writes, _writer_pid
+    if _writer_pid != os.getpid():
+        with _writer_lock:
+            if _writer_pid != os.getpid():
+                _writes = queue.SimpleQueue()
+                threading.Thread(target=_write_loop, args=(_writes,), name="job-events-writer",
+                                 daemon=True).start()
+                _writer_pid = os.getpid()
+                atexit.register(flush)
+    _writes.put(functools.partial(fn, *args, **kwargs))
+
+
+def _write_loop(writes: queue.SimpleQueue):
+    while True:
+        write = writes.get()
+        try:
+            write()
+        except Exception as e:
+            print(f"[job_events] Write failed: {e}")
+
+
+def flush(timeout: float = 30) -> bool:
+    """Wait until the writes this process queued so far are in the database; False if that timed out."""
+    if _writer_pid != os.getpid():
+        return True
+    written = threading.Event()
+    _writes.put(written.set)
+    return written.wait(timeout)
+
+
+def _write(sql: str, params: tuple, what: str, job_id: str):
+    try:
+        with _lock:
+            _connection().execute(sql, params)
+    except sqlite3.Error as e:
+        # Progress reporting must never fail the job itself
+        print(f"[job_events] Could not record {what} for job {job_id}: {e}")
+
+
+def prune(retention_days: float = None):
+    """Delete events and spans older than the retention window."""
+    retention_days = EVENT_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return
+    cutoff = time.time() - retention_days * 86400
+    try:
+        with _lock:
+            events = _connection().execute("DELETE FROM job_events WHERE created_at < ?", (cutoff,)).rowcount
+            spans = _connection().execute("DELETE FROM job_spans WHERE start + dur < ?", (cutoff,)).rowcount
+    except sqlite3.Error as e:
+        print(f"[job_events] Could not prune old events: {e}")
+        return
+    if events or spans:
+        print(f"[job_events] Pruned {events} events and {spans} spans older than {retention_days:g} days")
+
+
+def prune_if_due():
+    """prune() on the writer thread, at most once every PRUNE_INTERVAL seconds per process."""
+    global _pruned_at
+    now = time.time()
+    if now - _pruned_at >= PRUNE_INTERVAL:
+        _pruned_at = now
+        defer(prune)
+
+
+@contextmanager
+def bound(job_id: Optional[str], sentence: Optional[int] = None):
+    """Attribute events emitted inside this block (and tasks/threads started from it) to a job."""
+    job_token = _job.set(job_id)
+    sentence_token = _sentence.set(sentence)
+    try:
+        yield
+    finally:
+        _sentence.reset(sentence_token)
+        _job.reset(job_token)
+
+
+def current_job() -> Optional[str]:
+    return _job.get()
+
+
+def emit(event_type: str, job_id: Optional[str] = None, name: Optional[str] = None, **data):
+    """Append an event for job_id (default: the bound job). No-op outside a job."""
+    job_id = job_id or _job.get()
+    if job_id is None:
+        return
+    defer(_write, "INSERT INTO job_events (job_id, type, name, data, created_at) VALUES (?, ?, ?, ?, ?)",
+          (job_id, event_type, name, json.dumps(data), time.time()), event_type, job_id)
+
+
+def stage(name: str):
+    """Report that the bound job entered a stage; only the first entry is recorded."""
+    job_id = _job.get()
+    if job_id is None:
+        return
+    defer(_write,
+          "INSERT INTO job_events (job_id, type, name, data, created_at) "
+          "SELECT ?, 'stage', ?, ?, ? WHERE NOT EXISTS "
+          "(SELECT 1 FROM job_events WHERE job_id = ? AND type = 'stage' AND name = ?)",
+          (job_id, name, json.dumps({"stage": name}), time.time(), job_id, name), f"stage {name}", job_id)
+
+
+def sentence_done(stage_name: str, index: Optional[int] = None, **data):
+    """Report that one sentence finished a stage."""
+    index = _sentence.get() if index is None else index
+    emit("sentence", name=stage_name, stage=stage_name, index=index, **data)
+
+
+def frame_reporter():
+    """
+    Callback for renderers: on_frame(rendered, expected) reports frame progress for the
+    bound sentence about FRAME_EVENTS_PER_CLIP times per clip. None outside a job.
+    """
+    if _job.get() is None:
+        return None
+    index = _sentence.get()
+    last = [0]
+
+    def on_frame(rendered: int, expected: int):
+        step = max(1, expected // FRAME_EVENTS_PER_CLIP)
+        if rendered == expected or rendered - last[0] >= step:
+            last[0] = rendered
+            emit("frames", index=index, rendered=rendered, expected=expected)
+
+    return on_frame
+
+
+def bytes_reporter(total: int, name: str):
+    """Callback for uploads (boto3 `Callback` style): called with each chunk's byte count."""
+    if _job.get() is None:
+        return None
+    sent = [0, 0]
+    # boto3 calls back from its transfer threads
+    lock = threading.Lock()
+
+    def on_bytes(count: int):
+        with lock:
+            sent[0] += count
+            if not (sent[0] == total or sent[0] - sent[1] >= max(1, total // 20)):
+                return
+            sent[1] = sent[0]
+        emit("upload", key=name, sent=sent[0], total=total)
+
+    return on_bytes
+
+
+def tracing() -> bool:
+    """Whether spans are being recorded here (a job is bound and tracing is on)."""
+    return SPANS_ENABLED and _job.get() is not None
+
+
+def add_span(name: str, cat: str, start: float, dur: float, args: Optional[dict] = None,
+             job_id: Optional[str] = None, track: Optional[int] = None):
+    """
+    Record a finished span for job_id (default: the bound job). start is a time.time()
+    timestamp. Spans go on the bound sentence's track (0 for job-level work).
+    """
+    job_id = job_id or _job.get()
+    if job_id is None or not SPANS_ENABLED:
+        return
+    if track is None:
+        sentence = _sentence.get()
+        track = 0 if sentence is None else sentence + 1
+    defer(_write, "INSERT INTO job_spans (job_id, name, cat, pid, track, start, dur, args) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+          (job_id, name, cat, os.getpid(), track, start, dur, json.dumps(args or {}, default=str)),
+          f"span {name}", job_id)
+
+
+@contextmanager
+def span(name: str, cat: str, **args):
+    """Time the block as a span of the bound job; yields args, which the block may add to."""
+    if not tracing():
+        yield args
+        return
+    job_id = _job.get()
+    start = time.time()
+    try:
+        yield args
+    except BaseException as e:
+        args["error"] = type(e).__name__
+        raise
+    finally:
+        add_span(name, cat, start, time.time() - start, args, job_id=job_id)
+
+
+def read_spans(job_id: str) -> List[dict]:
+    """Spans recorded for job_id, by start time."""
+    flush()
+    with _lock:
+        rows = _connection().execute(
+            "SELECT name, cat, pid, track, start, dur, args FROM job_spans WHERE job_id = ? ORDER BY start",
+            (job_id,),
+        ).fetchall()
+    return [{"name": name, "cat": cat, "pid": pid, "track": track, "start": start, "dur": dur,
+             "args": json.loads(args)} for name, cat, pid, track, start, dur, args in rows]
+
+
+def read(job_id: str, after: int = 0, limit: int = 500) -> List[dict]:
+    """Events for job_id with seq > after, oldest first."""
+    with _lock:
+        rows = _connection().execute(
+            "SELECT seq, type, data, created_at FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (job_id, after, limit),
+        ).fetchall()
+    return [{"seq": seq, "type": t, "data": json.loads(d), "time": ts} for seq, t, d, ts in rows]
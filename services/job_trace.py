@@ -0,0 +1,137 @@
+"""
+Per-job timelines in the Chrome trace format (chrome://tracing, ui.perfetto.dev).
+
+Spans are recorded through services.job_events while a job is bound: job
+stages, each sentence and its pipeline stages, provider calls, and the
+subprocesses started through run/Popen below, which add the child's own CPU
+time and peak RSS (also charged to the job's services.job_usage, traced or not). chrome_trace(job_id) lays them out with one process row per
+OS process (the API process and each render worker) and one track per sentence.
+"""
+
+import json
+import os
+import subprocess
+import time
+from typing import Optional
+
+from . import job_events, job_usage
+
+# Finished jobs' traces are written here; served only through GET /jobs/{job_id}/trace
+TRACE_DIR = os.getenv("DOODLY_TRACE_DIR", ".cache/traces")
+
+
+class Popen(subprocess.Popen):
+    """
+    subprocess.Popen that, when the child is reaped by wait(), communicate() or poll(),
+    records a span for the bound job with the child's wall time, CPU time and peak RSS,
+    and charges that CPU time and RSS to the job's usage.
+    """
+
+    def __init__(self, args, *popen_args, **kwargs):
+        self._span_job = job_events.current_job() if job_events.tracing() else None
+        self._usage = job_usage.current()
+        self._span_start = time.time()
+        super().__init__(args, *popen_args, **kwargs)
+
+    def _traced(self) -> bool:
+        return ((self._span_job is not None or self._usage is not None)
+                and self.returncode is None and hasattr(os, "wait4"))
+
+    def _reap(self, flags: int) -> Optional[int]:
+        # wait4 rather than waitpid, so the child's rusage is known
+        try:
+            pid, status, usage = os.wait4(self.pid, flags)
+        except ChildProcessError:
+            # Reaped elsewhere; let Popen settle the return code
+            self._span_job = self._usage = None
+            return super().wait()
+        if pid == 0:
+            return None
+        self.returncode = os.waitstatus_to_exitcode(status)
+        cpu_s = usage.ru_utime + usage.ru_stime
+        if self._usage is not None:
+            self._usage.add_subprocess(cpu_s, usage.ru_maxrss * 1024)
+        if self._span_job is None:
+            return self.returncode
+        command = self.args if isinstance(self.args, (list, tuple)) else [self.args]
+        job_events.add_span(
+            os.path.basename(str(command[0])), "subprocess", self._span_start,
+            time.time() - self._span_start,
+            {
+                "command": " ".join(map(str, command))[:300],
+                "cpu_s": round(cpu_s, 4),
+                "max_rss_mb": round(usage.ru_maxrss / 1024, 1),
+            },
+            job_id=self._span_job,
+        )
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if timeout is not None or not self._traced():
+            return super().wait(timeout)
+        return self._reap(0)
+
+    def poll(self):
+        if not self._traced():
+            return super().poll()
+        return self._reap(os.WNOHANG)
+
+
+def run(args, *, input=None, capture_output=False, check=False, **kwargs) -> subprocess.CompletedProcess:
+    """subprocess.run, traced as a span of the bound job and charged to its usage (see Popen)."""
+    if not job_events.tracing() and job_usage.current() is None:
+        return subprocess.run(args, input=input, capture_output=capture_output, check=check, **kwargs)
+    if input is not None:
+        kwargs["stdin"] = subprocess.PIPE
+    if capture_output:
+        kwargs["stdout"] = kwargs["stderr"] = subprocess.PIPE
+    with Popen(args, **kwargs) as process:
+        try:
+            stdout, stderr = process.communicate(input)
+        except BaseException:
+            process.kill()
+            raise
+    if check and process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, args, output=stdout, stderr=stderr)
+    return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
+
+
+def chrome_trace(job_id: str) -> dict:
+    """The job's spans as a Chrome trace (JSON object format); empty if nothing was recorded."""
+    spans = job_events.read_spans(job_id)
+    if not spans:
+        return {"traceEvents": [], "displayTimeUnit": "ms"}
+    origin = min(span["start"] for span in spans)
+    # The process that ran the job records its job-level spans; every other process is a render worker
+    main_pids = {span["pid"] for span in spans if span["cat"] == "job"}
+    events = []
+    for pid in sorted({span["pid"] for span in spans}):
+        name = f"job {job_id[:8]}" if pid in main_pids else "render worker"
+        events.append({"ph": "M", "name": "process_name", "pid": pid, "tid": 0,
+                       "args": {"name": f"{name} (pid {pid})"}})
+        events.append({"ph": "M", "name": "process_sort_index", "pid": pid, "tid": 0,
+                       "args": {"sort_index": 0 if pid in main_pids else 1}})
+    for pid, track in sorted({(span["pid"], span["track"]) for span in spans}):
+        events.append({"ph": "M", "name": "thread_name", "pid": pid, "tid": track,
+                       "args": {"name": "job" if track == 0 else f"sentence {track}"}})
+        events.append({"ph": "M", "name": "thread_sort_index", "pid": pid, "tid": track,
+                       "args": {"sort_index": track}})
+    for span in spans:
+        events.append({
+            "ph": "X", "name": span["name"], "cat": span["cat"],
+            "pid": span["pid"], "tid": span["track"],
+            "ts": round((span["start"] - origin) * 1e6), "dur": max(1, round(span["dur"] * 1e6)),
+            "args": span["args"],
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"job_id": job_id, "start": origin}}
+
+
+def write_chrome_trace(job_id: str, path: str) -> str:
+    """Write the job's Chrome trace to path and return path."""
+    # The job's last spans (its own, closed after the job's flush) may still be queued
+    if not job_events.flush():
+        print(f"[job_trace] Event writer still busy, trace for job {job_id} may be incomplete")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(chrome_trace(job_id), f)
+    return path
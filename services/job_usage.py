@@ -0,0 +1,206 @@
+"""
+Per-job resource accounting, reported as `usage` in each job's result.
+
+While a job runs, JobUsage charges it:
+- the CPU time of its event-loop thread, plus the thread CPU time of the work
+  it hands to the I/O pool (executors.run_io);
+- the provider calls made on its behalf (metrics.provider_call), with the
+  characters synthesised, images generated and bytes uploaded by successful calls.
+
+It also samples the API process's RSS and the size of the job's scratch files
+(files and directories in scratch_dirs whose name contains the job id).
+Child processes are charged whether or not job traces are on: each CPU pool
+task reports the rusage deltas of its worker and the worker's subprocesses
+(executors.submit_cpu), and subprocesses the job starts itself through
+services.job_trace are reaped with wait4 (add_subprocess).
+"""
+
+import contextvars
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Sequence, Tuple
+
+# Seconds between RSS and scratch-disk samples
+USAGE_SAMPLE_INTERVAL = float(os.getenv("DOODLY_USAGE_SAMPLE_SECONDS", "1.0"))
+
+_usage = contextvars.ContextVar("doodly_usage", default=None)
+
+
+def current() -> Optional["JobUsage"]:
+    """The JobUsage being tracked in this context, if any."""
+    return _usage.get()
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # No procfs: the process's lifetime peak is the best available (KiB on Linux)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def process_cpu() -> Tuple[float, float]:
+    """CPU seconds used so far by this process and by its reaped children."""
+    own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime, children.ru_utime + children.ru_stime
+
+
+def task_cost(cpu_start: Tuple[float, float]) -> dict:
+    """
+    CPU time since process_cpu() returned cpu_start, and peak RSS in bytes, of this
+    process and its reaped children. Only meaningful in a process running one task at a time.
+    """
+    own, children = process_cpu()
+    return {
+        "cpu_s": own - cpu_start[0],
+        "children_cpu_s": children - cpu_start[1],
+        # KiB on Linux; lifetime peaks, as rusage keeps no per-task maximum
+        "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "children_max_rss": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024,
+    }
+
+
+def _tree_bytes(path: str) -> int:
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class JobUsage:
+    """Resources one job used; see the module docstring."""
+
+    def __init__(self, job_id: str, scratch_dirs: Sequence[str] = ()):
+        self.job_id = job_id
+        self.scratch_dirs = list(scratch_dirs)
+        self.cpu_self_s = 0.0
+        self.peak_rss = 0
+        self.peak_scratch = 0
+        self.workers_cpu_s = 0.0
+        self.subprocess_cpu_s = 0.0
+        self.peak_worker_rss = 0
+        self.peak_subprocess_rss = 0
+        # (provider, operation) -> {"calls", "errors", and amounts such as "characters"}
+        self.providers = {}
+        self._lock = threading.Lock()
+        self._started = None
+        self._wall_s = 0.0
+
+    def charge(self, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) and charge its thread CPU time to the job."""
+        start = time.thread_time()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            spent = time.thread_time() - start
+            with self._lock:
+                self.cpu_self_s += spent
+
+    def add_task(self, cost: dict):
+        """Charge a CPU pool task (a task_cost() from its worker) to the job."""
+        with self._lock:
+            self.workers_cpu_s += cost["cpu_s"]
+            self.subprocess_cpu_s += cost["children_cpu_s"]
+            self.peak_worker_rss = max(self.peak_worker_rss, cost["max_rss"])
+            self.peak_subprocess_rss = max(self.peak_subprocess_rss, cost["children_max_rss"])
+
+    def add_subprocess(self, cpu_s: float, max_rss: int):
+        """Charge a subprocess the job started (reaped with wait4) to the job."""
+        with self._lock:
+            self.subprocess_cpu_s += cpu_s
+            self.peak_subprocess_rss = max(self.peak_subprocess_rss, max_rss)
+
+    def provider_call(self, provider: str, operation: str, ok: bool = True, **amounts):
+        with self._lock:
+            entry = self.providers.setdefault((provider, operation), {"calls": 0, "errors": 0})
+            entry["calls"] += 1
+            if not ok:
+                entry["errors"] += 1
+                return
+            for name, amount in amounts.items():
+                entry[name] = entry.get(name, 0) + amount
+
+    def _scratch_bytes(self) -> int:
+        total = 0
+        for directory in self.scratch_dirs:
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if self.job_id in entry.name:
+                    try:
+                        total += _tree_bytes(entry.path)
+                    except OSError:
+                        pass
+        return total
+
+    def _sample(self):
+        rss, scratch = _rss_bytes(), self._scratch_bytes()
+        with self._lock:
+            self.peak_rss = max(self.peak_rss, rss)
+            self.peak_scratch = max(self.peak_scratch, scratch)
+
+    @contextmanager
+    def track(self):
+        """Account the block, run on the job's thread, to this job."""
+        token = _usage.set(self)
+        stop = threading.Event()
+
+        def sampler():
+            while not stop.wait(USAGE_SAMPLE_INTERVAL):
+                self._sample()
+
+        thread = threading.Thread(target=sampler, name=f"usage-{self.job_id[:8]}", daemon=True)
+        self._started = time.perf_counter()
+        self._sample()
+        thread.start()
+        cpu_start = time.thread_time()
+        try:
+            yield self
+        finally:
+            self.cpu_self_s += time.thread_time() - cpu_start
+            stop.set()
+            thread.join()
+            self._sample()
+            self._wall_s = time.perf_counter() - self._started
+            _usage.reset(token)
+
+    def summary(self) -> dict:
+        """The figures reported in the job result."""
+        workers_cpu, subprocess_cpu = self.workers_cpu_s, self.subprocess_cpu_s
+        children = workers_cpu + subprocess_cpu
+        providers = {}
+        s3_bytes = 0
+        for (provider, operation), entry in sorted(self.providers.items()):
+            providers.setdefault(provider, {})[operation] = dict(entry)
+            if provider == "s3":
+                s3_bytes += entry.get("bytes_uploaded", 0)
+        return {
+            "wall_s": round(self._wall_s, 2),
+            "cpu_s": {
+                "total": round(self.cpu_self_s + children, 2),
+                "self": round(self.cpu_self_s, 2),
+                "children": round(children, 2),
+                "render_workers": round(workers_cpu, 2),
+                "subprocesses": round(subprocess_cpu, 2),
+            },
+            "peak_rss_mb": {
+                "main": round(self.peak_rss / 2 ** 20, 1),
+                "render_worker": round(self.peak_worker_rss / 2 ** 20, 1),
+                "subprocess": round(self.peak_subprocess_rss / 2 ** 20, 1),
+            },
+            "peak_scratch_mb": round(self.peak_scratch / 2 ** 20, 1),
+            "s3_bytes_uploaded": s3_bytes,
+            "providers": providers,
+        }
@@ -0,0 +1,287 @@
+"""
+Process-wide metrics, served in the Prometheus text format from GET /metrics.
+
+Services and the pipeline record through the hooks below: stage timings,
+provider calls (latency, and errors by status), bytes written and uploaded, and
+disk cache hits and misses (services.disk_cache).
+Stage and provider hooks also record a span in the bound job's trace (see
+services.job_trace). With DOODLY_METRICS=0 and DOODLY_JOB_TRACE=0 every hook
+returns immediately; with DOODLY_METRICS=0 alone /metrics is empty.
+
+Tracing and rendering run in the CPU pool's worker processes; each worker
+writes its samples under METRICS_DIR after every task (flush) and the API
+process merges them in when scraped. Gauges are read at scrape time from
+callbacks the app registers (register_gauge).
+"""
+
+import atexit
+import functools
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+from . import job_events, job_usage
+
+ENABLED = os.getenv("DOODLY_METRICS", "1") != "0"
+# Samples from render worker processes, one file per worker under a directory per API process
+METRICS_DIR = os.getenv("DOODLY_METRICS_DIR", ".cache/metrics")
+
+STAGE_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+PROVIDER_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# name -> (type, help, buckets)
+FAMILIES = {
+    "doodly_stage_seconds": ("histogram", "Time spent in one pipeline stage call", STAGE_BUCKETS),
+    "doodly_provider_request_seconds": ("histogram", "Latency of provider API calls", PROVIDER_BUCKETS),
+    "doodly_provider_errors_total": ("counter", "Failed provider API calls by status", None),
+    "doodly_bytes_written_total": ("counter", "Bytes of media written to local disk", None),
+    "doodly_bytes_uploaded_total": ("counter", "Bytes uploaded to object storage", None),
+    "doodly_cache_requests_total": ("counter", "Disk cache (TTS, image, render) lookups by result", None),
+}
+
+_lock = threading.Lock()
+# (name, labels) -> value; labels is a sorted tuple of (key, value) pairs
+_counters = {}
+# (name, labels) -> [per-bucket counts..., +Inf count, sum]
+_histograms = {}
+# name -> (help, fn); fn returns a number or {labels dict as tuple: number}
+_gauges = {}
+# Set in CPU pool workers, whose samples are flushed to disk for the parent
+_is_worker = False
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    if not ENABLED:
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels):
+    if not ENABLED:
+        return
+    buckets = FAMILIES[name][2]
+    key = (name, _labels(labels))
+    with _lock:
+        counts = _histograms.get(key)
+        if counts is None:
+            counts = _histograms[key] = [0] * (len(buckets) + 2)
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[len(buckets)] += 1
+        counts[-1] += value
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time the block into doodly_stage_seconds{stage} and the bound job's trace."""
+    with job_events.span(stage, "stage"):
+        if not ENABLED:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            observe("doodly_stage_seconds", time.perf_counter() - start, stage=stage)
+
+
+def timed(stage: str):
+    """Decorator form of stage_timer; leaves the function untouched when metrics and traces are off."""
+    def decorate(fn):
+        if not ENABLED and not job_events.SPANS_ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def error_status(error: BaseException) -> str:
+    """HTTP status of a failed provider call where the client exposes one, else the error type."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is None:
+        # botocore ClientError keeps the response as a dict
+        response = getattr(error, "response", None)
+        if isinstance(response, dict):
+            status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return str(status) if status is not None else type(error).__name__
+
+
+@contextmanager
+def provider_call(provider: str, operation: str, **amounts):
+    """
+    Time one provider API call; an exception out of the block is counted as an error.
+    amounts (characters, images, bytes_uploaded) are what a successful call is billed
+    for; they are charged to the job whose usage is being tracked (services.job_usage).
+    """
+    usage = job_usage.current()
+    with job_events.span(f"{provider} {operation}", "provider", **amounts):
+        if not ENABLED and usage is None:
+            yield
+            return
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        except BaseException as e:
+            inc("doodly_provider_errors_total", provider=provider, operation=operation, status=error_status(e))
+            raise
+        finally:
+            observe("doodly_provider_request_seconds", time.perf_counter() - start,
+                    provider=provider, operation=operation)
+            if usage is not None:
+                usage.provider_call(provider, operation, ok, **amounts)
+
+
+def bytes_written(kind: str, count: int):
+    inc("doodly_bytes_written_total", count, kind=kind)
+
+
+def file_written(kind: str, path: str):
+    """Count a finished output file (clip, video, audio, image) towards bytes written."""
+    if not ENABLED:
+        return
+    try:
+        bytes_written(kind, os.path.getsize(path))
+    except OSError:
+        pass
+
+
+def bytes_uploaded(count: int, provider: str = "s3"):
+    inc("doodly_bytes_uploaded_total", count, provider=provider)
+
+
+def register_gauge(name: str, help_text: str, fn):
+    """fn() is called at scrape time and returns a number or {(("label", "value"), ...): number}."""
+    _gauges[name] = (help_text, fn)
+
+
+def _worker_dir(pid: int) -> str:
+    return os.path.join(METRICS_DIR, str(pid))
+
+
+def mark_worker():
+    """Called by the CPU pool's worker initializer."""
+    global _is_worker
+    _is_worker = True
+
+
+def flush():
+    """In a worker process, write this process's samples for the parent's /metrics; no-op elsewhere."""
+    if not ENABLED or not _is_worker:
+        return
+    with _lock:
+        snapshot = {
+            "counters": [[name, labels, value] for (name, labels), value in _counters.items()],
+            "histograms": [[name, labels, counts] for (name, labels), counts in _histograms.items()],
+        }
+    directory = _worker_dir(os.getppid())
+    try:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(snapshot, f)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"[metrics] Could not write worker samples: {e}")
+
+
+def _merged():
+    """Counters and histograms of this process plus those its workers flushed."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(counts) for key, counts in _histograms.items()}
+    directory = _worker_dir(os.getpid())
+    for entry in os.listdir(directory) if os.path.isdir(directory) else ():
+        if not entry.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, entry)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts in snapshot["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [0] * len(counts))
+            histograms[key] = [a + b for a, b in zip(merged, counts)]
+    return counters, histograms
+
+
+def _format_labels(labels, extra=()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    if not ENABLED:
+        return ""
+    counters, histograms = _merged()
+    lines = []
+    for name, (kind, help_text, buckets) in FAMILIES.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        if kind == "counter":
+            for (sample, labels), value in sorted(counters.items()):
+                if sample == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_number(value)}")
+            continue
+        for (sample, labels), counts in sorted(histograms.items()):
+            if sample != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            cumulative += counts[len(buckets)]
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_number(counts[-1])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    for name, (help_text, fn) in list(_gauges.items()):
+        try:
+            value = fn()
+        except Exception as e:
+            print(f"[metrics] Gauge {name} failed: {e}")
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        samples = value.items() if isinstance(value, dict) else [((), value)]
+        for labels, sample in samples:
+            lines.append(f"{name}{_format_labels(labels)} {_number(sample)}")
+    return "\n".join(lines) + "\n"
+
+
+def _cleanup():
+    shutil.rmtree(_worker_dir(os.getpid()), ignore_errors=True)
+
+
+if ENABLED:
+    # Samples left by workers of an earlier process with the same pid
+    _cleanup()
+    atexit.register(_cleanup)
@@ -0,0 +1,157 @@
+"""
+On-demand sampling profiler for one job or CLI run.
+
+Sampler.running() samples, every PROFILE_INTERVAL seconds, the Python stack of
+the thread that entered it and of I/O pool threads while they run calls made
+from it (executors.run_io). CPU pool tasks submitted from it
+(executors.submit_cpu) are sampled inside the render worker and merged in when
+the profile is written. Nothing is sampled, and no hook does more than a
+context-variable lookup, unless a profile was asked for.
+
+The output is in collapsed-stack ("folded") format, one `root;frame;frame count`
+line per distinct stack, which flamegraph.pl, inferno and speedscope read.
+Samples are wall-clock: time spent waiting (on a provider, a subprocess or the
+next queued sentence) shows up as the frame that waits.
+"""
+
+import collections
+import contextvars
+import glob
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+# Seconds between stack samples
+PROFILE_INTERVAL = float(os.getenv("DOODLY_PROFILE_INTERVAL", "0.01"))
+# Off unless operators opt in: any API client can ask for a profile, and it costs them sampling overhead
+PROFILING_ALLOWED = os.getenv("DOODLY_ALLOW_PROFILING", "0") == "1"
+# Profiled API jobs write their stacks here (they name server paths); served only through GET /jobs/{job_id}/profile
+PROFILE_DIR = os.getenv("DOODLY_PROFILE_DIR", ".cache/profiles")
+
+_sampler = contextvars.ContextVar("doodly_profiler", default=None)
+
+
+def current() -> Optional["Sampler"]:
+    """The Sampler profiling this context, if any."""
+    return _sampler.get()
+
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Sampler:
+    """Samples the threads working for one job or run; writes collapsed stacks to path."""
+
+    def __init__(self, path: str, interval: float = None, root: str = "main"):
+        self.path = path
+        self.interval = PROFILE_INTERVAL if interval is None else interval
+        self.root = root
+        self.counts = collections.Counter()
+        # thread ident -> (label, number of calls it is running for us)
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._parts = 0
+
+    def _add_thread(self, label: str):
+        ident = threading.get_ident()
+        with self._lock:
+            _, active = self._threads.get(ident, (label, 0))
+            self._threads[ident] = (label, active + 1)
+        return ident
+
+    def _remove_thread(self, ident: int):
+        with self._lock:
+            label, active = self._threads[ident]
+            if active > 1:
+                self._threads[ident] = (label, active - 1)
+            else:
+                del self._threads[ident]
+
+    def attach(self, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs), sampling the calling (pool) thread while it runs."""
+        ident = self._add_thread("io")
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._remove_thread(ident)
+
+    def worker_part(self) -> str:
+        """A path for one CPU pool task's samples, merged into this profile when it is written."""
+        with self._lock:
+            self._parts += 1
+            return f"{self.path}.{self._parts}.part"
+
+    def _sample(self):
+        frames = sys._current_frames()
+        with self._lock:
+            threads = list(self._threads.items())
+        for ident, (label, _) in threads:
+            frame = frames.get(ident)
+            if frame is not None:
+                self.counts[f"{self.root};{label};{_collapse(frame)}"] += 1
+
+    @contextmanager
+    def running(self, label: str = "job"):
+        """Profile the calling thread (and the work it hands out) for the duration of the block."""
+        token = _sampler.set(self)
+        ident = self._add_thread(label)
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(self.interval):
+                self._sample()
+
+        thread = threading.Thread(target=sample, name="profiler", daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            stop.set()
+            thread.join()
+            self._remove_thread(ident)
+            _sampler.reset(token)
+            try:
+                self.write()
+            except OSError as e:
+                print(f"[profiler] Could not write {self.path}: {e}")
+
+    def write(self) -> str:
+        """Merge finished worker parts and write the collapsed stacks to self.path."""
+        for part in sorted(glob.glob(glob.escape(self.path) + ".*.part")):
+            try:
+                with open(part) as f:
+                    _read_folded(f, self.counts)
+                os.remove(part)
+            except OSError as e:
+                print(f"[profiler] Could not merge {part}: {e}")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "w") as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{stack} {count}\n")
+        print(f"[profiler] {sum(self.counts.values())} samples written to {self.path}")
+        return self.path
+
+
+def _read_folded(f, counts: collections.Counter):
+    for line in f:
+        stack, _, count = line.rstrip("\n").rpartition(" ")
+        if stack:
+            counts[stack] += int(count)
+
+
+def profiled_task(part_path: str, fn, *args, **kwargs):
+    """Runs in a CPU pool worker: fn(*args, **kwargs) under its own Sampler, saved to part_path."""
+    sampler = Sampler(part_path, root="render worker")
+    with sampler.running(label=f"pid {os.getpid()}"):
+        return fn(*args, **kwargs)
@@ -6,6 +6,7 @@ from typing import Optional, Dict, List
 import logging
 from datetime import datetime
 import mimetypes
+from . import job_events, metrics
 
 class S3Service:
     """
@@ -84,15 +85,19 @@ class S3Service:
                 if not content_type:
                     content_type = 'application/octet-stream'
             
-            # Upload file (no ACL)
-            self.s3_client.upload_file(
-                file_path,
-                self.bucket_name,
-                s3_key,
-                ExtraArgs={
-                    'ContentType': content_type
-                }
-            )
+            # Upload file (no ACL), reporting bytes sent when running inside a job
+            size = os.path.getsize(file_path)
+            with metrics.provider_call("s3", "upload_file", bytes_uploaded=size):
+                self.s3_client.upload_file(
+                    file_path,
+                    self.bucket_name,
+                    s3_key,
+                    ExtraArgs={
+                        'ContentType': content_type
+                    },
+                    Callback=job_events.bytes_reporter(size, s3_key)
+                )
+            metrics.bytes_uploaded(size)
             
             # Generate S3 URL
             s3_url = f"https://{self.bucket_name}.s3.{self.aws_region}.amazonaws.com/{s3_key}"
@@ -117,12 +122,14 @@ class S3Service:
             S3 URL of the uploaded file
         """
         try:
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=s3_key,
-                Body=data,
-                ContentType=content_type
-            )
+            with metrics.provider_call("s3", "put_object", bytes_uploaded=len(data)):
+                self.s3_client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=s3_key,
+                    Body=data,
+                    ContentType=content_type
+                )
+            metrics.bytes_uploaded(len(data))
             
             s3_url = f"https://{self.bucket_name}.s3.{self.aws_region}.amazonaws.com/{s3_key}"
             self.logger.info(f"Uploaded bytes to {s3_url}")
@@ -148,7 +155,8 @@ class S3Service:
             # Ensure directory exists
             os.makedirs(os.path.dirname(local_path), exist_ok=True)
             
-            self.s3_client.download_file(self.bucket_name, s3_key, local_path)
+            with metrics.provider_call("s3", "download_file"):
+                self.s3_client.download_file(self.bucket_name, s3_key, local_path)
             self.logger.info(f"Downloaded {s3_key} to {local_path}")
             return True
             
@@ -167,7 +175,8 @@ class S3Service:
             True if successful, False otherwise
         """
         try:
-            self.s3_client.delete_object(Bucket=self.bucket_name, Key=s3_key)
+            with metrics.provider_call("s3", "delete_object"):
+                self.s3_client.delete_object(Bucket=self.bucket_name, Key=s3_key)
             self.logger.info(f"Deleted {s3_key} from S3")
             return True
             
@@ -273,6 +282,7 @@ class S3Service:
         s3_key = f"audio/{job_id}/{filename}"
         return self.upload_file(local_audio_path, s3_key, 'audio/mpeg')
     
+    @metrics.timed("upload")
     def upload_video(self, local_video_path: str, job_id: str, video_type: str = "final") -> str:
         """
         Upload a generated video to S3.
@@ -285,6 +295,7 @@ class S3Service:
         Returns:
             S3 URL of the uploaded video
         """
+        job_events.stage("upload")
         filename = os.path.basename(local_video_path)
         s3_key = f"videos/{job_id}/{video_type}_{filename}"
         return self.upload_file(local_video_path, s3_key, 'video/mp4')
@@ -2,6 +2,22 @@ import openai
 import os
 import re
 from typing import List
+from . import job_events, metrics
+
+
+def split_sentences(script: str) -> List[str]:
+    """Split a script into sentences, dropping very short fragments."""
+    # Split by common sentence endings, but be careful with abbreviations
+    sentences = re.split(r'(?<=[.!?])\s+', script)
+    
+    # Clean up sentences
+    cleaned_sentences = []
+    for sentence in sentences:
+        sentence = sentence.strip()
+        if sentence and len(sentence) > 5:  # Filter out very short fragments
+            cleaned_sentences.append(sentence)
+    return cleaned_sentences
+
 
 class ScriptService:
     def __init__(self):
@@ -28,15 +44,16 @@ Requirements:
 Return only the script text, no additional formatting or explanations.
 """
 
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Create a detailed, step-by-step script about: {topic}"}
-                ],
-                max_tokens=1000,
-                temperature=0.7
-            )
+            with metrics.provider_call("openai", "chat.completions"):
+                response = self.client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": f"Create a detailed, step-by-step script about: {topic}"}
+                    ],
+                    max_tokens=1000,
+                    temperature=0.7
+                )
             
             script = response.choices[0].message.content.strip()
             print("\n[ScriptService] Generated script for topic:", topic)
@@ -52,16 +69,10 @@ Return only the script text, no additional formatting or explanations.
         """
         Split the script into individual sentences for image generation
         """
-        # Split by common sentence endings, but be careful with abbreviations
-        sentences = re.split(r'(?<=[.!?])\s+', script)
-        
-        # Clean up sentences
-        cleaned_sentences = []
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if sentence and len(sentence) > 5:  # Filter out very short fragments
-                cleaned_sentences.append(sentence)
-        
+        job_events.stage("split")
+        with metrics.stage_timer("split"):
+            cleaned_sentences = split_sentences(script)
+        job_events.emit("split", sentences=len(cleaned_sentences))
         return cleaned_sentences
     
     def create_image_prompt(self, sentence: str) -> str:
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import random
+import threading
+import weakref
+from typing import Optional
+
+import requests
+
+from . import executors, metrics
+from .audio_timeline import mp3_duration
+from .disk_cache import DiskCache, get_cache
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Synthesised MP3s are kept on disk across jobs, keyed on text, voice and model
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", ".cache/tts")
+TTS_CACHE_MAX_MB = float(os.getenv("TTS_CACHE_MAX_MB", "512"))
+
+
+def normalise_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+class TTSError(Exception):
+    def __init__(self, status_code: int, message: str, retry_after: float = None):
+        super().__init__(f"ElevenLabs TTS failed with HTTP {status_code}: {message}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class TTSClient:
+    """
+    Minimal ElevenLabs REST client (text-to-speech and the voice list) with bounded
+    concurrency, used instead of the `elevenlabs` SDK: the SDK hides the HTTP status
+    and Retry-After header, has no timeout, and takes a process-wide API key and base URL.
+    Requests run on worker threads so the event loop stays free, at most
+    `max_concurrency` at a time per event loop (each job runs its own loop), and
+    429/5xx responses are retried with jittered exponential backoff. The base URL
+    is configurable so it can point at a local fake server.
+    Results are cached on disk (see TTS_CACHE_DIR); hits and misses are exported from
+    /metrics as doodly_cache_requests_total{cache="tts"}.
+    """
+
+    def __init__(self, api_key: str, base_url: str = None, max_concurrency: int = None,
+                 max_retries: int = None, backoff: float = None, timeout: float = 120):
+        self.api_key = api_key
+        self.base_url = (base_url or os.getenv("ELEVENLABS_API_BASE", "https://api.elevenlabs.io/v1")).rstrip("/")
+        self.max_concurrency = max_concurrency or int(os.getenv("TTS_MAX_CONCURRENCY", "4"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("TTS_MAX_RETRIES", "4"))
+        self.backoff = backoff if backoff is not None else float(os.getenv("TTS_RETRY_BACKOFF", "1.0"))
+        self.timeout = timeout
+        # One semaphore per running loop: asyncio primitives must not be shared between loops
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._semaphores_lock = threading.Lock()
+        self.cache = get_cache(TTS_CACHE_DIR, TTS_CACHE_MAX_MB)
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._semaphores_lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+            return semaphore
+
+    def voices_blocking(self) -> list:
+        """The account's voices, as ElevenLabs returns them (dicts with voice_id, name, category)."""
+        with metrics.provider_call("elevenlabs", "voices"):
+            response = requests.get(f"{self.base_url}/voices", headers={"xi-api-key": self.api_key},
+                                    timeout=self.timeout)
+            if response.status_code != 200:
+                raise TTSError(response.status_code, response.text[:200])
+            return response.json()["voices"]
+
+    def synthesize_blocking(self, text: str, voice: str, model: str) -> bytes:
+        """Single TTS request; returns MP3 bytes or raises TTSError."""
+        with metrics.provider_call("elevenlabs", "text_to_speech", characters=len(text)):
+            response = requests.post(
+                f"{self.base_url}/text-to-speech/{voice}",
+                json={"text": text, "model_id": model},
+                headers={"xi-api-key": self.api_key, "accept": "audio/mpeg"},
+                timeout=self.timeout,
+            )
+            if response.status_code != 200:
+                retry_after = response.headers.get("Retry-After")
+                raise TTSError(
+                    response.status_code, response.text[:200],
+                    float(retry_after) if retry_after and retry_after.isdigit() else None,
+                )
+            return response.content
+
+    async def synthesize(self, text: str, voice: str, model: str) -> bytes:
+        """TTS request off the event loop, bounded by the client's semaphore, with retries."""
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore():
+                    return await executors.run_io(self.synthesize_blocking, text, voice, model)
+            except (TTSError, requests.ConnectionError, requests.Timeout) as e:
+                retryable = not isinstance(e, TTSError) or e.status_code in RETRYABLE_STATUS
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                if isinstance(e, TTSError) and e.retry_after:
+                    delay = max(delay, e.retry_after)
+                attempt += 1
+                print(f"[TTSClient] {e}; retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def synthesize_to_file(self, text: str, voice: str, model: str, path: str) -> float:
+        """
+        Write the speech for text to path and return its duration in seconds.
+        A cache hit needs neither a request nor a duration probe.
+        """
+        with metrics.stage_timer("tts"):
+            text = normalise_text(text)
+            key = DiskCache.make_key("tts", text, voice, model)
+            duration = await executors.run_io(self._from_cache, key, path)
+            if duration is not None:
+                return duration
+            audio = await self.synthesize(text, voice, model)
+            return await executors.run_io(self._store, key, audio, path)
+
+    def _from_cache(self, key: str, path: str) -> Optional[float]:
+        meta = self.cache.get(key)
+        if meta is not None and self.cache.fetch(key, "audio.mp3", path):
+            return meta["duration"]
+        return None
+
+    def _store(self, key: str, audio: bytes, path: str) -> float:
+        with open(path, 'wb') as f:
+            f.write(audio)
+        metrics.bytes_written("audio", len(audio))
+        # Get duration from the MP3 frame headers (no decode)
+        duration = mp3_duration(path)
+        self.cache.put(key, {"audio.mp3": path}, {"duration": duration})
+        return duration
@@ -0,0 +1,259 @@
+"""
+Native stroke-reveal renderer.
+
+Draws the same scene as the Manim `DrawSVGWithHand` template (optional heading,
+stroke reveal of the traced paths, crossfade to the original PNG, short hold)
+without Manim's scene graph. Paths are flattened into polylines once, arc
+lengths are kept as prefix sums, and every frame only strokes the ink revealed
+since the previous frame onto an accumulated canvas. Raw RGB frames are piped
+straight into ffmpeg.
+"""
+
+import math
+import os
+import subprocess
+import tempfile
+
+import cv2
+import numpy as np
+
+from services import job_trace
+
+# Bump whenever a change alters the rendered frames, so cached clips are not reused
+RENDERER_VERSION = 1
+# Frame size and rate for each Manim quality preset
+QUALITY_PRESETS = {
+    "low_quality": (854, 480, 15),
+    "medium_quality": (1280, 720, 30),
+    "high_quality": (1920, 1080, 60),
+}
+# Fraction of the frame height covered by the drawing (Manim: height 2 * scale 3 / frame 8)
+DRAWING_HEIGHT = 0.75
+HEADING_RUN_TIME = 2.0
+CROSSFADE_RUN_TIME = 0.5
+HOLD_TIME = 0.5
+# Samples per curved SVG segment when flattening
+CURVE_SAMPLES = 8
+
+
+def _smooth(t: float, inflection: float = 10.0) -> float:
+    """Manim's default `smooth` rate function."""
+    def sigmoid(x):
+        return 1.0 / (1.0 + math.exp(-x))
+    error = sigmoid(-inflection / 2)
+    value = (sigmoid(inflection * (t - 0.5)) - error) / (1 - 2 * error)
+    return min(max(value, 0.0), 1.0)
+
+
+def load_svg_polylines(svg_path: str) -> list:
+    """
+    Flatten every (transformed) path in an SVG into a list of (N, 2) float32 point arrays.
+    """
+    from svgpathtools import Document, Line
+
+    polylines = []
+    for path in Document(svg_path).paths():
+        for subpath in path.continuous_subpaths():
+            points = []
+            for seg in subpath:
+                if isinstance(seg, Line):
+                    pts = [seg.start, seg.end]
+                else:
+                    ts = np.linspace(0.0, 1.0, CURVE_SAMPLES)
+                    try:
+                        pts = list(seg.poly()(ts))
+                    except AttributeError:
+                        pts = [seg.point(t) for t in ts]
+                if points:
+                    pts = pts[1:]
+                points.extend(pts)
+            if len(points) >= 2:
+                arr = np.array([[p.real, p.imag] for p in points], dtype=np.float32)
+                polylines.append(arr)
+    return polylines
+
+
+class StrokeTimeline:
+    """
+    Polylines packed into one point array with arc-length prefix sums, so the
+    ink revealed between two lengths can be found with a binary search.
+    """
+
+    def __init__(self, polylines, width: int, height: int):
+        if hasattr(polylines, 'offsets'):
+            # Already packed (vectorizer.StrokeBundle)
+            points = np.asarray(polylines.points, dtype=np.float64)
+            self.offsets = np.asarray(polylines.offsets, dtype=np.int64)
+        else:
+            polylines = [p for p in polylines if len(p) >= 2]
+            points = np.concatenate(polylines).astype(np.float64) if polylines else np.zeros((0, 2))
+            lengths = np.array([len(p) for p in polylines], dtype=np.int64)
+            self.offsets = np.concatenate([[0], np.cumsum(lengths)])
+        if len(points) < 2:
+            raise ValueError("No drawable paths")
+
+        # Fit the drawing's bounding box to the frame like svg.scale(3.0) does
+        mins = points.min(axis=0)
+        maxs = points.max(axis=0)
+        box_h = max(maxs[1] - mins[1], 1e-6)
+        scale = DRAWING_HEIGHT * height / box_h
+        center = (mins + maxs) / 2
+        self.points = (points - center) * scale + np.array([width / 2, height / 2])
+        self.box = (
+            int(round(width / 2 - (maxs[0] - mins[0]) * scale / 2)),
+            int(round(height / 2 - box_h * scale / 2)),
+            int(round((maxs[0] - mins[0]) * scale)),
+            int(round(box_h * scale)),
+        )
+
+        # Segment lengths, zeroed across pen-up jumps between polylines
+        seg = np.linalg.norm(np.diff(self.points, axis=0), axis=1)
+        path_ends = self.offsets[1:-1] - 1
+        seg[path_ends] = 0.0
+        self.cumulative = np.concatenate([[0.0], np.cumsum(seg)])
+        self.total_length = float(self.cumulative[-1])
+
+    def point_at(self, length: float):
+        """Index of the last fully revealed point and the interpolated pen position."""
+        j = int(np.searchsorted(self.cumulative, length, side='right')) - 1
+        j = min(max(j, 0), len(self.points) - 1)
+        if j + 1 < len(self.points) and self.cumulative[j + 1] > self.cumulative[j]:
+            t = (length - self.cumulative[j]) / (self.cumulative[j + 1] - self.cumulative[j])
+            pen = self.points[j] + (self.points[j + 1] - self.points[j]) * min(max(t, 0.0), 1.0)
+        else:
+            pen = self.points[j]
+        return j, pen
+
+    def draw_range(self, canvas, start: float, end: float, thickness: int):
+        """Stroke the ink between two arc lengths onto the canvas."""
+        i, _ = self.point_at(start)
+        j, pen = self.point_at(end)
+        path = int(np.searchsorted(self.offsets, i, side='right')) - 1
+        while path < len(self.offsets) - 1 and self.offsets[path] <= j:
+            lo = max(i, self.offsets[path])
+            hi = min(j, self.offsets[path + 1] - 1)
+            pts = self.points[lo:hi + 1]
+            if hi == j and j + 1 < self.offsets[path + 1]:
+                pts = np.vstack([pts, pen])
+            if len(pts) >= 2:
+                cv2.polylines(canvas, [np.round(pts).astype(np.int32)], False,
+                              (0, 0, 0), thickness, cv2.LINE_AA)
+            path += 1
+
+
+def _heading_layer(heading: str, width: int, height: int):
+    """Render the heading text on a white layer, returning it with its x extent."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    size = max(12, int(height * 0.07))
+    font = None
+    for name in ("Arial.ttf", "arial.ttf", "DejaVuSans.ttf"):
+        try:
+            font = ImageFont.truetype(name, size)
+            break
+        except OSError:
+            continue
+    if font is None:
+        font = ImageFont.load_default()
+    layer = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(layer)
+    left, top, right, bottom = draw.textbbox((0, 0), heading, font=font)
+    x = (width - (right - left)) // 2
+    draw.text((x, int(height * 0.05)), heading, fill="black", font=font)
+    return np.asarray(layer), x, x + (right - left)
+
+
+def _open_encoder(output_path: str, width: int, height: int, fps: int, log):
+    # ffmpeg's errors go to log (a file, so nothing has to drain it while frames are piped in)
+    return job_trace.Popen([
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps),
+        '-i', '-',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+        '-movflags', '+faststart', output_path,
+    ], stdin=subprocess.PIPE, stderr=log)
+
+
+def render_stroke_reveal(polylines, png_path, duration, output_path,
+                         heading=None, quality="low_quality", on_frame=None):
+    """
+    Render the stroke-reveal scene and write it to output_path.
+    polylines: a list of (N, 2) point arrays or a packed vectorizer.StrokeBundle.
+    on_frame: optional callback(frames_written, frames_expected) for progress reporting.
+    """
+    width, height, fps = QUALITY_PRESETS[quality]
+    timeline = StrokeTimeline(polylines, width, height)
+    thickness = max(1, int(round(height / 240)))
+
+    heading_frames = max(1, int(round(HEADING_RUN_TIME * fps))) if heading else 0
+    draw_frames = max(1, int(round(duration * fps)))
+    fade_frames = max(1, int(round(CROSSFADE_RUN_TIME * fps)))
+    hold_frames = int(round(HOLD_TIME * fps))
+    expected = heading_frames + draw_frames + fade_frames + hold_frames
+
+    canvas = np.full((height, width, 3), 255, dtype=np.uint8)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    log = tempfile.TemporaryFile()
+    encoder = _open_encoder(output_path, width, height, fps, log)
+    written = 0
+
+    def write(frame_bytes):
+        nonlocal written
+        encoder.stdin.write(frame_bytes)
+        written += 1
+        if on_frame is not None:
+            on_frame(written, expected)
+
+    try:
+        if heading:
+            layer, x0, x1 = _heading_layer(heading, width, height)
+            frames = heading_frames
+            for f in range(1, frames + 1):
+                # Reveal the heading left to right, then keep it on the canvas
+                x = int(x0 + (x1 - x0) * _smooth(f / frames))
+                canvas[:, x0:x] = np.minimum(canvas[:, x0:x], layer[:, x0:x])
+                write(canvas.tobytes())
+
+        frames = draw_frames
+        drawn = 0.0
+        for f in range(1, frames + 1):
+            target = timeline.total_length * _smooth(f / frames)
+            timeline.draw_range(canvas, drawn, target, thickness)
+            drawn = target
+            write(canvas.tobytes())
+
+        # Crossfade from the strokes to the original image stretched over the drawing
+        final = canvas.copy()
+        bx, by, bw, bh = timeline.box
+        image = cv2.imread(png_path)
+        if image is not None and bw > 0 and bh > 0:
+            image = cv2.cvtColor(cv2.resize(image, (bw, bh), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+            y0, x0 = max(by, 0), max(bx, 0)
+            y1, x1 = min(by + bh, height), min(bx + bw, width)
+            final[y0:y1, x0:x1] = image[y0 - by:y1 - by, x0 - bx:x1 - bx]
+        strokes = canvas.astype(np.float32)
+        target_frame = final.astype(np.float32)
+        frames = fade_frames
+        for f in range(1, frames + 1):
+            a = _smooth(f / frames)
+            frame = strokes + (target_frame - strokes) * a
+            write(frame.astype(np.uint8).tobytes())
+
+        hold = final.tobytes()
+        for _ in range(hold_frames):
+            write(hold)
+    except BrokenPipeError:
+        # ffmpeg died mid-stream; its exit status and stderr say why
+        pass
+    finally:
+        try:
+            encoder.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = encoder.wait()
+        log.seek(0)
+        error = log.read().decode(errors="replace").strip()
+        log.close()
+    if returncode != 0:
+        raise Exception(f"ffmpeg exited with status {returncode} while encoding {output_path}: {error}")
+    return output_path
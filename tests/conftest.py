@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Keep the services' caches, job database and metrics out of the working tree
+_scratch = tempfile.mkdtemp(prefix="doodly_tests_")
+os.environ.setdefault("TTS_CACHE_DIR", os.path.join(_scratch, "tts"))
+os.environ.setdefault("DOODLY_JOB_DB", os.path.join(_scratch, "jobs.sqlite3"))
+os.environ.setdefault("DOODLY_METRICS_DIR", os.path.join(_scratch, "metrics"))
+os.environ.setdefault("IMAGE_CACHE_DIR", os.path.join(_scratch, "images"))
+os.environ.setdefault("DOODLY_RENDER_CACHE_DIR", os.path.join(_scratch, "renders"))
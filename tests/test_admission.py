@@ -0,0 +1,170 @@
+"""AdmissionController: FIFO handover of slots, rejection, and the 429 it turns into."""
+
+import asyncio
+import threading
+
+import pytest
+
+import admission
+from admission import AdmissionController, Overloaded
+
+
+def test_admits_up_to_max_active_without_waiting():
+    controller = AdmissionController(max_active=2, max_waiting=0, max_wait=1)
+
+    async def scenario():
+        assert await controller.acquire() == 0.0
+        assert await controller.acquire() == 0.0
+        with pytest.raises(Overloaded):
+            await controller.acquire()
+
+    asyncio.run(scenario())
+    assert (controller.active, controller.admitted, controller.rejected) == (2, 2, 1)
+
+
+def test_slots_are_handed_to_waiters_in_arrival_order():
+    controller = AdmissionController(max_active=1, max_waiting=5, max_wait=5)
+    admitted = []
+
+    async def request(name):
+        await controller.acquire()
+        admitted.append(name)
+
+    async def scenario():
+        await controller.acquire()
+        waiters = []
+        for name in "abcd":
+            waiters.append(asyncio.ensure_future(request(name)))
+            await asyncio.sleep(0)  # let it join the queue before the next one arrives
+        assert controller.stats()["waiting"] == 4
+        for expected in range(1, 5):
+            controller.release(hold=0.01)
+            await asyncio.sleep(0.01)
+            assert len(admitted) == expected
+            # The slot went straight to the next waiter; nothing else could take it
+            assert controller.active == 1
+        controller.release()
+        await asyncio.gather(*waiters)
+
+    asyncio.run(scenario())
+    assert admitted == list("abcd")
+    assert controller.active == 0
+
+
+def test_a_newcomer_cannot_jump_the_queue():
+    controller = AdmissionController(max_active=1, max_waiting=5, max_wait=5)
+    order = []
+
+    async def request(name):
+        await controller.acquire()
+        order.append(name)
+        controller.release()
+
+    async def scenario():
+        await controller.acquire()
+        queued = asyncio.ensure_future(request("queued"))
+        await asyncio.sleep(0)
+        controller.release()
+        # Arrives after the release but before the queued request has resumed
+        await request("newcomer")
+        await queued
+
+    asyncio.run(scenario())
+    assert order == ["queued", "newcomer"]
+
+
+def test_full_queue_is_rejected_with_a_retry_hint():
+    controller = AdmissionController(max_active=1, max_waiting=1, max_wait=5)
+    controller._holds.extend([4.0, 6.0])
+
+    async def scenario():
+        await controller.acquire()
+        waiter = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as overloaded:
+            await controller.acquire()
+        controller.release()
+        await waiter
+        return overloaded.value
+
+    error = asyncio.run(scenario())
+    # Average hold of 5s, with one request already waiting for the single slot
+    assert error.retry_after == 10
+    assert controller.rejected == 1
+
+
+def test_waiting_too_long_is_rejected_and_leaves_the_queue():
+    controller = AdmissionController(max_active=1, max_waiting=5, max_wait=0.05)
+
+    async def scenario():
+        await controller.acquire()
+        with pytest.raises(Overloaded):
+            await controller.acquire()
+
+    asyncio.run(scenario())
+    assert controller.stats()["waiting"] == 0
+    assert controller.active == 1
+
+
+def test_a_cancelled_waiter_passes_on_a_slot_it_was_just_given():
+    controller = AdmissionController(max_active=1, max_waiting=5, max_wait=5)
+
+    async def scenario():
+        await controller.acquire()
+        first = asyncio.ensure_future(controller.acquire())
+        second = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        controller.release()  # hands the slot to first...
+        first.cancel()  # ...which is cancelled before it resumes
+        await asyncio.gather(first, return_exceptions=True)
+        await asyncio.wait_for(second, 1)
+
+    asyncio.run(scenario())
+    assert controller.active == 1 and controller.stats()["waiting"] == 0
+
+
+def test_waiters_on_other_event_loops_are_woken():
+    controller = AdmissionController(max_active=1, max_waiting=5, max_wait=5)
+    asyncio.run(controller.acquire())
+    admitted = threading.Event()
+
+    def other_loop():
+        asyncio.run(controller.acquire())
+        admitted.set()
+
+    thread = threading.Thread(target=other_loop)
+    thread.start()
+    while controller.stats()["waiting"] == 0:
+        threading.Event().wait(0.01)
+    controller.release()
+    thread.join(5)
+    assert admitted.is_set()
+
+
+def test_overloaded_becomes_429_with_retry_after():
+    pytest.importorskip("fastapi")
+    httpx = pytest.importorskip("httpx")
+    from fastapi import Depends, FastAPI
+
+    controller = AdmissionController(max_active=1, max_waiting=0, max_wait=1)
+    app = FastAPI()
+    admission.install(app)
+
+    @app.post("/render", dependencies=[Depends(controller.slot)])
+    async def render():
+        return {"ok": True}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            assert (await client.post("/render")).status_code == 200
+            # The request released its slot; hold it now so the next one is turned away
+            await controller.acquire()
+            controller._holds.clear()
+            controller._holds.append(2.5)
+            return await client.post("/render")
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3"
+    assert response.json()["retry_after"] == 3
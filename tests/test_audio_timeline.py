@@ -0,0 +1,95 @@
+"""mp3_duration against decoded lengths, and AudioTimeline's single ffmpeg decode."""
+
+import os
+import shutil
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from services import audio_timeline
+from services.audio_timeline import AudioTimeline, mp3_duration
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+# cbr: 32 kbps CBR without a Xing frame; vbr_xing: VBR with a Xing + LAME header;
+# id3_tagged: CBR with an Info + LAME header behind a 3 KB ID3v2.4 tag
+MP3S = ["cbr.mp3", "vbr_xing.mp3", "id3_tagged.mp3"]
+
+
+def _fixture(name):
+    return os.path.join(FIXTURES, name)
+
+
+@pytest.mark.parametrize("name", MP3S)
+def test_duration_matches_the_decoded_length(name):
+    miniaudio = pytest.importorskip("miniaudio")
+    info = miniaudio.mp3_get_file_info(_fixture(name))
+    decoded = miniaudio.decode_file(_fixture(name), output_format=miniaudio.SampleFormat.SIGNED16,
+                                    nchannels=info.nchannels, sample_rate=info.sample_rate)
+    # Exact to the sample: the LAME encoder delay and padding are trimmed like the decoder does
+    assert mp3_duration(_fixture(name)) * info.sample_rate == pytest.approx(decoded.num_frames, abs=0.5)
+
+
+def test_lame_delay_and_padding_are_trimmed():
+    # 26 frames of 1152 samples at 22050 Hz, less 1287 samples of delay and padding
+    assert mp3_duration(_fixture("vbr_xing.mp3")) == pytest.approx(1.3, abs=1 / 22050)
+
+
+def _with_id3v2_footer(tmp_path, data):
+    size = 3000
+    body = b"\0" * size
+    syncsafe = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    header = b"ID3" + bytes([4, 0, 0x10]) + syncsafe
+    footer = b"3DI" + bytes([4, 0, 0x10]) + syncsafe
+    path = str(tmp_path / "footer.mp3")
+    with open(path, "wb") as f:
+        f.write(header + body + footer + data)
+    return path
+
+
+def test_id3v2_footer_is_skipped(tmp_path):
+    with open(_fixture("cbr.mp3"), "rb") as f:
+        data = f.read()
+    # A footer whose bytes aren't skipped would be mistaken for junk or, worse, a frame
+    assert mp3_duration(_with_id3v2_footer(tmp_path, data)) == pytest.approx(mp3_duration(_fixture("cbr.mp3")))
+
+
+def test_trailing_id3v1_tag_is_ignored(tmp_path):
+    with open(_fixture("cbr.mp3"), "rb") as f:
+        data = f.read()
+    # Tag fields that happen to look like a frame sync must not count as audio
+    tag = b"TAG" + b"\xff\xfb\x90\x64" * 31 + b"\0"
+    path = tmp_path / "v1.mp3"
+    path.write_bytes(data + tag)
+    assert mp3_duration(str(path)) == pytest.approx(mp3_duration(_fixture("cbr.mp3")))
+
+
+def test_no_frames_raises(tmp_path):
+    path = tmp_path / "empty.mp3"
+    path.write_bytes(b"not audio at all" * 8)
+    with pytest.raises(ValueError):
+        mp3_duration(str(path))
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+def test_without_miniaudio_one_ffmpeg_run_decodes_every_segment(monkeypatch):
+    runs = []
+    run = audio_timeline.job_trace.run
+
+    def counting_run(args, **kwargs):
+        runs.append(args)
+        return run(args, **kwargs)
+
+    monkeypatch.setattr(audio_timeline, "miniaudio", None)
+    monkeypatch.setattr(audio_timeline.job_trace, "run", counting_run)
+    paths = [_fixture(name) for name in MP3S]
+    timeline = AudioTimeline.from_segments(paths, sample_rate=22050, channels=1)
+
+    assert len(runs) == 1
+    assert timeline.offsets[0] == 0
+    lengths = np.diff(timeline.offsets)
+    for length, path in zip(lengths, paths):
+        assert length == round(mp3_duration(path) * 22050)
+    # Every segment was written, not just the first
+    for start, end in zip(timeline.offsets[:-1], timeline.offsets[1:]):
+        assert np.any(timeline.buffer[start:end])
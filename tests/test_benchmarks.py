@@ -0,0 +1,94 @@
+"""Smoke run of every benchmark in benchmarks.run: one iteration at the smallest size, stubbed providers."""
+
+import json
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+pytest.importorskip("PIL")
+
+import doodly_pipeline
+from services import image_cache
+
+# External tools each stage shells out to
+TOOLS = {
+    "trace": ("potrace",),
+    "strokes": (),
+    "render": ("ffmpeg", "ffprobe"),
+    "concat": ("ffmpeg", "ffprobe"),
+    "audio": ("ffmpeg",),
+    "assemble": ("ffmpeg", "ffprobe"),
+    "e2e": ("ffmpeg", "ffprobe"),
+}
+
+
+@pytest.fixture
+def bench(monkeypatch):
+    # benchmarks.run switches the caches off through the environment; keep that to this test
+    for name in ("TTS_CACHE_MAX_MB", "IMAGE_CACHE_MAX_MB", "DOODLY_RENDER_CACHE_MAX_MB"):
+        monkeypatch.setenv(name, "0")
+    from benchmarks import run
+    monkeypatch.setattr(doodly_pipeline, "RENDER_CACHE_MAX_MB", 0)
+    monkeypatch.setattr(image_cache, "IMAGE_CACHE_MAX_MB", 0)
+    return run
+
+
+def _suite(run, tmp_path):
+    suite = run.Suite(str(tmp_path), quick=True, repeat=1)
+    suite.complexities = ("simple",)
+    suite.script_lengths = (3,)
+    return suite
+
+
+def test_every_stage_is_covered(bench):
+    assert set(TOOLS) == set(bench.STAGES)
+
+
+@pytest.mark.parametrize("stage", list(TOOLS))
+def test_stage_runs_once(bench, stage, tmp_path):
+    missing = [tool for tool in TOOLS[stage] if shutil.which(tool) is None]
+    if missing:
+        pytest.skip(f"needs {', '.join(missing)}")
+    results = _suite(bench, tmp_path).run([stage])
+    assert results
+    assert all(name.startswith(f"{stage}.") for name in results)
+    for name, metric in results.items():
+        assert metric["value"] > 0 or not metric["higher_is_better"], name
+        assert set(metric) == {"value", "unit", "higher_is_better", "params"}
+
+
+def test_cli_writes_results_and_flags_regressions(bench, tmp_path):
+    output = str(tmp_path / "latest.json")
+    assert bench.main(["--quick", "--only", "strokes", "--output", output]) == 0
+    with open(output) as f:
+        report = json.load(f)
+    assert report["meta"]["stages"] == ["strokes"]
+    assert report["results"]
+
+    # A baseline twice as fast makes every timing a regression
+    baseline = {"results": {name: dict(metric, value=metric["value"] / 2 if not metric["higher_is_better"]
+                                       else metric["value"] * 2)
+                            for name, metric in report["results"].items()}}
+    baseline_path = str(tmp_path / "baseline.json")
+    with open(baseline_path, "w") as f:
+        json.dump(baseline, f)
+    assert bench.main(["--quick", "--only", "strokes", "--output", output, "--baseline", baseline_path]) == 1
+
+
+def test_compare_respects_direction_and_tolerance(bench):
+    baseline = {"t": {"value": 1.0}, "rate": {"value": 100.0}, "new_in_baseline": {"value": 0}}
+    results = {
+        "t": {"value": 1.05, "unit": "s", "higher_is_better": False},
+        "rate": {"value": 80.0, "unit": "x", "higher_is_better": True},
+        "extra": {"value": 3.0, "unit": "s", "higher_is_better": False},
+    }
+    assert bench.compare(results, baseline, tolerance=0.10) == ["rate"]
+    assert bench.compare(results, baseline, tolerance=0.25) == []
+
+
+def test_unknown_stage_is_rejected(bench):
+    with pytest.raises(SystemExit):
+        bench.main(["--only", "nope"])
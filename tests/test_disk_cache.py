@@ -0,0 +1,129 @@
+"""DiskCache: LRU eviction, hard-linked fetches, key normalisation and hit/miss counting."""
+
+import errno
+import os
+import time
+
+import pytest
+
+from services import disk_cache, metrics
+from services.disk_cache import DiskCache
+
+
+def _file(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DiskCache(str(tmp_path / "tts"), max_bytes=2500)
+
+
+def _age(cache, key, seconds_ago):
+    stamp = time.time() - seconds_ago
+    os.utime(cache._entry(key), (stamp, stamp))
+
+
+def test_put_then_fetch_hard_links_the_cached_file(cache, tmp_path):
+    cache.put("k", {"audio.mp3": _file(tmp_path, "a.mp3", 100)}, {"duration": 1.5})
+    assert cache.get("k") == {"duration": 1.5}
+    dest = str(tmp_path / "out.mp3")
+    assert cache.fetch("k", "audio.mp3", dest)
+    cached = os.path.join(cache._entry("k"), "audio.mp3")
+    assert os.path.samefile(dest, cached)
+    assert os.stat(cached).st_nlink == 2
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_fetch_copies_across_filesystems(cache, tmp_path, monkeypatch):
+    cache.put("k", {"audio.mp3": _file(tmp_path, "a.mp3", 100)})
+
+    def cross_device(src, dst):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(disk_cache.os, "link", cross_device)
+    dest = str(tmp_path / "out.mp3")
+    assert cache.fetch("k", "audio.mp3", dest)
+    assert not os.path.samefile(dest, os.path.join(cache._entry("k"), "audio.mp3"))
+    assert open(dest, "rb").read() == b"x" * 100
+    assert cache.hits == 1
+
+
+def test_fetch_replaces_an_existing_destination(cache, tmp_path):
+    cache.put("k", {"audio.mp3": _file(tmp_path, "a.mp3", 10)})
+    dest = _file(tmp_path, "out.mp3", 3)
+    assert cache.fetch("k", "audio.mp3", dest)
+    assert os.path.getsize(dest) == 10
+
+
+def test_misses_are_counted_once_per_lookup(cache, tmp_path):
+    assert cache.get("absent") is None
+    cache.put("k", {"audio.mp3": _file(tmp_path, "a.mp3", 10)})
+    assert cache.get("k") is not None
+    # Evicted (or otherwise gone) between get and fetch
+    os.remove(os.path.join(cache._entry("k"), "audio.mp3"))
+    assert not cache.fetch("k", "audio.mp3", str(tmp_path / "out.mp3"))
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_evicts_least_recently_used_entries_past_the_budget(cache, tmp_path):
+    cache.put("oldest", {"f": _file(tmp_path, "1", 1000)})
+    cache.put("older", {"f": _file(tmp_path, "2", 1000)})
+    _age(cache, "oldest", 300)
+    _age(cache, "older", 200)
+    # A hit refreshes recency, so "older" is now the least recently used
+    assert cache.get("oldest") is not None
+    cache.put("new", {"f": _file(tmp_path, "3", 1000)})
+    remaining = {os.path.basename(path) for _, _, path in cache._entries()}
+    assert remaining == {"oldest", "new"}
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def test_put_keeps_the_first_writer_entry(cache, tmp_path):
+    cache.put("k", {"f": _file(tmp_path, "1", 10)}, {"v": 1})
+    cache.put("k", {"f": _file(tmp_path, "2", 20)}, {"v": 2})
+    assert cache.get("k") == {"v": 1}
+    assert not [name for name in os.listdir(cache.root) if name.startswith(".tmp_")]
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = DiskCache(str(tmp_path / "off"), max_bytes=0)
+    cache.put("k", {"f": _file(tmp_path, "1", 10)})
+    assert cache.get("k") is None
+    assert not os.path.exists(cache.root)
+
+
+def test_keys_depend_on_every_part_but_not_dict_order():
+    key = DiskCache.make_key("tts", "Hello world.", "voice", "model")
+    assert key == DiskCache.make_key("tts", "Hello world.", "voice", "model")
+    assert key != DiskCache.make_key("tts", "Hello world.", "other-voice", "model")
+    assert key != DiskCache.make_key("tts", "model", "voice", "Hello world.")
+    assert DiskCache.make_key({"a": 1, "b": 2}) == DiskCache.make_key({"b": 2, "a": 1})
+
+
+def test_tts_keys_ignore_whitespace_differences():
+    pytest.importorskip("requests")
+    from services.tts_client import normalise_text
+    assert normalise_text("  Hello\n\tworld.  ") == "Hello world."
+    assert (DiskCache.make_key("tts", normalise_text("Hello   world."), "v", "m")
+            == DiskCache.make_key("tts", normalise_text("Hello world.\n"), "v", "m"))
+
+
+def test_hits_and_misses_are_exported_as_metrics(cache, tmp_path):
+    if not metrics.ENABLED:
+        pytest.skip("metrics disabled")
+    cache.put("k", {"audio.mp3": _file(tmp_path, "a.mp3", 10)})
+    before = metrics.render()
+    cache.get("absent")
+    cache.get("k")
+    cache.fetch("k", "audio.mp3", str(tmp_path / "out.mp3"))
+    after = metrics.render()
+
+    def sample(text, result):
+        prefix = f'doodly_cache_requests_total{{cache="tts",result="{result}"}} '
+        return sum(float(line[len(prefix):]) for line in text.splitlines() if line.startswith(prefix))
+
+    assert sample(after, "hit") - sample(before, "hit") == 1
+    assert sample(after, "miss") - sample(before, "miss") == 1
@@ -0,0 +1,186 @@
+"""doodly_pipeline: stroke optimisation after tracing, and the render cache."""
+
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("svgpathtools")
+
+import doodly_pipeline
+from doodly_pipeline import adaptive_turdsize, optimize_strokes
+from services.disk_cache import DiskCache
+from services.image_cache import trace_key
+from vectorizer import StrokeBundle, trace_bitmap
+
+
+def _bundle(mask):
+    height, width = mask.shape
+    return StrokeBundle.from_polylines(trace_bitmap(mask), width, height)
+
+
+def _disc_mask(size=400, radius=120):
+    mask = np.zeros((size, size), dtype=np.uint8)
+    cv2.circle(mask, (size // 2, size // 2), radius, 1, -1)
+    return mask.astype(bool)
+
+
+def _distance_to_polyline(point, line):
+    a, b = line[:-1], line[1:]
+    ab = b - a
+    t = np.clip(((point - a) * ab).sum(axis=1) / np.maximum((ab * ab).sum(axis=1), 1e-9), 0, 1)
+    return float(np.min(np.linalg.norm(a + ab * t[:, None] - point, axis=1)))
+
+
+def test_speckles_shorter_than_min_length_are_dropped():
+    mask = _disc_mask()
+    for x, y in [(20, 20), (370, 30), (30, 360)]:
+        mask[y:y + 3, x:x + 3] = True
+    bundle = _bundle(mask)
+    assert len(bundle) == 4
+
+    optimised, report = optimize_strokes(bundle, max_segments=0, min_length=20)
+    assert (report["paths_before"], report["paths_after"]) == (4, 1)
+    xs = optimised.polylines()[0][:, 0]
+    assert xs.min() == pytest.approx(80, abs=2) and xs.max() == pytest.approx(320, abs=2)
+
+
+def test_default_min_length_scales_with_the_image():
+    # 0.4% of a 400x400 diagonal is about 2.3px: a 1px dash goes, the disc stays
+    bundle = StrokeBundle.from_polylines(
+        [[(10, 10), (11, 10)], *[line.tolist() for line in _bundle(_disc_mask()).polylines()]], 400, 400)
+    _, report = optimize_strokes(bundle, max_segments=0)
+    assert (report["paths_before"], report["paths_after"]) == (2, 1)
+
+
+@pytest.mark.parametrize("epsilon", [0.75, 2.0, 4.0])
+def test_douglas_peucker_drops_points_within_epsilon(epsilon):
+    bundle = _bundle(_disc_mask())
+    original = bundle.polylines()[0]
+    optimised, report = optimize_strokes(bundle, max_segments=0, epsilon=epsilon)
+    simplified = optimised.polylines()[0]
+
+    assert report["segments_after"] < report["segments_before"]
+    assert len(simplified) < len(original)
+    # Every traced point stays within the tolerance of the simplified outline
+    assert max(_distance_to_polyline(p, simplified) for p in original) <= epsilon + 1e-3
+
+
+def test_coarser_epsilon_gives_fewer_segments():
+    bundle = _bundle(_disc_mask())
+    counts = [optimize_strokes(bundle, max_segments=0, epsilon=e)[1]["segments_after"] for e in (0.75, 2.0, 4.0)]
+    assert counts == sorted(counts, reverse=True) and counts[0] > counts[-1]
+
+
+def _blobs_mask():
+    mask = np.zeros((400, 400), dtype=np.uint8)
+    for i in range(8):
+        for j in range(8):
+            cv2.circle(mask, (25 + 50 * i, 25 + 50 * j), 5 + 2 * ((i + j) % 4), 1, -1)
+    return mask.astype(bool)
+
+
+def test_segment_cap_coarsens_before_dropping_strokes():
+    bundle = _bundle(_blobs_mask())
+    optimised, report = optimize_strokes(bundle, max_segments=300)
+    assert report["segments_before"] > 300
+    assert report["segments_after"] <= 300
+    assert report["epsilon"] > doodly_pipeline.SIMPLIFY_EPSILON
+    # Coarsening alone was enough: every blob is still drawn
+    assert report["paths_after"] == report["paths_before"] == 64
+
+
+def test_segment_cap_keeps_the_longest_strokes_in_drawing_order():
+    # Straight strokes can't be simplified any further, so the cap has to drop some
+    lengths = [30, 90, 10, 70, 50, 100, 20, 80, 40, 60]
+    bundle = StrokeBundle.from_polylines([[(10, 10 + 20 * i), (10 + n, 10 + 20 * i)] for i, n in enumerate(lengths)],
+                                         400, 400)
+    optimised, report = optimize_strokes(bundle, max_segments=4)
+    assert report["segments_after"] == 4
+    kept = [int(line[1][0] - line[0][0]) for line in optimised.polylines()]
+    assert kept == [90, 70, 100, 80]
+
+
+def test_simplified_outlines_stay_closed():
+    for epsilon in (0.75, 4.0, 24.0):
+        optimised, _ = optimize_strokes(_bundle(_blobs_mask()), max_segments=0, epsilon=epsilon)
+        assert all(np.array_equal(line[0], line[-1]) for line in optimised.polylines())
+
+
+def test_zero_cap_disables_the_budget():
+    bundle = _bundle(_blobs_mask())
+    _, report = optimize_strokes(bundle, max_segments=0)
+    assert report["epsilon"] == doodly_pipeline.SIMPLIFY_EPSILON
+    assert report["paths_after"] == 64
+
+
+def test_adaptive_turdsize_grows_with_edge_density():
+    assert adaptive_turdsize(np.zeros((100, 100), dtype=bool)) == doodly_pipeline.TURDSIZE_BASE
+    stripes = np.zeros((100, 100), dtype=bool)
+    stripes[:, ::2] = True
+    assert adaptive_turdsize(stripes) == doodly_pipeline.TURDSIZE_MAX
+    assert adaptive_turdsize(_disc_mask()) < adaptive_turdsize(_blobs_mask())
+
+
+@pytest.fixture
+def sketch(tmp_path):
+    from PIL import Image
+    image = Image.new("RGB", (200, 150), "white")
+    image.paste((0, 0, 0), (50, 40, 150, 110))
+    path = str(tmp_path / "sketch.png")
+    image.save(path)
+    return path
+
+
+@pytest.fixture
+def encoder(monkeypatch):
+    """Stands in for the stroke renderer's ffmpeg encode and counts the clips it writes."""
+    calls = []
+
+    def render(strokes, png_path, duration, output_path, **kwargs):
+        calls.append(output_path)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, "wb") as f:
+            f.write(b"clip")
+
+    monkeypatch.setattr(doodly_pipeline, "render_stroke_reveal", render)
+    return calls
+
+
+def test_second_render_is_a_cache_hit_and_skips_the_encoder(tmp_path, sketch, encoder):
+    cache = doodly_pipeline.get_cache(doodly_pipeline.RENDER_CACHE_DIR, doodly_pipeline.RENDER_CACHE_MAX_MB)
+    hits = cache.hits
+    clips = []
+    for attempt in range(2):
+        work = str(tmp_path / f"job{attempt}")
+        os.makedirs(work)
+        bundle = doodly_pipeline.png_to_strokes(sketch, output_dir=work)
+        clips.append(doodly_pipeline.animate_svg(bundle, 1.5, "clip.mp4", output_dir=work, engine="stroke",
+                                                 media_dir=os.path.join(work, "media"), png_path=sketch))
+    assert len(encoder) == 1
+    assert cache.hits == hits + 1
+    assert all(open(clip, "rb").read() == b"clip" for clip in clips)
+
+    # A different duration is a different clip
+    doodly_pipeline.animate_svg(bundle, 2.0, "other.mp4", output_dir=work, engine="stroke",
+                                media_dir=os.path.join(work, "media"), png_path=sketch)
+    assert len(encoder) == 2
+
+
+def test_render_key_of_a_traced_drawing_reuses_the_trace_key(tmp_path, sketch, monkeypatch):
+    bundle = doodly_pipeline.png_to_strokes(sketch, output_dir=str(tmp_path))
+    traced = trace_key(sketch, "strokes.npz", *doodly_pipeline._trace_settings(doodly_pipeline.MAX_SEGMENTS_PER_FRAME))
+    # The bundle isn't loaded and hashed again
+    monkeypatch.setattr(doodly_pipeline.StrokeBundle, "load", lambda *a: pytest.fail("bundle re-read"))
+    key = doodly_pipeline._render_cache_key(bundle, sketch, 1.5, None, "stroke")
+    assert key == DiskCache.make_key("render", traced, 1.5, doodly_pipeline.render_pool.RENDER_QUALITY, None,
+                                     "stroke", doodly_pipeline.stroke_renderer.RENDERER_VERSION)
+    assert doodly_pipeline._render_cache_key(bundle, sketch, 1.5, "Heading", "stroke") != key
+
+
+def test_render_key_falls_back_to_hashing_a_changed_drawing(tmp_path, sketch):
+    bundle_path = doodly_pipeline.png_to_strokes(sketch, output_dir=str(tmp_path))
+    key = doodly_pipeline._render_cache_key(bundle_path, sketch, 1.5, None, "stroke")
+    StrokeBundle.from_polylines([[(0, 0), (5, 5)]], 200, 150).save(bundle_path)
+    assert doodly_pipeline._render_cache_key(bundle_path, sketch, 1.5, None, "stroke") != key
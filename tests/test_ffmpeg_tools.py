@@ -0,0 +1,51 @@
+"""ffmpeg_tools: the single-run slideshow encode."""
+
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+import ffmpeg_tools
+from services.audio_timeline import mp3_duration
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None,
+                                reason="needs ffmpeg and ffprobe")
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def _streams(path):
+    result = subprocess.run(['ffprobe', '-v', 'error', '-show_entries',
+                             'stream=codec_type,width,height,duration:format=duration',
+                             '-of', 'json', path], check=True, capture_output=True, text=True)
+    return json.loads(result.stdout)
+
+
+def test_images_to_video_holds_each_image_for_its_audio(tmp_path, monkeypatch):
+    images = []
+    for i, (size, colour) in enumerate([((300, 200), "red"), ((200, 300), "blue")]):
+        path = str(tmp_path / f"image_{i}.png")
+        Image.new("RGB", size, colour).save(path)
+        images.append(path)
+    audio = [os.path.join(FIXTURES, "cbr.mp3"), os.path.join(FIXTURES, "vbr_xing.mp3")]
+    durations = [mp3_duration(path) for path in audio]
+    output = str(tmp_path / "slideshow.mp4")
+
+    runs = []
+    run = ffmpeg_tools.job_trace.run
+    monkeypatch.setattr(ffmpeg_tools.job_trace, "run", lambda args, **kwargs: runs.append(args) or run(args, **kwargs))
+    ffmpeg_tools.images_to_video(images, durations, audio, output, 160, 120)
+
+    assert len(runs) == 1
+    info = _streams(output)
+    video = next(s for s in info["streams"] if s["codec_type"] == "video")
+    assert (video["width"], video["height"]) == (160, 120)
+    assert any(s["codec_type"] == "audio" for s in info["streams"])
+    assert float(info["format"]["duration"]) == pytest.approx(sum(durations), abs=0.1)
+    # The concat list is removed
+    assert sorted(os.listdir(tmp_path)) == ["image_0.png", "image_1.png", "slideshow.mp4"]
@@ -0,0 +1,76 @@
+"""The API keeps answering while a render occupies the CPU pool."""
+
+import asyncio
+import gc
+import os
+import time
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+# How long the stubbed renderer keeps a worker busy, and the slowest /health answer allowed meanwhile
+RENDER_SECONDS = 2.0
+HEALTH_LATENCY_BOUND = 0.05
+
+
+def _busy(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+# Stand-ins for the tracer and renderer; module-level so the CPU pool can unpickle them
+def slow_trace(png_path, output_dir=None, write_svg=False):
+    base = os.path.splitext(png_path)[0]
+    for ext in (".npz", ".svg"):
+        open(base + ext, "wb").close()
+    return base + ".npz"
+
+
+def slow_render(bundle_path, duration, out_name, **kwargs):
+    _busy(RENDER_SECONDS)
+    video_path = os.path.join(os.path.dirname(bundle_path), out_name)
+    open(video_path, "wb").close()
+    return video_path
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    # main creates its output directories under the working directory
+    monkeypatch.chdir(tmp_path)
+    main = pytest.importorskip("main")  # needs the app's full dependencies
+    from services import executors
+    monkeypatch.setattr(main, "API_OUTPUTS_DIR", str(tmp_path / "apiOutputs"))
+    os.makedirs(main.API_OUTPUTS_DIR, exist_ok=True)
+    monkeypatch.setattr(main, "png_to_strokes", slow_trace)
+    monkeypatch.setattr(main, "animate_svg", slow_render)
+    # The test session's heap dwarfs the app's; a full collection of it isn't the stall under test
+    gc.collect()
+    gc.freeze()
+    yield main
+    gc.unfreeze()
+    executors.shutdown(wait=False)
+
+
+def test_health_answers_within_milliseconds_during_a_render(app_module):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+            render = asyncio.ensure_future(client.post(
+                "/animate-svg", json={"image_url": "/apiOutputs/sketch.png", "duration": 1.0}))
+            latencies = []
+            while not render.done():
+                start = time.perf_counter()
+                response = await client.get("/health")
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200
+                await asyncio.sleep(0.05)
+            return await render, latencies
+
+    response, latencies = asyncio.run(scenario())
+    assert response.status_code == 200, response.text
+    assert response.json()["video_url"].startswith("/apiOutputs/svg_anim_")
+    # The render kept a worker busy for RENDER_SECONDS; /health was polled throughout
+    assert len(latencies) >= RENDER_SECONDS / 0.1
+    assert max(latencies) < HEALTH_LATENCY_BOUND
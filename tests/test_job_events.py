@@ -0,0 +1,168 @@
+"""job_events: the deferred writer thread, pruning, and the SSE endpoint that streams events."""
+
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+
+import pytest
+
+from services import job_events
+
+
+@pytest.fixture
+def job_id():
+    return f"test-{uuid.uuid4().hex[:12]}"
+
+
+def test_writes_run_in_order_on_the_writer_thread():
+    seen = []
+    for i in range(50):
+        job_events.defer(lambda i=i: seen.append((i, threading.current_thread().name)))
+    job_events.flush()
+    assert [i for i, _ in seen] == list(range(50))
+    assert {name for _, name in seen} == {"job-events-writer"}
+
+
+def test_a_failing_write_does_not_stop_the_writer(capsys):
+    seen = []
+    job_events.defer(lambda: 1 / 0)
+    job_events.defer(seen.append, "after")
+    job_events.flush()
+    assert seen == ["after"]
+    assert "Write failed" in capsys.readouterr().out
+
+
+def test_emit_does_not_wait_for_sqlite(job_id, monkeypatch):
+    release = threading.Event()
+    job_events.defer(release.wait, 5)  # hold the writer
+    try:
+        start = time.perf_counter()
+        with job_events.bound(job_id):
+            job_events.emit("status", status="running")
+        assert time.perf_counter() - start < 0.5
+        assert job_events.read(job_id) == []
+    finally:
+        release.set()
+    job_events.flush()
+    assert [e["data"] for e in job_events.read(job_id)] == [{"status": "running"}]
+
+
+def test_stage_is_recorded_once_and_sentences_carry_their_index(job_id):
+    with job_events.bound(job_id):
+        job_events.stage("audio")
+        job_events.stage("audio")
+        with job_events.bound(job_id, sentence=3):
+            job_events.sentence_done("audio", duration=1.5)
+    job_events.emit("status", job_id="someone-else", status="running")
+    job_events.flush()
+    events = job_events.read(job_id)
+    assert [(e["type"], e["data"]) for e in events] == [
+        ("stage", {"stage": "audio"}),
+        ("sentence", {"stage": "audio", "index": 3, "duration": 1.5}),
+    ]
+    assert job_events.read(job_id, after=events[0]["seq"]) == events[1:]
+
+
+def test_events_outside_a_job_are_dropped():
+    before = job_events._connection().execute("SELECT COUNT(*) FROM job_events").fetchone()[0]
+    job_events.emit("status", status="running")
+    job_events.stage("audio")
+    job_events.flush()
+    assert job_events._connection().execute("SELECT COUNT(*) FROM job_events").fetchone()[0] == before
+
+
+def _backdate(job_id, days):
+    stamp = time.time() - days * 86400
+    with job_events._lock:
+        job_events._connection().execute("UPDATE job_events SET created_at = ? WHERE job_id = ?", (stamp, job_id))
+        job_events._connection().execute("UPDATE job_spans SET start = ? WHERE job_id = ?", (stamp, job_id))
+
+
+def test_prune_deletes_events_and_spans_past_retention(job_id):
+    old, new = job_id + "-old", job_id + "-new"
+    for job in (old, new):
+        job_events.emit("status", job_id=job, status="done")
+        job_events.add_span("stage", "job", time.time(), 0.5, job_id=job)
+    job_events.flush()
+    _backdate(old, 10)
+
+    job_events.prune(retention_days=0)  # 0 keeps everything
+    assert job_events.read(old)
+    job_events.prune(retention_days=7)
+    assert job_events.read(old) == [] and job_events.read_spans(old) == []
+    assert len(job_events.read(new)) == 1 and len(job_events.read_spans(new)) == 1
+
+
+def test_prune_if_due_runs_at_most_once_per_interval(monkeypatch):
+    calls = []
+    monkeypatch.setattr(job_events, "prune", lambda: calls.append(threading.current_thread().name))
+    monkeypatch.setattr(job_events, "_pruned_at", 0.0)
+    job_events.prune_if_due()
+    job_events.prune_if_due()
+    job_events.flush()
+    assert calls == ["job-events-writer"]
+
+    monkeypatch.setattr(job_events, "_pruned_at", time.time() - job_events.PRUNE_INTERVAL - 1)
+    job_events.prune_if_due()
+    job_events.flush()
+    assert len(calls) == 2
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    pytest.importorskip("httpx")
+    monkeypatch.chdir(tmp_path)
+    return pytest.importorskip("main")  # needs the app's full dependencies
+
+
+def _sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        events.append((int(fields["id"]), fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def _get(app, path, headers=None):
+    import httpx
+
+    async def fetch():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            return await client.get(path, headers=headers)
+
+    return asyncio.run(fetch())
+
+
+def test_sse_streams_events_until_the_job_finishes(app_module):
+    job_id = app_module.job_runner.store.create("script_video", {})
+    with job_events.bound(job_id):
+        job_events.emit("status", status="running")
+        job_events.stage("audio")
+        job_events.sentence_done("audio", 0, duration=1.0)
+        job_events.emit("status", status="done")
+        job_events.emit("status", status="ignored after the end")
+    job_events.flush()
+
+    response = _get(app_module.app, f"/jobs/{job_id}/events")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _sse(response.text)
+    assert [(kind, data) for _, kind, data in events] == [
+        ("status", {"status": "running"}),
+        ("stage", {"stage": "audio"}),
+        ("sentence", {"stage": "audio", "index": 0, "duration": 1.0}),
+        ("status", {"status": "done"}),
+    ]
+
+    # A reconnecting client resumes after its Last-Event-ID
+    resumed = _sse(_get(app_module.app, f"/jobs/{job_id}/events",
+                        headers={"Last-Event-ID": str(events[1][0])}).text)
+    assert resumed == events[2:]
+
+
+def test_sse_for_an_unknown_job_is_404(app_module):
+    assert _get(app_module.app, "/jobs/missing/events").status_code == 404
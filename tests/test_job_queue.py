@@ -0,0 +1,201 @@
+"""JobStore, JobRunner (claiming, restart requeue, the queue bound) and webhook URL checks."""
+
+import asyncio
+import threading
+
+import pytest
+
+import job_queue
+from admission import Overloaded
+from job_queue import DONE, FAILED, QUEUED, RUNNING, JobRunner, JobStore, check_webhook_url, public_view
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def _runner(store, handler, **kwargs):
+    runner = JobRunner(store, **kwargs)
+    runner.register("echo", handler, ["first", "second"])
+    return runner
+
+
+async def _echo(job_id, request, progress):
+    progress.stage("first")
+    progress.stage("second")
+    return {"echo": request["value"]}
+
+
+def _wait(runner, job_id):
+    return asyncio.run(runner.wait(job_id, poll_interval=0.02))
+
+
+def test_store_create_update_and_get(store):
+    job_id = store.create("echo", {"value": 1}, webhook_url="https://example.com/hook", priority=3, estimated_s=4.5)
+    job = store.get(job_id)
+    assert job["status"] == QUEUED
+    assert job["request"] == {"value": 1}
+    assert (job["priority"], job["estimated_s"], job["webhook_url"]) == (3, 4.5, "https://example.com/hook")
+    assert job["result"] is None
+
+    store.update(job_id, status=DONE, result={"url": "x"}, started_at=job["created_at"] + 1,
+                 finished_at=job["created_at"] + 3)
+    job = store.get(job_id)
+    assert job["result"] == {"url": "x"}
+    assert store.counts() == {DONE: 1}
+    assert store.recent_timings() == [(pytest.approx(1.0), pytest.approx(2.0))]
+    assert store.get("missing") is None
+
+
+def test_unfinished_lists_queued_and_running_oldest_first(store):
+    first = store.create("echo", {})
+    second = store.create("echo", {})
+    finished = store.create("echo", {})
+    store.update(second, status=RUNNING)
+    store.update(finished, status=DONE)
+    assert store.unfinished() == [first, second]
+
+
+def test_public_view_by_status(store):
+    job_id = store.create("echo", {}, estimated_s=12.34)
+    assert public_view(store.get(job_id)) == {"job_id": job_id, "status": QUEUED, "estimated_s": 12.3}
+
+    store.update(job_id, status=RUNNING, stage="second", stage_index=2, stage_count=3)
+    assert public_view(store.get(job_id)) == {
+        "job_id": job_id, "status": RUNNING, "estimated_s": 12.3, "stage": "second", "progress": "2/3"}
+
+    store.update(job_id, status=DONE, result={"final_video_url": "u"})
+    assert public_view(store.get(job_id)) == {"job_id": job_id, "status": DONE, "result": {"final_video_url": "u"}}
+
+    store.update(job_id, status=FAILED, error="boom")
+    # The request (and any webhook URL) is never exposed
+    assert public_view(store.get(job_id)) == {"job_id": job_id, "status": FAILED, "error": "boom"}
+
+
+def test_runner_claims_and_runs_submitted_jobs(store):
+    runner = _runner(store, _echo, workers=1)
+    try:
+        job_id = runner.submit("echo", {"value": 7})
+        job = _wait(runner, job_id)
+    finally:
+        runner.shutdown()
+    assert job["status"] == DONE
+    assert job["result"]["echo"] == 7
+    assert "usage" in job["result"]
+    assert job["stage"] == "second" and job["stage_index"] == 2
+    assert job["started_at"] >= job["created_at"]
+
+
+def test_failed_handler_marks_the_job_failed(store):
+    async def boom(job_id, request, progress):
+        raise RuntimeError("render exploded")
+
+    runner = _runner(store, boom, workers=1)
+    try:
+        job = _wait(runner, runner.submit("echo", {}))
+    finally:
+        runner.shutdown()
+    assert job["status"] == FAILED
+    assert job["error"] == "render exploded"
+
+
+def test_restart_requeues_queued_and_running_jobs(store):
+    # Left behind by a process that stopped mid-job
+    interrupted = store.create("echo", {"value": 1})
+    store.update(interrupted, status=RUNNING, stage="first", stage_index=1, stage_count=2)
+    waiting = store.create("echo", {"value": 2})
+    done = store.create("echo", {"value": 3})
+    store.update(done, status=DONE, result={"echo": 3})
+
+    runner = _runner(store, _echo, workers=1)
+    runner.start()
+    try:
+        results = [_wait(runner, job_id) for job_id in (interrupted, waiting)]
+    finally:
+        runner.shutdown()
+    assert [job["status"] for job in results] == [DONE, DONE]
+    assert [job["result"]["echo"] for job in results] == [1, 2]
+    # Finished jobs are left alone
+    assert store.get(done)["result"] == {"echo": 3}
+
+
+def test_full_queue_raises_overloaded_with_retry_after(store):
+    release = threading.Event()
+    started = threading.Event()
+
+    async def blocking(job_id, request, progress):
+        started.set()
+        await asyncio.get_running_loop().run_in_executor(None, release.wait, 10)
+        return {}
+
+    runner = _runner(store, blocking, workers=1, max_queued=1)
+    try:
+        running = runner.submit("echo", {})
+        assert started.wait(5)
+        queued = runner.submit("echo", {})
+        with pytest.raises(Overloaded) as overloaded:
+            runner.submit("echo", {})
+        assert overloaded.value.retry_after >= 1
+        assert runner.stats()["queued"] == 1
+    finally:
+        release.set()
+        for job_id in (running, queued):
+            _wait(runner, job_id)
+        runner.shutdown()
+
+
+def test_unknown_kind_is_rejected(store):
+    with pytest.raises(ValueError):
+        _runner(store, _echo).submit("nope", {})
+
+
+@pytest.mark.parametrize("url", [
+    "ftp://93.184.216.34/hook",
+    "file:///etc/passwd",
+    "https:///no-host",
+    "http://127.0.0.1:8000/admin",
+    "http://localhost/hook",
+    "http://10.0.0.5/hook",
+    "http://192.168.1.1/hook",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://[::1]/hook",
+    "http://[fe80::1]/hook",
+    "http://0.0.0.0/hook",
+])
+def test_webhook_urls_to_internal_targets_are_rejected(url):
+    with pytest.raises(ValueError):
+        check_webhook_url(url)
+
+
+def test_webhook_urls_to_public_addresses_are_accepted():
+    check_webhook_url("https://93.184.216.34/hook")
+    check_webhook_url("http://[2606:2800:220:1:248:1893:25c8:1946]:8080/hook")
+
+
+def test_webhook_allow_list_replaces_the_address_check(monkeypatch):
+    monkeypatch.setattr(job_queue, "WEBHOOK_ALLOWED_HOSTS", {"hooks.internal"})
+    with pytest.raises(ValueError):
+        check_webhook_url("https://93.184.216.34/hook")
+    monkeypatch.setattr(job_queue.socket, "getaddrinfo", lambda *a, **k: pytest.fail("allow-listed hosts aren't resolved"))
+    check_webhook_url("https://HOOKS.internal/done")
+
+
+def test_notify_refuses_internal_targets(monkeypatch):
+    posts = []
+    monkeypatch.setattr(job_queue.requests, "post", lambda url, **kwargs: posts.append((url, kwargs)))
+    JobRunner._notify("http://169.254.169.254/latest", {"job_id": "j", "status": DONE})
+    assert posts == []
+
+
+def test_notify_posts_without_following_redirects(monkeypatch):
+    class Response:
+        status_code = 204
+
+    posts = []
+    monkeypatch.setattr(job_queue.requests, "post", lambda url, **kwargs: posts.append((url, kwargs)) or Response())
+    JobRunner._notify("https://93.184.216.34/hook", {"job_id": "j", "status": DONE})
+    assert len(posts) == 1
+    url, kwargs = posts[0]
+    assert kwargs["json"] == {"job_id": "j", "status": DONE}
+    assert kwargs["allow_redirects"] is False
@@ -0,0 +1,87 @@
+"""JobScheduler.pick ordering (priority, expected cost, aging) and the learned cost model."""
+
+import pytest
+
+from job_scheduler import DEFAULT_RATES, JobScheduler, ScriptVideoCostModel
+
+NOW = 10_000.0
+
+
+def _pending(**jobs):
+    # name -> (priority, estimated seconds, seconds ago it was queued)
+    return {name: (priority, cost, NOW - age) for name, (priority, cost, age) in jobs.items()}
+
+
+def test_nothing_pending_picks_nothing():
+    assert JobScheduler(max_wait=60).pick({}, now=NOW) is None
+
+
+def test_shortest_expected_job_goes_first():
+    pending = _pending(lecture=(0, 600.0, 30), clip=(0, 20.0, 10), medium=(0, 120.0, 20))
+    assert JobScheduler(max_wait=60).pick(pending, now=NOW) == "clip"
+
+
+def test_higher_priority_beats_a_shorter_job():
+    pending = _pending(urgent=(5, 600.0, 10), clip=(0, 20.0, 20), normal=(1, 900.0, 30))
+    scheduler = JobScheduler(max_wait=60)
+    assert scheduler.pick(pending, now=NOW) == "urgent"
+    del pending["urgent"]
+    assert scheduler.pick(pending, now=NOW) == "normal"
+
+
+def test_equal_cost_and_priority_runs_oldest_first():
+    pending = _pending(newer=(0, 30.0, 5), older=(0, 30.0, 50))
+    assert JobScheduler(max_wait=60).pick(pending, now=NOW) == "older"
+
+
+def test_a_job_waiting_past_max_wait_goes_ahead_of_everything():
+    pending = _pending(starving=(0, 900.0, 61), urgent=(9, 1.0, 1))
+    scheduler = JobScheduler(max_wait=60)
+    assert scheduler.pick(pending, now=NOW) == "starving"
+    # Just short of the limit it is still ordered by priority and cost
+    assert scheduler.pick(pending, now=NOW - 2) == "urgent"
+
+
+def test_starving_jobs_run_oldest_first_regardless_of_cost():
+    pending = _pending(long_wait=(0, 900.0, 300), short_wait=(3, 5.0, 100), fresh=(9, 1.0, 1))
+    assert JobScheduler(max_wait=60).pick(pending, now=NOW) == "long_wait"
+
+
+def test_drains_in_scheduled_order():
+    pending = _pending(a=(0, 300.0, 200), b=(0, 10.0, 1), c=(2, 500.0, 2), d=(0, 50.0, 3))
+    scheduler = JobScheduler(max_wait=100)
+    order = []
+    while pending:
+        job_id = scheduler.pick(pending, now=NOW)
+        order.append(job_id)
+        del pending[job_id]
+    assert order == ["a", "c", "b", "d"]
+
+
+def test_max_wait_defaults_to_the_environment_setting(monkeypatch):
+    import job_scheduler
+    monkeypatch.setattr(job_scheduler, "SCHEDULER_MAX_WAIT", 42.0)
+    assert JobScheduler().max_wait == 42.0
+    assert JobScheduler(max_wait=0).max_wait == 0
+
+
+def test_estimate_grows_with_the_script_and_image_quality(tmp_path):
+    model = ScriptVideoCostModel(str(tmp_path / "jobs.sqlite3"))
+    short = model.estimate({"script": "One. Two.", "image_quality": "low"})
+    long = model.estimate({"script": " ".join(f"Sentence {i}." for i in range(30)), "image_quality": "low"})
+    high = model.estimate({"script": "One. Two.", "image_quality": "high"})
+    assert short < long and short < high
+
+
+def test_observed_rates_are_learned_and_persisted(tmp_path):
+    class Item:
+        def __init__(self, sentence, duration):
+            self.sentence, self.duration = sentence, duration
+
+    path = str(tmp_path / "jobs.sqlite3")
+    model = ScriptVideoCostModel(path)
+    items = [Item("one two three", 2.0), Item("four five six", 2.0)]
+    stages = {"tts": {"busy_s": 10.0}}
+    model.observe({"script": "x"}, items, stages, pipeline_s=20.0, wall_s=21.0)
+    assert model.rates["tts_s"] > DEFAULT_RATES["tts_s"]
+    assert ScriptVideoCostModel(path).rates["tts_s"] == pytest.approx(model.rates["tts_s"])
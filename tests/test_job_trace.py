@@ -0,0 +1,113 @@
+"""job_trace: traced subprocesses reaped with wait4, and the Chrome trace built from a job's spans."""
+
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import uuid
+
+import pytest
+
+from services import job_events, job_trace
+from services.job_usage import JobUsage
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "wait4"), reason="needs os.wait4")
+
+# Burns a little CPU so the child's rusage is measurable
+BUSY_CHILD = [sys.executable, "-c", "sum(i * i for i in range(2_000_000))"]
+
+
+@pytest.fixture
+def job_id():
+    return f"test-{uuid.uuid4().hex[:12]}"
+
+
+def _worker_span(job_id, start):
+    # A render worker records its spans into the same database, under its own pid
+    with job_events.bound(job_id, sentence=0):
+        job_events.add_span("render", "stage", start, 0.25)
+    job_events.flush()
+
+
+def _run_worker(*args):
+    process = multiprocessing.get_context("spawn").Process(target=_worker_span, args=args)
+    process.start()
+    process.join(60)
+    assert process.exitcode == 0
+    return process.pid
+
+
+def test_trace_lays_out_job_sentences_subprocesses_and_workers(job_id, tmp_path):
+    usage = JobUsage(job_id)
+    with job_events.bound(job_id), usage.track():
+        with job_events.span("script_video", "job"):
+            with job_events.bound(job_id, sentence=0):
+                with job_events.span("tts", "stage"):
+                    result = job_trace.run(BUSY_CHILD, check=True, capture_output=True)
+                worker_pid = _run_worker(job_id, time.time())
+            process = job_trace.Popen([sys.executable, "-c", "raise SystemExit(3)"])
+            assert process.wait() == 3
+    assert result.returncode == 0
+    # Both children were charged to the job
+    assert usage.subprocess_cpu_s > 0 and usage.peak_subprocess_rss > 0
+
+    # Hold the writer so the job's last spans are still queued when the trace is written
+    release = threading.Event()
+    job_events.defer(release.wait, 5)
+    job_events.add_span("upload", "stage", time.time(), 0.01, job_id=job_id)
+    threading.Timer(0.2, release.set).start()
+    path = job_trace.write_chrome_trace(job_id, str(tmp_path / "traces" / "trace.json"))
+    with open(path) as f:
+        trace = json.load(f)
+
+    events = trace["traceEvents"]
+    processes = {e["pid"]: e["args"]["name"] for e in events if e["name"] == "process_name"}
+    assert processes == {os.getpid(): f"job {job_id[:8]} (pid {os.getpid()})",
+                         worker_pid: f"render worker (pid {worker_pid})"}
+    threads = {(e["pid"], e["tid"]): e["args"]["name"] for e in events if e["name"] == "thread_name"}
+    assert threads == {(os.getpid(), 0): "job", (os.getpid(), 1): "sentence 1", (worker_pid, 1): "sentence 1"}
+
+    spans = {e["name"] if e["cat"] != "subprocess" else e["args"]["command"]: e for e in events if e["ph"] == "X"}
+    python = os.path.basename(sys.executable)
+    busy, failing = " ".join(BUSY_CHILD), f"{sys.executable} -c raise SystemExit(3)"
+    assert set(spans) == {"script_video", "tts", busy, failing, "render", "upload"}
+    assert {(spans[name]["pid"], spans[name]["tid"]) for name in ("tts", busy)} == {(os.getpid(), 1)}
+    assert (spans["render"]["pid"], spans["render"]["tid"]) == (worker_pid, 1)
+    assert (spans[failing]["pid"], spans[failing]["tid"]) == (os.getpid(), 0)
+
+    child = spans[busy]
+    assert child["name"] == python and child["cat"] == "subprocess"
+    assert child["args"]["cpu_s"] > 0 and child["args"]["max_rss_mb"] > 0
+    # Timestamps are microseconds from the first span, and the job span encloses its children
+    job = spans["script_video"]
+    assert min(e["ts"] for e in spans.values()) == 0
+    for name in ("tts", busy, failing):
+        # Give or take a microsecond of rounding
+        assert job["ts"] <= spans[name]["ts"] and spans[name]["ts"] + spans[name]["dur"] <= job["ts"] + job["dur"] + 1
+    assert trace["otherData"]["job_id"] == job_id
+
+
+def test_subprocesses_outside_a_job_are_not_traced(job_id):
+    process = job_trace.Popen([sys.executable, "-c", "pass"])
+    assert process.wait() == 0
+    assert job_trace.run([sys.executable, "-c", "raise SystemExit(2)"]).returncode == 2
+    job_events.flush()
+    assert job_events.read_spans(job_id) == []
+
+
+def test_polling_reaps_the_child_once(job_id):
+    with job_events.bound(job_id):
+        process = job_trace.Popen([sys.executable, "-c", "import time; time.sleep(0.2)"])
+        assert process.poll() is None
+        while process.poll() is None:
+            time.sleep(0.02)
+        assert process.wait() == 0
+    assert [span["cat"] for span in job_events.read_spans(job_id)] == ["subprocess"]
+
+
+def test_a_job_without_spans_has_an_empty_trace(job_id, tmp_path):
+    path = job_trace.write_chrome_trace(job_id, str(tmp_path / "empty.json"))
+    with open(path) as f:
+        assert json.load(f) == {"traceEvents": [], "displayTimeUnit": "ms"}
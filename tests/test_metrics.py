@@ -0,0 +1,84 @@
+"""metrics: samples flushed by CPU pool workers are merged into the API process's /metrics."""
+
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from services import metrics
+
+
+@pytest.fixture
+def fresh(tmp_path, monkeypatch):
+    # Empty samples and a worker directory of our own; the spawned workers read it from the environment
+    monkeypatch.setenv("DOODLY_METRICS_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    for name in ("_counters", "_histograms", "_gauges"):
+        monkeypatch.setattr(metrics, name, {})
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    return tmp_path
+
+
+def _worker_task(written, seconds):
+    metrics.mark_worker()
+    metrics.bytes_written("clip", written)
+    metrics.observe("doodly_stage_seconds", seconds, stage="render")
+    metrics.flush()
+
+
+def _run_worker(*args):
+    process = multiprocessing.get_context("spawn").Process(target=_worker_task, args=args)
+    process.start()
+    process.join(60)
+    assert process.exitcode == 0
+
+
+def _samples(text):
+    return dict(line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#"))
+
+
+def test_render_sums_this_process_and_every_worker(fresh):
+    metrics.bytes_written("clip", 100)
+    metrics.observe("doodly_stage_seconds", 0.3, stage="render")
+    _run_worker(1000, 2.0)
+    _run_worker(10000, 700.0)
+    assert len(os.listdir(fresh / str(os.getpid()))) == 2
+
+    samples = _samples(metrics.render())
+    assert samples['doodly_bytes_written_total{kind="clip"}'] == "11100"
+    histogram = 'doodly_stage_seconds_{}{{stage="render"{}}}'
+    assert samples[histogram.format("bucket", ',le="0.5"')] == "1"
+    assert samples[histogram.format("bucket", ',le="2.5"')] == "2"
+    assert samples[histogram.format("bucket", ',le="600"')] == "2"
+    assert samples[histogram.format("bucket", ',le="+Inf"')] == "3"
+    assert samples[histogram.format("count", "")] == "3"
+    assert float(samples[histogram.format("sum", "")]) == pytest.approx(702.3)
+    # Merging reads the files; it doesn't fold them into this process's own samples
+    assert metrics._counters == {("doodly_bytes_written_total", (("kind", "clip"),)): 100}
+
+
+def test_a_worker_flush_replaces_its_earlier_one(fresh):
+    directory = fresh / str(os.getpid())
+    directory.mkdir()
+    snapshot = {"counters": [["doodly_bytes_written_total", [["kind", "clip"]], 5]], "histograms": []}
+    (directory / "123.json").write_text(json.dumps(snapshot))
+    snapshot["counters"][0][2] = 7
+    (directory / "123.json").write_text(json.dumps(snapshot))
+    assert _samples(metrics.render())['doodly_bytes_written_total{kind="clip"}'] == "7"
+
+
+def test_unreadable_and_partial_worker_files_are_skipped(fresh):
+    directory = fresh / str(os.getpid())
+    directory.mkdir()
+    (directory / "1.json").write_text("{not json")
+    (directory / "2.json.tmp").write_text(json.dumps(
+        {"counters": [["doodly_bytes_written_total", [["kind", "clip"]], 99]], "histograms": []}))
+    metrics.bytes_written("clip", 3)
+    assert _samples(metrics.render())['doodly_bytes_written_total{kind="clip"}'] == "3"
+
+
+def test_flush_outside_a_worker_writes_nothing(fresh):
+    metrics.bytes_written("clip", 3)
+    metrics.flush()
+    assert os.listdir(fresh) == []
@@ -0,0 +1,181 @@
+"""ScriptVideoPipeline with stubbed TTS, image and render stages."""
+
+import asyncio
+import concurrent.futures
+import os
+import time
+
+import pytest
+
+import script_pipeline
+from script_pipeline import STAGES, ScriptVideoPipeline, SentenceItem, StageTimings
+
+
+class StubAudio:
+    def __init__(self, out, log):
+        self.out, self.log = out, log
+
+    async def generate_sentence_audio(self, sentence, job_id, i):
+        path = os.path.join(self.out, f"audio_{job_id}_{i}.mp3")
+        with open(path, "wb") as f:
+            f.write(b"mp3")
+        self.log.append(("tts", i))
+        return {"audio_path": path, "duration": 1.0 + i, "sentence": sentence}
+
+
+class StubImages:
+    def __init__(self, out, log, fail_on=None):
+        self.out, self.log, self.fail_on = out, log, fail_on
+
+    def generate_sketch_image_with_quality(self, sentence, job_id, i, quality, size):
+        if i == self.fail_on:
+            raise ValueError(f"no image for sentence {i}")
+        path = os.path.join(self.out, f"image_{job_id}_{i}.png")
+        with open(path, "wb") as f:
+            f.write(b"png")
+        self.log.append(("image", i))
+        return path
+
+
+class StubRenders:
+    """Stands in for the CPU pool: render_sentence_clip runs on threads and writes an empty clip."""
+
+    def __init__(self, log, delay=lambda index: 0.0):
+        self.log, self.delay = log, delay
+        self.pool = concurrent.futures.ThreadPoolExecutor(4)
+        self.started = 0
+
+    def submit_cpu(self, fn, task, output_dir, engine):
+        self.started += 1
+
+        def render():
+            time.sleep(self.delay(task.index))
+            path = os.path.join(output_dir, task.out_name)
+            with open(path, "wb") as f:
+                f.write(b"mp4")
+            self.log.append(("render", task.index))
+            return path
+
+        return self.pool.submit(render)
+
+
+@pytest.fixture
+def out(tmp_path):
+    return str(tmp_path / "outputs")
+
+
+def _pipeline(out, log, renders, monkeypatch, images=None, **workers):
+    monkeypatch.setattr(script_pipeline.executors, "submit_cpu", renders.submit_cpu)
+    return ScriptVideoPipeline(StubAudio(out, log), images or StubImages(out, log), "job", out, **workers)
+
+
+def test_items_come_back_in_sentence_order(out, monkeypatch):
+    log = []
+    # Later sentences render faster, so clips finish out of order
+    renders = StubRenders(log, delay=lambda index: 0.05 * (4 - index))
+    pipeline = _pipeline(out, log, renders, monkeypatch, render_workers=4)
+    sentences = [f"Sentence {i}." for i in range(5)]
+    items = asyncio.run(pipeline.run(sentences))
+
+    assert [item.index for item in items] == list(range(5))
+    assert [item.sentence for item in items] == sentences
+    assert [item.duration for item in items] == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert all(os.path.exists(item.clip_path) for item in items)
+    assert [i for stage, i in log if stage == "render"] != list(range(5))
+    for item in items:
+        assert set(item.timings) == set(STAGES)
+        # Each sentence goes through the stages in order
+        (_, _, tts_end), (image_queued, image_start, image_end), (render_queued, render_start, _) = (
+            item.timings[stage] for stage in STAGES)
+        assert tts_end <= image_queued <= image_start <= image_end <= render_queued <= render_start
+
+
+def test_bounded_queues_keep_tts_from_running_ahead(out, monkeypatch):
+    log = []
+    renders = StubRenders(log, delay=lambda index: 0.03)
+    pipeline = _pipeline(out, log, renders, monkeypatch,
+                         tts_workers=1, image_workers=1, render_workers=1, queue_size=1)
+    asyncio.run(pipeline.run([f"Sentence {i}." for i in range(12)]))
+
+    ahead, most_ahead = 0, 0
+    for stage, _ in log:
+        ahead += {"tts": 1, "render": -1}.get(stage, 0)
+        most_ahead = max(most_ahead, ahead)
+    # At most one held by each worker and one per queue between TTS and a finished render
+    assert most_ahead <= 5
+
+
+def test_a_failure_cancels_remaining_work_and_cleans_up(out, monkeypatch):
+    log = []
+    renders = StubRenders(log)
+    images = StubImages(out, log, fail_on=2)
+    pipeline = _pipeline(out, log, renders, monkeypatch, images=images,
+                         tts_workers=1, image_workers=1, render_workers=1, queue_size=1)
+    with pytest.raises(ValueError, match="sentence 2"):
+        asyncio.run(pipeline.run([f"Sentence {i}." for i in range(20)]))
+
+    assert len([i for stage, i in log if stage == "tts"]) < 20
+    assert renders.started <= 2
+    # Audio, images and clips written before the failure are removed
+    assert os.listdir(out) == []
+
+
+def test_cleanup_removes_every_per_sentence_file(tmp_path):
+    paths = {}
+    for name in ("audio.mp3", "image.png", "clip.mp4", "download.png"):
+        paths[name] = str(tmp_path / name)
+        open(paths[name], "wb").close()
+    item = SentenceItem(0, "s", audio_path=paths["audio.mp3"], image_path=paths["image.png"],
+                        clip_path=paths["clip.mp4"], temp_files=[paths["download.png"], paths["image.png"]])
+    ScriptVideoPipeline.cleanup([item], clips=False)
+    assert os.listdir(tmp_path) == ["clip.mp4"]
+    ScriptVideoPipeline.cleanup([item])
+    assert os.listdir(tmp_path) == []
+
+
+def test_empty_script_runs_nothing(out, monkeypatch):
+    log = []
+    pipeline = _pipeline(out, log, StubRenders(log), monkeypatch)
+    assert asyncio.run(pipeline.run([])) == []
+    assert pipeline.timings.critical_path() == []
+    assert log == []
+
+
+def _item(index, **timings):
+    item = SentenceItem(index, f"Sentence {index}.")
+    item.timings = timings
+    return item
+
+
+def test_critical_path_follows_the_last_clip():
+    items = [
+        _item(0, tts=(0.0, 0.0, 1.0), image=(1.0, 1.0, 3.0), render=(3.0, 3.0, 5.0)),
+        _item(1, tts=(0.0, 0.5, 2.0), image=(2.0, 3.0, 6.0), render=(6.0, 6.5, 9.0)),
+        _item(2, tts=(0.0, 1.0, 2.5)),  # never finished
+    ]
+    timings = StageTimings(items, 9.5)
+    assert timings.critical_path() == [
+        {"sentence": 1, "stage": "tts", "wait_s": 0.5, "run_s": 1.5},
+        {"sentence": 1, "stage": "image", "wait_s": 1.0, "run_s": 3.0},
+        {"sentence": 1, "stage": "render", "wait_s": 0.5, "run_s": 2.5},
+    ]
+    summary = timings.stage_summary()
+    assert summary["tts"] == {"busy_s": 4.0, "wait_s": 1.5, "first_start_s": 0.0, "last_end_s": 2.5}
+    assert summary["render"]["busy_s"] == 4.5
+    assert "critical path (sentence 2)" in timings.format()
+
+
+def test_each_stage_reports_its_progress_stage_once(out, monkeypatch):
+    from services import job_events
+    log = []
+    pipeline = _pipeline(out, log, StubRenders(log), monkeypatch)
+    job_id = "pipeline-stages"
+
+    async def run():
+        with job_events.bound(job_id):
+            return await pipeline.run([f"Sentence {i}." for i in range(6)])
+
+    asyncio.run(run())
+    job_events.flush()
+    stages = [event["data"]["stage"] for event in job_events.read(job_id) if event["type"] == "stage"]
+    assert stages == ["audio", "images", "trace"]
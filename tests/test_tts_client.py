@@ -0,0 +1,183 @@
+"""TTSClient against a local fake ElevenLabs server."""
+
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+from services import tts_client
+from services.tts_client import TTSClient, TTSError
+
+
+class FakeTTSServer:
+    """
+    Answers POST /text-to-speech/<voice> with the next (status, headers) in `responses`
+    (then 200 with fake MP3 bytes), after `delay` seconds. Records every request and
+    the most requests it was serving at once.
+    """
+
+    def __init__(self, responses=(), delay=0.0):
+        self.responses = list(responses)
+        self.delay = delay
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                with server._lock:
+                    server.requests.append((self.path, self.headers.get("xi-api-key"), body))
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                    status, headers = server.responses.pop(0) if server.responses else (200, {})
+                try:
+                    time.sleep(server.delay)
+                    payload = b"ID3fake-mp3" if status == 200 else b'{"detail": "fake error"}'
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                finally:
+                    with server._lock:
+                        server.active -= 1
+
+            def do_GET(self):
+                payload = b'{"voices": [{"voice_id": "v1", "name": "Adam", "category": "premade"}]}'
+                server.requests.append((self.path, self.headers.get("xi-api-key"), b""))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff delays the client asked for; the waits themselves are skipped."""
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay, *args, **kwargs):
+        delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(tts_client.asyncio, "sleep", fake_sleep)
+    return delays
+
+
+def _client(server, **kwargs):
+    kwargs.setdefault("backoff", 0.5)
+    return TTSClient("test-key", base_url=server.base_url, timeout=10, **kwargs)
+
+
+def test_returns_audio_and_sends_credentials():
+    with FakeTTSServer() as server:
+        audio = asyncio.run(_client(server).synthesize("Hello there", "voice-1", "model-1"))
+    assert audio == b"ID3fake-mp3"
+    path, api_key, body = server.requests[0]
+    assert path == "/text-to-speech/voice-1"
+    assert api_key == "test-key"
+    assert b'"model_id": "model-1"' in body
+
+
+def test_concurrency_is_bounded_by_the_semaphore():
+    with FakeTTSServer(delay=0.2) as server:
+        client = _client(server, max_concurrency=2)
+
+        async def synthesize_all():
+            return await asyncio.gather(*(client.synthesize(f"sentence {i}", "v", "m") for i in range(6)))
+
+        results = asyncio.run(synthesize_all())
+    assert len(results) == 6
+    assert len(server.requests) == 6
+    assert server.max_active == 2
+
+
+def test_client_can_be_shared_by_jobs_on_different_event_loops():
+    # JobRunner runs every job in its own asyncio.run() loop, all with the same AudioService client
+    with FakeTTSServer(delay=0.05) as server:
+        client = _client(server, max_concurrency=1)
+
+        async def synthesize_contended():
+            return await asyncio.gather(*(client.synthesize(f"sentence {i}", "v", "m") for i in range(3)))
+
+        for _ in range(2):
+            assert asyncio.run(synthesize_contended()) == [b"ID3fake-mp3"] * 3
+    assert len(server.requests) == 6
+    assert server.max_active == 1
+
+
+def test_lists_voices():
+    with FakeTTSServer() as server:
+        voices = _client(server).voices_blocking()
+    assert voices == [{"voice_id": "v1", "name": "Adam", "category": "premade"}]
+    assert server.requests == [("/voices", "test-key", b"")]
+
+
+def test_retries_429_and_5xx_with_jittered_backoff(monkeypatch, sleeps):
+    jitter = iter([0.5, 1.5])
+    monkeypatch.setattr(tts_client.random, "uniform", lambda low, high: next(jitter))
+    with FakeTTSServer(responses=[(429, {}), (503, {})]) as server:
+        audio = asyncio.run(_client(server, max_retries=3).synthesize("text", "v", "m"))
+    assert audio == b"ID3fake-mp3"
+    assert len(server.requests) == 3
+    # backoff * 2 ** attempt, scaled by the jitter factor
+    assert sleeps == [pytest.approx(0.5 * 1 * 0.5), pytest.approx(0.5 * 2 * 1.5)]
+
+
+def test_jitter_stays_within_bounds(sleeps):
+    with FakeTTSServer(responses=[(500, {})] * 4) as server:
+        asyncio.run(_client(server, max_retries=4).synthesize("text", "v", "m"))
+    assert len(sleeps) == 4
+    for attempt, delay in enumerate(sleeps):
+        base = 0.5 * 2 ** attempt
+        assert 0.5 * base <= delay <= 1.5 * base
+
+
+def test_retry_after_is_honoured(sleeps):
+    with FakeTTSServer(responses=[(429, {"Retry-After": "7"})]) as server:
+        asyncio.run(_client(server, backoff=0.01).synthesize("text", "v", "m"))
+    assert sleeps == [7.0]
+
+
+def test_gives_up_after_max_retries(sleeps):
+    with FakeTTSServer(responses=[(502, {})] * 10) as server:
+        with pytest.raises(TTSError) as error:
+            asyncio.run(_client(server, max_retries=2).synthesize("text", "v", "m"))
+    assert error.value.status_code == 502
+    assert len(server.requests) == 3
+    assert len(sleeps) == 2
+
+
+def test_client_errors_are_not_retried(sleeps):
+    with FakeTTSServer(responses=[(401, {})]) as server:
+        with pytest.raises(TTSError) as error:
+            asyncio.run(_client(server, max_retries=4).synthesize("text", "v", "m"))
+    assert error.value.status_code == 401
+    assert "fake error" in str(error.value)
+    assert len(server.requests) == 1
+    assert sleeps == []
@@ -0,0 +1,109 @@
+"""Tracing masks into stroke bundles, and the bundle's .npz and SVG output."""
+
+import importlib.util
+import xml.etree.ElementTree as ET
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+
+import vectorizer
+from vectorizer import StrokeBundle, threshold_png, trace_bitmap
+
+needs_tracer = pytest.mark.skipif(
+    vectorizer.potrace is None and importlib.util.find_spec("cv2") is None,
+    reason="needs pypotrace or OpenCV")
+
+
+def _square_mask(size=64, top=16, bottom=48):
+    mask = np.zeros((size, size), dtype=bool)
+    mask[top:bottom, top:bottom] = True
+    return mask
+
+
+@needs_tracer
+def test_traces_a_filled_square_into_a_closed_outline():
+    polylines = trace_bitmap(_square_mask())
+    assert len(polylines) == 1
+    outline = polylines[0]
+    assert np.array_equal(outline[0], outline[-1])
+    xs, ys = outline[:, 0], outline[:, 1]
+    # Either tracer puts the outline on the square's edge, to within a pixel
+    assert xs.min() == pytest.approx(16, abs=1) and xs.max() == pytest.approx(48, abs=1)
+    assert ys.min() == pytest.approx(16, abs=1) and ys.max() == pytest.approx(48, abs=1)
+
+
+@needs_tracer
+def test_turdsize_drops_specks():
+    mask = _square_mask()
+    mask[2:6, 2:6] = True  # 16-pixel speck
+    assert len(trace_bitmap(mask)) == 2
+    assert len(trace_bitmap(mask, turdsize=20)) == 1
+
+
+@needs_tracer
+def test_empty_mask_traces_to_nothing():
+    assert trace_bitmap(np.zeros((32, 32), dtype=bool)) == []
+
+
+def test_threshold_composites_transparency_onto_white(tmp_path):
+    from PIL import Image
+    image = Image.new("RGBA", (8, 8), (0, 0, 0, 0))
+    image.putpixel((3, 3), (0, 0, 0, 255))
+    path = str(tmp_path / "ink.png")
+    image.save(path)
+    mask = threshold_png(path)
+    assert mask.shape == (8, 8)
+    assert mask.sum() == 1 and mask[3, 3]
+
+
+def _bundle():
+    return StrokeBundle.from_polylines(
+        [[(0, 0), (10, 0), (10, 5)], [(1, 1)], [(2.5, 3.5), (7.25, 8.0)]], width=20, height=10)
+
+
+def test_from_polylines_packs_points_and_drops_single_points():
+    bundle = _bundle()
+    assert len(bundle) == 2
+    assert bundle.offsets.tolist() == [0, 3, 5]
+    assert bundle.segment_count == 3
+    assert bundle.polylines()[1].tolist() == [[2.5, 3.5], [7.25, 8.0]]
+
+
+def test_save_and_load_round_trip_memory_maps_the_arrays(tmp_path):
+    bundle = _bundle()
+    path = bundle.save(str(tmp_path / "strokes"))
+    assert path.endswith(".npz")
+    loaded = StrokeBundle.load(path)
+    assert isinstance(loaded.points, np.memmap)
+    assert (loaded.width, loaded.height) == (20, 10)
+    assert np.array_equal(loaded.points, bundle.points)
+    assert np.array_equal(loaded.offsets, bundle.offsets)
+    assert [p.tolist() for p in loaded.polylines()] == [p.tolist() for p in bundle.polylines()]
+
+
+def test_load_falls_back_for_compressed_and_empty_bundles(tmp_path):
+    bundle = _bundle()
+    compressed = str(tmp_path / "compressed.npz")
+    np.savez_compressed(compressed, points=bundle.points, offsets=bundle.offsets,
+                        size=np.array([20, 10], dtype=np.int32))
+    loaded = StrokeBundle.load(compressed)
+    assert not isinstance(loaded.points, np.memmap)
+    assert np.array_equal(loaded.points, bundle.points)
+
+    empty = StrokeBundle.from_polylines([], width=4, height=4)
+    loaded = StrokeBundle.load(empty.save(str(tmp_path / "empty.npz")))
+    assert len(loaded) == 0 and loaded.points.shape == (0, 2)
+
+
+def test_to_svg_writes_one_path_per_polyline(tmp_path):
+    svg_path = _bundle().to_svg(str(tmp_path / "strokes.svg"), stroke_width=2)
+    root = ET.parse(svg_path).getroot()
+    assert root.get("viewBox") == "0 0 20 10"
+    paths = root.findall("{http://www.w3.org/2000/svg}path")
+    assert [p.get("d") for p in paths] == [
+        "M 0.0 0.0 L 10.0 0.0 L 10.0 5.0",
+        "M 2.5 3.5 L 7.2 8.0",
+    ]
+    assert all(p.get("fill") == "none" and p.get("stroke-width") == "2" for p in paths)
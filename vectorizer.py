@@ -0,0 +1,161 @@
+"""
+In-process vectorizer.
+
+Thresholds a PNG with NumPy and traces it through the potrace library binding
+(`pypotrace`, built against libpotrace and libagg by the Dockerfile and the
+Modal images). Where the binding is missing it falls back to OpenCV contour
+tracing and logs a warning on import. The result is a `StrokeBundle`: every polyline packed
+into a single float32 point array plus offsets, which the stroke renderer
+consumes directly (memory-mapped from its `.npz` file) and which can still be
+written out as an SVG on request.
+"""
+
+import logging
+import struct
+import zipfile
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+try:
+    import potrace
+except ImportError:
+    potrace = None
+    logger.warning("pypotrace is not installed; tracing with OpenCV contours instead of potrace")
+
+
+class StrokeBundle:
+    """
+    Packed polylines: points[offsets[i]:offsets[i + 1]] is polyline i,
+    in image pixel coordinates (y down).
+    """
+
+    def __init__(self, points, offsets, width: int, height: int):
+        # asanyarray, so arrays memory-mapped by load() stay mapped instead of becoming plain ndarrays
+        self.points = np.asanyarray(points, dtype=np.float32).reshape(-1, 2)
+        self.offsets = np.asanyarray(offsets, dtype=np.int32)
+        self.width = int(width)
+        self.height = int(height)
+
+    @classmethod
+    def from_polylines(cls, polylines, width: int, height: int):
+        polylines = [np.asarray(p, dtype=np.float32).reshape(-1, 2) for p in polylines if len(p) >= 2]
+        if polylines:
+            points = np.concatenate(polylines)
+        else:
+            points = np.zeros((0, 2), dtype=np.float32)
+        offsets = np.concatenate([[0], np.cumsum([len(p) for p in polylines], dtype=np.int64)])
+        return cls(points, offsets, width, height)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def polylines(self) -> list:
+        """Views into the packed point array, one per polyline."""
+        return [self.points[self.offsets[i]:self.offsets[i + 1]] for i in range(len(self))]
+
+    @property
+    def segment_count(self) -> int:
+        return int(len(self.points) - len(self))
+
+    def save(self, path: str) -> str:
+        # Uncompressed so np.load can hand back arrays without inflating them
+        np.savez(path, points=self.points, offsets=self.offsets,
+                 size=np.array([self.width, self.height], dtype=np.int32))
+        return path if path.endswith('.npz') else path + '.npz'
+
+    @classmethod
+    def load(cls, path: str):
+        """Load a saved bundle, memory-mapping its arrays rather than reading them in."""
+        try:
+            arrays = _mmap_npz(path)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            arrays = None
+        if arrays is None:
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in ('points', 'offsets', 'size')}
+        width, height = arrays['size']
+        return cls(arrays['points'], arrays['offsets'], width, height)
+
+    def to_svg(self, svg_path: str, stroke_width: int = 3) -> str:
+        """Write the bundle as a stroke-only SVG (for the Manim engine or API callers)."""
+        with open(svg_path, 'w') as f:
+            f.write(f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" '
+                    f'width="{self.width}" height="{self.height}" viewBox="0 0 {self.width} {self.height}">\n')
+            for line in self.polylines():
+                coords = " L ".join(f"{x:.1f} {y:.1f}" for x, y in line)
+                f.write(f'<path d="M {coords}" fill="none" stroke="black" stroke-width="{stroke_width}"/>\n')
+            f.write('</svg>\n')
+        return svg_path
+
+
+def _mmap_npz(path: str):
+    """
+    Memory-map the members of an uncompressed .npz (np.load ignores mmap_mode for archives).
+    Returns None when a member is compressed and has to be read normally.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                return None
+            # The member's data follows its local header: 30 bytes, then the name and extra field
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if dtype.hasobject or 0 in shape:
+                return None
+            arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                     order='F' if fortran_order else 'C')
+    return arrays
+
+
+def threshold_png(png_path: str, level: float = 0.5) -> np.ndarray:
+    """Boolean ink mask of a PNG (True where darker than `level`), like `magick -threshold 50%`."""
+    image = Image.open(png_path)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # Composite transparency onto white first, as ImageMagick does for PBM output
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, image)
+    gray = np.asarray(image.convert('L'))
+    return gray < int(255 * level)
+
+
+def trace_bitmap(mask: np.ndarray, turdsize: int = 0, alphamax: float = 1.0) -> list:
+    """Trace a boolean ink mask into a list of closed polylines."""
+    if potrace is not None:
+        bitmap = potrace.Bitmap(mask)
+        path = bitmap.trace(turdsize=turdsize, alphamax=alphamax, opticurve=False)
+        polylines = []
+        for curve in path:
+            points = np.asarray(curve.tesselate(), dtype=np.float32)
+            if len(points) >= 2:
+                polylines.append(np.vstack([points, points[:1]]))
+        return polylines
+
+    import cv2
+    contours, _ = cv2.findContours(mask.astype(np.uint8), cv2.RETR_LIST, cv2.CHAIN_APPROX_TC89_L1)
+    polylines = []
+    for cnt in contours:
+        if turdsize and cv2.contourArea(cnt) <= turdsize:
+            continue
+        points = cnt.reshape(-1, 2).astype(np.float32)
+        if len(points) >= 2:
+            polylines.append(np.vstack([points, points[:1]]))
+    return polylines
+
+
+def vectorize_png(png_path: str, turdsize: int = 0) -> StrokeBundle:
+    """Threshold and trace a PNG entirely in-process."""
+    mask = threshold_png(png_path)
+    height, width = mask.shape
+    return StrokeBundle.from_polylines(trace_bitmap(mask, turdsize=turdsize), width, height)